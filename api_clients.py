@@ -0,0 +1,200 @@
+"""
+api_clients.py: Lazily created, cached API clients shared by the Card News pipeline modules.
+
+Nothing here is imported or constructed until first use, so importing a pipeline module (or running
+`run_pipeline.py --help`) does not pay for the openai/elevenlabs SDK imports or client setup.
+When a cassette is active (see cassette.py), every client records through it or replays from it.
+
+The async clients (for run_pipeline_async) hold connection pools bound to one event loop, so they are cached
+per running loop and dropped with it.
+"""
+import os
+import weakref
+import threading
+from dotenv import load_dotenv
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    Get the process-wide OpenAI client, creating it on first use.
+    SDK retries are disabled because the shared rate limiter (rate_limiter.py) owns retries.
+
+    Returns:
+        OpenAI: Cached OpenAI client.
+    """
+    with _lock:
+        client = _clients.get("openai")
+        if client is None:
+            from openai import OpenAI
+            from cassette import get_cassette, make_httpx_client
+            load_dotenv()
+            cassette = get_cassette()
+            http_client = make_httpx_client(cassette) if cassette else None
+            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY', 'YOUR_OPENAI_API_KEY'), max_retries=0, http_client=http_client)
+            _clients["openai"] = client
+        return client
+
+
+def get_elevenlabs_client():
+    """
+    Get the process-wide ElevenLabs client, creating it on first use.
+    ELEVENLABS_BASE_URL lets benchmarks point the client at a local stand-in (see fake_services.py).
+
+    Returns:
+        ElevenLabs: Cached ElevenLabs client.
+    """
+    with _lock:
+        client = _clients.get("elevenlabs")
+        if client is None:
+            from cassette import get_cassette, make_httpx_client
+            cassette = get_cassette()
+            api_key = _get_elevenlabs_api_key(cassette)
+            from elevenlabs.client import ElevenLabs
+            kwargs = {"httpx_client": make_httpx_client(cassette)} if cassette else {}
+            client = ElevenLabs(api_key=api_key, base_url=os.getenv("ELEVENLABS_BASE_URL"), **kwargs)
+            _clients["elevenlabs"] = client
+        return client
+
+
+def get_http_session():
+    """
+    Get the process-wide requests.Session, so SerpAPI, Jamendo and Twemoji calls reuse pooled connections.
+
+    Returns:
+        requests.Session: Cached HTTP session.
+    """
+    with _lock:
+        session = _clients.get("http")
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from cassette import get_cassette, make_requests_adapter
+            session = requests.Session()
+            cassette = get_cassette()
+            if cassette:
+                adapter = make_requests_adapter(cassette, pool_connections=8, pool_maxsize=16)
+            else:
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _clients["http"] = session
+        return session
+
+
+def _get_loop_clients():
+    import asyncio
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        clients = _async_clients[loop] = {}
+    return clients
+
+
+def _get_elevenlabs_api_key(cassette):
+    load_dotenv()
+    api_key = os.getenv("ELEVENLABS_API_KEY")
+    if not api_key and cassette is not None and cassette.mode == "replay":
+        # Replayed requests never reach ElevenLabs
+        api_key = "replay"
+    if not api_key:
+        raise ValueError("ELEVENLABS_API_KEY environment variable not set.")
+    return api_key
+
+
+def get_async_openai_client():
+    """
+    Get the AsyncOpenAI client for the running event loop, creating it on first use.
+    SDK retries are disabled because the shared rate limiter (rate_limiter.py) owns retries.
+
+    Returns:
+        AsyncOpenAI: Cached client.
+    """
+    with _lock:
+        clients = _get_loop_clients()
+        client = clients.get("openai")
+        if client is None:
+            from openai import AsyncOpenAI
+            from cassette import get_cassette, make_async_httpx_client
+            load_dotenv()
+            cassette = get_cassette()
+            http_client = make_async_httpx_client(cassette) if cassette else None
+            client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY', 'YOUR_OPENAI_API_KEY'), max_retries=0, http_client=http_client)
+            clients["openai"] = client
+        return client
+
+
+def get_async_elevenlabs_client():
+    """
+    Get the AsyncElevenLabs client for the running event loop, creating it on first use.
+
+    Returns:
+        AsyncElevenLabs: Cached client.
+    """
+    with _lock:
+        clients = _get_loop_clients()
+        client = clients.get("elevenlabs")
+        if client is None:
+            from cassette import get_cassette, make_async_httpx_client
+            cassette = get_cassette()
+            api_key = _get_elevenlabs_api_key(cassette)
+            from elevenlabs.client import AsyncElevenLabs
+            kwargs = {"httpx_client": make_async_httpx_client(cassette)} if cassette else {}
+            client = AsyncElevenLabs(api_key=api_key, base_url=os.getenv("ELEVENLABS_BASE_URL"), **kwargs)
+            clients["elevenlabs"] = client
+        return client
+
+
+def get_async_http_client():
+    """
+    Get the httpx.AsyncClient for the running event loop (SerpAPI, Jamendo), creating it on first use.
+
+    Returns:
+        httpx.AsyncClient: Cached client.
+    """
+    with _lock:
+        clients = _get_loop_clients()
+        client = clients.get("http")
+        if client is None:
+            import httpx
+            from cassette import get_cassette, make_async_httpx_client
+            cassette = get_cassette()
+            if cassette:
+                client = make_async_httpx_client(cassette)
+            else:
+                client = httpx.AsyncClient(limits=httpx.Limits(max_connections=16, max_keepalive_connections=8), timeout=None)
+            clients["http"] = client
+        return client
+
+
+async def close_async_clients():
+    """
+    Close the running event loop's async clients and their connection pools (call before the loop ends).
+
+    Returns:
+        None.
+    """
+    import asyncio
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        close = getattr(client, "aclose", None) or getattr(client, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+
+def reset_clients():
+    """
+    Drop all cached clients (e.g. after credentials or endpoints change).
+
+    Returns:
+        None.
+    """
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
@@ -1,53 +1,459 @@
 """
 article_search.py: Handles news article search (via SerpAPI), summarization (via OpenAI), and card/script content generation for the Card News pipeline.
+Each stage also has an asyncio counterpart (web_search_async, summarize_articles_async, ...) for run_pipeline_async.
 """
 import os
-from openai import OpenAI
+import functools
+import threading
 import requests
 from dotenv import load_dotenv
-
-# Set your OpenAI API key here or use environment variable
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'YOUR_OPENAI_API_KEY')
-client = OpenAI(api_key=OPENAI_API_KEY)
+from tracing import span, record_openai_usage
+from rate_limiter import get_limiter
+from api_clients import get_openai_client, get_http_session, get_async_openai_client, get_async_http_client
+from hedging import hedged_call, hedged_call_async, call_timeout, CALL_TIMEOUTS
 
 load_dotenv()
 
-def web_search(query, max_results=3):
+# SerpAPI endpoint (overridable to point at a local stand-in, see fake_services.py)
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+
+# On-disk SerpAPI result cache (keyed by normalized query, engine and num)
+SERPAPI_CACHE_DIR = os.getenv("SERPAPI_CACHE_DIR", os.path.join(".cache", "serpapi"))
+# Seconds a cached result is served as fresh
+SERPAPI_CACHE_TTL = int(os.getenv("SERPAPI_CACHE_TTL", "3600"))
+# Extra seconds a stale result is still served while it is refreshed in the background
+SERPAPI_CACHE_STALE_TTL = int(os.getenv("SERPAPI_CACHE_STALE_TTL", "86400"))
+# Cache entries with a background refresh in flight (threads and asyncio tasks), so concurrent stale hits
+# from variants, workers or the shared queue send one SerpAPI request instead of one each
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+def normalize_query(query):
     """
-    Search for news articles using SerpAPI Google News engine.
+    Normalize a search query so trivially different spellings share one cache entry.
+
+    Args:
+        query (str): The search keyword or phrase.
+    Returns:
+        str: NFKC-normalized, casefolded query with collapsed whitespace.
+    """
+    import unicodedata
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+def get_search_cache_path(query, engine, num, cache_dir=None):
+    """
+    Get the cache file path for a (normalized query, engine, num) search key.
+
+    Args:
+        query (str): The search keyword or phrase.
+        engine (str): SerpAPI engine name.
+        num (int): Number of requested results.
+        cache_dir (str or None): Cache directory (defaults to SERPAPI_CACHE_DIR).
+    Returns:
+        str: Path to the JSON cache file.
+    """
+    import hashlib
+    import json
+    key = json.dumps([normalize_query(query), engine, int(num)], ensure_ascii=False)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir or SERPAPI_CACHE_DIR, f"{digest}.json")
+
+def read_search_cache(cache_path):
+    """
+    Read a cached search result.
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+    Returns:
+        tuple[list[dict], float] or None: (results, age in seconds), or None if missing/unreadable.
+    """
+    import json
+    import time
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        return entry["results"], time.time() - entry["fetched_at"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def write_search_cache(cache_path, query, engine, num, results):
+    """
+    Atomically write a search result to the cache.
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+        query (str): The search keyword or phrase.
+        engine (str): SerpAPI engine name.
+        num (int): Number of requested results.
+        results (list[dict]): Articles with 'title', 'summary', and 'url'.
+    Returns:
+        None. (Saves JSON to cache_path)
+    """
+    import json
+    import time
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    entry = {
+        "query": normalize_query(query),
+        "engine": engine,
+        "num": num,
+        "fetched_at": time.time(),
+        "results": results
+    }
+    # pid and thread id: a background refresh and a foreground write in one process must not share a temp file
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+def fetch_news_results(query, max_results=3, engine="google_news"):
+    """
+    Query SerpAPI for news articles (no caching).
 
     Args:
         query (str): The search keyword or phrase.
         max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
     Returns:
-        list[dict]: List of articles, each as a dict with 'title', 'summary', and 'url'.
+        list[dict] or None: Articles with 'title', 'summary', and 'url', or None if the request failed.
     """
-    print(f"[Agent] Searching for news articles about: {query}")
-    import os
-    import requests
     api_key = os.getenv("SERPAPI_API_KEY")
-    url = "https://serpapi.com/search"
+    url = SERPAPI_URL
     params = {
         "q": query,
         "api_key": api_key,
         "num": max_results,
-        "engine": "google_news"
+        "engine": engine
     }
-    response = requests.get(url, params=params)
-    results = []
-    if response.status_code == 200:
-        data = response.json()
-        print(f"[Agent] Found {len(data.get('news_results', []))} articles.")
-        for item in data.get("news_results", []):
-            results.append({
-                "title": item.get("title", ""),
-                "summary": item.get("snippet", ""),
-                "url": item.get("link", "")
-            })
-    else:
+    with span("serpapi.search", "api", engine=engine, num=max_results) as s:
+        try:
+            response = get_http_session().get(url, params=params, timeout=call_timeout(30))
+        except (requests.RequestException, TimeoutError) as e:
+            print(f"[Agent] Failed to fetch articles: {e}")
+            return None
+        s.set(status=response.status_code, bytes=len(response.content))
+    if response.status_code != 200:
         print(f"[Agent] Failed to fetch articles. Status code: {response.status_code}")
+        return None
+    return parse_news_results(response.json())
+
+def parse_news_results(data):
+    """
+    Convert a SerpAPI news response into articles.
+
+    Args:
+        data (dict): Decoded SerpAPI JSON response.
+    Returns:
+        list[dict]: Articles with 'title', 'summary', and 'url'.
+    """
+    print(f"[Agent] Found {len(data.get('news_results', []))} articles.")
+    results = []
+    for item in data.get("news_results", []):
+        results.append({
+            "title": item.get("title", ""),
+            "summary": item.get("snippet", ""),
+            "url": item.get("link", "")
+        })
+    return results
+
+def revalidate_search_cache(cache_path, query, max_results, engine):
+    """
+    Refresh a cache entry from SerpAPI, keeping the old entry if the request fails.
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+        query (str): The search keyword or phrase.
+        max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
+    Returns:
+        list[dict] or None: Fresh results, or None if the request failed.
+    """
+    results = fetch_news_results(query, max_results, engine)
+    if results:
+        write_search_cache(cache_path, query, engine, max_results, results)
     return results
 
+def claim_revalidation(cache_path):
+    """
+    Claim the background refresh of a cache entry.
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+    Returns:
+        bool: True if the caller should refresh it (call release_revalidation when done), False if a refresh
+        is already in flight.
+    """
+    with _revalidating_lock:
+        if cache_path in _revalidating:
+            return False
+        _revalidating.add(cache_path)
+        return True
+
+def release_revalidation(cache_path):
+    """
+    Release a refresh claimed with claim_revalidation.
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+    Returns:
+        None.
+    """
+    with _revalidating_lock:
+        _revalidating.discard(cache_path)
+
+def revalidate_in_background(cache_path, query, max_results, engine):
+    """
+    Refresh a claimed cache entry (the body of the background refresh thread), releasing the claim when done.
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+        query (str): The search keyword or phrase.
+        max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
+    Returns:
+        None.
+    """
+    try:
+        revalidate_search_cache(cache_path, query, max_results, engine)
+    finally:
+        release_revalidation(cache_path)
+
+def web_search(query, max_results=3, engine="google_news", use_cache=True, cache_ttl=None, stale_ttl=None, cache_dir=None):
+    """
+    Search for news articles using SerpAPI Google News engine.
+    Results are cached on disk by normalized query, engine and num. Fresh entries (younger than
+    cache_ttl) are returned without a request; stale entries (younger than cache_ttl + stale_ttl)
+    are returned immediately while a background thread refreshes them.
+
+    Args:
+        query (str): The search keyword or phrase.
+        max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
+        use_cache (bool): Read/write the on-disk result cache.
+        cache_ttl (int or None): Freshness TTL in seconds (defaults to SERPAPI_CACHE_TTL).
+        stale_ttl (int or None): Stale-while-revalidate window in seconds (defaults to SERPAPI_CACHE_STALE_TTL).
+        cache_dir (str or None): Cache directory (defaults to SERPAPI_CACHE_DIR).
+    Returns:
+        list[dict]: List of articles, each as a dict with 'title', 'summary', and 'url'.
+    """
+    print(f"[Agent] Searching for news articles about: {query}")
+    if not use_cache:
+        return fetch_news_results(query, max_results, engine) or []
+    cache_ttl = SERPAPI_CACHE_TTL if cache_ttl is None else cache_ttl
+    stale_ttl = SERPAPI_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+    cache_path = get_search_cache_path(query, engine, max_results, cache_dir)
+    cached = read_search_cache(cache_path)
+    if cached is not None:
+        results, age = cached
+        if age <= cache_ttl:
+            print(f"[Agent] Using cached search results ({age:.0f}s old).")
+            return results
+        if age <= cache_ttl + stale_ttl:
+            if claim_revalidation(cache_path):
+                print(f"[Agent] Using stale search results ({age:.0f}s old), refreshing in background.")
+                # Daemon: a short-lived CLI run should not wait for the refresh when it exits
+                threading.Thread(target=revalidate_in_background, args=(cache_path, query, max_results, engine),
+                                 daemon=True).start()
+            else:
+                print(f"[Agent] Using stale search results ({age:.0f}s old), refresh already in progress.")
+            return results
+    results = revalidate_search_cache(cache_path, query, max_results, engine)
+    if results is None and cached is not None:
+        print(f"[Agent] Search failed, falling back to expired cached results.")
+        return cached[0]
+    return results or []
+
+# Tracking/query params that syndication partners append to the same story URL (matched by exact name, so
+# e.g. 'refid' or 'reference', which can identify the story, are kept)
+TRACKING_PARAMS = frozenset(("fbclid", "gclid", "ocid", "cmpid", "ref", "smid", "guccounter"))
+# Param name prefixes that are always tracking (utm_source, utm_medium, ...)
+TRACKING_PARAM_PREFIXES = ("utm_",)
+
+# Large Mersenne prime used for the MinHash permutations
+MINHASH_PRIME = (1 << 61) - 1
+
+def canonicalize_url(url):
+    """
+    Normalize an article URL so syndicated copies of the same page compare equal.
+
+    Args:
+        url (str): Article URL as returned by SerpAPI.
+    Returns:
+        str: Lowercased host without 'www.'/'m.'/'amp.', path without trailing slash or '/amp', tracking params removed.
+    """
+    from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m.", "amp."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = parts.path.rstrip("/")
+    if path.endswith("/amp"):
+        path = path[:-len("/amp")]
+    query = [(k, v) for k, v in parse_qsl(parts.query)
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PARAM_PREFIXES)]
+    return urlunsplit(("", host, path, urlencode(sorted(query)), ""))
+
+@functools.lru_cache(maxsize=8)
+def minhash_permutations(num_perm):
+    """
+    Hash permutation coefficients for MinHash, computed once per signature length.
+
+    Args:
+        num_perm (int): Number of permutations.
+    Returns:
+        tuple[tuple[int, int], ...]: (a, b) pairs for (a * h + b) mod MINHASH_PRIME.
+    """
+    import random
+    # Fixed seed so signatures are comparable across calls
+    rng = random.Random(num_perm)
+    return tuple((rng.randrange(1, MINHASH_PRIME), rng.randrange(0, MINHASH_PRIME)) for _ in range(num_perm))
+
+def minhash_signature(text, num_perm=64, shingle_size=3):
+    """
+    Compute a MinHash signature over word shingles of the given text.
+
+    Args:
+        text (str): Text to fingerprint (title plus snippet).
+        num_perm (int): Number of hash permutations (signature length).
+        shingle_size (int): Number of consecutive words per shingle.
+    Returns:
+        list[int] or None: MinHash signature of length num_perm, or None if the text has no words to compare.
+    """
+    import re
+    import zlib
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    if len(words) < shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return [min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in minhash_permutations(num_perm)]
+
+def dedup_articles(articles, max_articles=None, threshold=0.7, num_perm=64, shingle_size=3):
+    """
+    Drop near-duplicate (syndicated) articles before summarization.
+    Two articles are duplicates if their canonical URLs match or the estimated Jaccard
+    similarity of their title+snippet shingles is at least threshold. The first occurrence wins,
+    so later distinct articles move up into the freed slots.
+
+    Args:
+        articles (list[dict]): Articles with 'title', 'summary', and 'url' (from web_search).
+        max_articles (int or None): Maximum number of distinct articles to keep (all if None).
+        threshold (float): Similarity in [0, 1] at or above which two articles are duplicates.
+        num_perm (int): MinHash signature length.
+        shingle_size (int): Number of consecutive words per shingle.
+    Returns:
+        list[dict]: Distinct articles in their original order.
+    """
+    kept = []
+    seen_urls = set()
+    signatures = []
+    for article in articles:
+        url = canonicalize_url(article.get("url", ""))
+        if url and url in seen_urls:
+            print(f"[Agent] Skipping duplicate URL: {article.get('url')}")
+            continue
+        signature = minhash_signature(f"{article.get('title', '')} {article.get('summary', '')}", num_perm, shingle_size)
+        duplicate = False
+        # Without a title or snippet there is nothing to compare, so only the URL check applies
+        for other in signatures if signature is not None else ():
+            similarity = sum(1 for x, y in zip(signature, other) if x == y) / num_perm
+            if similarity >= threshold:
+                duplicate = True
+                break
+        if duplicate:
+            print(f"[Agent] Skipping near-duplicate article: {article.get('title')}")
+            continue
+        if url:
+            seen_urls.add(url)
+        if signature is not None:
+            signatures.append(signature)
+        kept.append(article)
+        if max_articles is not None and len(kept) >= max_articles:
+            break
+    print(f"[Agent] Kept {len(kept)} distinct articles out of {len(articles)}.")
+    return kept
+
+def estimate_chat_tokens(kwargs):
+    """
+    Rough token estimate (~4 chars per token) reserved up front and corrected from the reported usage.
+
+    Args:
+        kwargs (dict): Arguments for client.chat.completions.create.
+    Returns:
+        int: Estimated prompt plus completion tokens.
+    """
+    return sum(len(m.get("content", "")) for m in kwargs.get("messages", [])) // 4 + kwargs.get("max_tokens", 0)
+
+def chat_completion(client, stage, index=None, **kwargs):
+    """
+    Call client.chat.completions.create inside a tracing span, recording token usage.
+    The call goes through the shared OpenAI rate limiter, which queues it against the
+    requests/tokens per minute budget and retries it on 429. Each call is bounded by the
+    current stage deadline and, when hedging is on, hedged past the rolling P95 (see hedging.py).
+
+    Args:
+        client: OpenAI client.
+        stage (str): Pipeline stage making the call (e.g. 'summarize', 'card_scripts').
+        index (int or None): Article/card index the call is for, recorded on the span.
+        **kwargs: Arguments for client.chat.completions.create.
+    Returns:
+        ChatCompletion: OpenAI response.
+    """
+    limiter = get_limiter("openai")
+    estimated_tokens = estimate_chat_tokens(kwargs)
+
+    def attempt(timeout, cancelled):
+        # Completions are idempotent, so a losing hedge is simply discarded when it returns
+        call_kwargs = dict(kwargs, timeout=timeout) if timeout is not None else kwargs
+        return limiter.call(client.chat.completions.create, tokens=estimated_tokens, **call_kwargs)
+
+    with span("openai.chat", "api", stage=stage, index=index, model=kwargs.get("model")) as s:
+        response = hedged_call("openai.chat", attempt, default_timeout=CALL_TIMEOUTS["openai.chat"])
+        record_openai_usage(s, response)
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "total_tokens", None):
+        limiter.refund_tokens(estimated_tokens - usage.total_tokens)
+    return response
+
+SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant that summarizes news articles for YouTube card news. Each summary should be 2-4 short, punchy but informative sentences, followed by a fun fact about the topic."
+
+def build_summary_messages(article):
+    """
+    Build the chat messages that summarize one article: a fresh summary from the title when SerpAPI gave no
+    snippet, otherwise a card news rewrite of the snippet.
+
+    Args:
+        article (dict): Article with 'title', 'summary', and 'url'.
+    Returns:
+        list[dict]: Chat messages.
+    """
+    summary = article['summary']
+    if not summary:
+        print(f"[Agent] No snippet found. Using OpenAI to generate a paragraph summary and fun fact.")
+        # Use OpenAI to generate a very short, punchy summary for card news
+        prompt = (
+            f"Summarize the news article titled '{article['title']}' in 2-4 short, punchy, but also informative sentences for a YouTube card news slide. "
+            f"Make every sentence lively, energetic, and easy to read! Use exclamation marks and keep it fun! "
+            f"Be sure to include the main point, at least one key detail, and any important context so viewers understand the story. Then, add a fun, surprising, or interesting fact about the topic or article. "
+            f"Separate the summary and fun fact with a newline. Be engaging. If possible, use the URL: {article['url']}"
+        )
+    else:
+        print(f"[Agent] Compressing snippet using OpenAI for card news style and fun fact.")
+        # If snippet exists, compress it using OpenAI for card news style
+        prompt = (
+            f"Rewrite the following news summary in 2-4 short, punchy, but also informative sentences for a YouTube card news slide. "
+            f"Make every sentence lively, energetic, and easy to read! Use exclamation marks and keep it fun! "
+            f"Be sure to include the main point, at least one key detail, and any important context so viewers understand the story. Then, add a fun, surprising, or interesting fact about the topic or article. "
+            f"Separate the summary and fun fact with a newline. Be engaging.\nSummary: {summary}"
+        )
+    return [{"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}]
+
 def summarize_articles(articles, max_summaries=3):
     """
     Summarize up to max_summaries articles using OpenAI if needed.
@@ -59,51 +465,26 @@ def summarize_articles(articles, max_summaries=3):
         list[str]: List of summary strings (with fun facts).
     """
     print(f"[Agent] Summarizing up to {max_summaries} articles for card news...")
+    client = get_openai_client()
     summaries = []
     for idx, article in enumerate(articles[:max_summaries], 1):
         print(f"[Agent] Summarizing article {idx}: {article['title']}")
-        summary = article['summary']
-        if not summary:
-            print(f"[Agent] No snippet found. Using OpenAI to generate a paragraph summary and fun fact.")
-            # Use OpenAI to generate a very short, punchy summary for card news
-            prompt = (
-                f"Summarize the news article titled '{article['title']}' in 2-4 short, punchy, but also informative sentences for a YouTube card news slide. "
-                f"Make every sentence lively, energetic, and easy to read! Use exclamation marks and keep it fun! "
-                f"Be sure to include the main point, at least one key detail, and any important context so viewers understand the story. Then, add a fun, surprising, or interesting fact about the topic or article. "
-                f"Separate the summary and fun fact with a newline. Be engaging. If possible, use the URL: {article['url']}"
-            )
-            response = client.chat.completions.create(
-                model="gpt-4-0125-preview",
-                messages=[{"role": "system", "content": "You are a helpful assistant that summarizes news articles for YouTube card news. Each summary should be 2-4 short, punchy but informative sentences, followed by a fun fact about the topic."},
-                          {"role": "user", "content": prompt}],
-                max_tokens=220,
-                temperature=0.7
-            )
-            summary = response.choices[0].message.content.strip()
-        else:
-            print(f"[Agent] Compressing snippet using OpenAI for card news style and fun fact.")
-            # If snippet exists, compress it using OpenAI for card news style
-            prompt = (
-                f"Rewrite the following news summary in 2-4 short, punchy, but also informative sentences for a YouTube card news slide. "
-                f"Make every sentence lively, energetic, and easy to read! Use exclamation marks and keep it fun! "
-                f"Be sure to include the main point, at least one key detail, and any important context so viewers understand the story. Then, add a fun, surprising, or interesting fact about the topic or article. "
-                f"Separate the summary and fun fact with a newline. Be engaging.\nSummary: {summary}"
-            )
-            response = client.chat.completions.create(
-                model="gpt-4-0125-preview",
-                messages=[{"role": "system", "content": "You are a helpful assistant that summarizes news articles for YouTube card news. Each summary should be 2-4 short, punchy but informative sentences, followed by a fun fact about the topic."},
-                          {"role": "user", "content": prompt}],
-                max_tokens=220,
-                temperature=0.7
-            )
-            summary = response.choices[0].message.content.strip()
-        summaries.append(summary)
+        response = chat_completion(
+            client,
+            "summarize",
+            index=idx,
+            model="gpt-4-0125-preview",
+            messages=build_summary_messages(article),
+            max_tokens=220,
+            temperature=0.7
+        )
+        summaries.append(response.choices[0].message.content.strip())
     print(f"[Agent] All articles summarized.")
     return summaries
 
-def generate_card_news_contents(summaries, topic, num_cards=3, max_chars_per_card=220):
+def build_card_contents_messages(summaries, topic, num_cards=3, max_chars_per_card=220):
     """
-    Generate card news slide contents from summaries and topic using OpenAI.
+    Build the chat messages that turn article summaries into card news slides.
 
     Args:
         summaries (list[str]): List of article summaries.
@@ -111,9 +492,8 @@ def generate_card_news_contents(summaries, topic, num_cards=3, max_chars_per_car
         num_cards (int): Number of card slides to generate.
         max_chars_per_card (int): Max characters per card.
     Returns:
-        list[str]: List of card content strings (with hashtags as title line).
+        list[dict]: Chat messages.
     """
-    print(f"[Agent] Generating {num_cards} fun, joyful card news slides from all summaries...")
     # Join all summaries into one context
     all_summaries = "\n".join(summaries)
     prompt = (
@@ -128,15 +508,21 @@ def generate_card_news_contents(summaries, topic, num_cards=3, max_chars_per_car
         f"Add relevant, fun, and visually appealing emojis to each card to make the visuals more attractive and engaging. Use at least 2-3 emojis per card, and place them naturally in the text or at the start/end of lines.\n\n"
         f"Article summaries:\n{all_summaries}"
     )
-    response = client.chat.completions.create(
-        model="gpt-4-0125-preview",
-        messages=[{"role": "system", "content": f"You are a creative, playful YouTube Shorts scriptwriter for card news! Generate a sequence of fun, joyful card news slides from the provided summaries! Do not use Markdown or formatting symbols! Limit each card to {max_chars_per_card} characters or less! Add relevant, fun, and visually appealing emojis to each card for better visual impact."},
-                  {"role": "user", "content": prompt}],
-        max_tokens=1200,
-        temperature=0.9
-    )
+    return [{"role": "system", "content": f"You are a creative, playful YouTube Shorts scriptwriter for card news! Generate a sequence of fun, joyful card news slides from the provided summaries! Do not use Markdown or formatting symbols! Limit each card to {max_chars_per_card} characters or less! Add relevant, fun, and visually appealing emojis to each card for better visual impact."},
+            {"role": "user", "content": prompt}]
+
+def parse_card_contents(content, num_cards=3, max_chars_per_card=220):
+    """
+    Split the model's card news response into card contents.
+
+    Args:
+        content (str): Response text (hashtag line, then 'Card 1:', 'Card 2:', ...).
+        num_cards (int): Number of card slides to keep.
+        max_chars_per_card (int): Max characters per card (cards are cut at sentence boundaries).
+    Returns:
+        list[str]: List of card content strings (with hashtags as title line).
+    """
     # Split the response into individual card contents
-    content = response.choices[0].message.content.strip()
     # Extract hashtags (assume they are at the very top, before Card 1:)
     import re
     hashtag_match = re.match(r"^#.*", content)
@@ -167,48 +553,99 @@ def generate_card_news_contents(summaries, topic, num_cards=3, max_chars_per_car
     # Limit to num_cards
     card_contents = card_contents[:num_cards]
     # Prepend hashtags to each card as the Title line
-    card_contents = [f"{hashtags}\n{c}" for c in card_contents]
+    return [f"{hashtags}\n{c}" for c in card_contents]
+
+def generate_card_news_contents(summaries, topic, num_cards=3, max_chars_per_card=220):
+    """
+    Generate card news slide contents from summaries and topic using OpenAI.
+
+    Args:
+        summaries (list[str]): List of article summaries.
+        topic (str): The main topic or keyword.
+        num_cards (int): Number of card slides to generate.
+        max_chars_per_card (int): Max characters per card.
+    Returns:
+        list[str]: List of card content strings (with hashtags as title line).
+    """
+    print(f"[Agent] Generating {num_cards} fun, joyful card news slides from all summaries...")
+    client = get_openai_client()
+    response = chat_completion(
+        client,
+        "card_contents",
+        model="gpt-4-0125-preview",
+        messages=build_card_contents_messages(summaries, topic, num_cards, max_chars_per_card),
+        max_tokens=1200,
+        temperature=0.9
+    )
+    card_contents = parse_card_contents(response.choices[0].message.content.strip(), num_cards, max_chars_per_card)
     print(f"[Agent] Card news contents generated.")
     return card_contents
 
-def generate_card_scripts(card_contents):
+def build_script_messages(content, previous_content=None, language=None):
+    """
+    Build the chat messages that rewrite one card as a spoken script. Cards after the first get a transition
+    from the previous card's content (not its script), so every card's messages are known up front.
+
+    Args:
+        content (str): Card content without its hashtag title line.
+        previous_content (str or None): Previous card's content (None for the first card).
+        language (str or None): Language to write the script in (None keeps the content's language).
+    Returns:
+        list[dict]: Chat messages.
+    """
+    system_prompt = "You are a lively YouTube Shorts host. Rewrite the content as a natural, spoken script, not just reading the text. For cards after the first, make sure to connect the script smoothly to the previous card, using transition phrases or referencing what was just said. Keep it short: 3 sentences or about 220 characters max."
+    if language:
+        system_prompt += f" Write the script in {language}."
+    if previous_content is None:
+        prompt = (
+            f"Rewrite the following card news content as if a lively, friendly person is talking directly to the viewer for a YouTube Short. "
+            f"Make it sound natural, conversational, and engaging—add a greeting, rhetorical questions, or reactions if appropriate. "
+            f"Keep it short and energetic, and don't just read the text—make it feel like a real person is talking! Limit the script to 3 sentences or about 220 characters maximum.\n\nContent: {content}"
+        )
+    else:
+        prompt = (
+            f"Rewrite the following card news content as if a lively, friendly person is talking directly to the viewer for a YouTube Short. "
+            f"Make it sound natural, conversational, and engaging—add a transition from the previous card, referencing what was just said or using a connecting phrase (like 'And that's not all!', 'Next up,', 'But wait, there's more!', etc.). "
+            f"Make the flow feel like a continuous story, not isolated slides. "
+            f"Don't just read the text—make it feel like a real person is talking! Limit the script to 3 sentences or about 220 characters maximum.\n\nPrevious card: {previous_content}\nCurrent card: {content}"
+        )
+    return [{"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}]
+
+def strip_title_line(text):
+    """
+    Remove the hashtag title line from a card's content.
+
+    Args:
+        text (str): Card content string.
+    Returns:
+        str: Content below the title line (the whole text if it has a single line).
+    """
+    return text.split('\n', 1)[1] if '\n' in text else text
+
+def generate_card_scripts(card_contents, language=None):
     """
     Generate lively spoken scripts for each card using OpenAI, with smooth transitions.
 
     Args:
         card_contents (list[str]): List of card content strings (with hashtags/title line).
+        language (str or None): Language to write the scripts in (e.g. 'Korean'; None keeps the content's language).
     Returns:
         list[str]: List of spoken script strings for each card.
     """
-    print(f"[Agent] Generating lively spoken scripts for each card...")
-    import openai
-    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'YOUR_OPENAI_API_KEY')
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    print(f"[Agent] Generating lively spoken scripts for each card{f' in {language}' if language else ''}...")
+    client = get_openai_client()
     scripts = []
     previous_content = None
     for idx, text in enumerate(card_contents, 1):
         # Remove hashtags/title line for script
-        if '\n' in text:
-            _, content = text.split('\n', 1)
-        else:
-            content = text
-        if idx == 1:
-            prompt = (
-                f"Rewrite the following card news content as if a lively, friendly person is talking directly to the viewer for a YouTube Short. "
-                f"Make it sound natural, conversational, and engaging—add a greeting, rhetorical questions, or reactions if appropriate. "
-                f"Keep it short and energetic, and don't just read the text—make it feel like a real person is talking! Limit the script to 3 sentences or about 220 characters maximum.\n\nContent: {content}"
-            )
-        else:
-            prompt = (
-                f"Rewrite the following card news content as if a lively, friendly person is talking directly to the viewer for a YouTube Short. "
-                f"Make it sound natural, conversational, and engaging—add a transition from the previous card, referencing what was just said or using a connecting phrase (like 'And that's not all!', 'Next up,', 'But wait, there's more!', etc.). "
-                f"Make the flow feel like a continuous story, not isolated slides. "
-                f"Don't just read the text—make it feel like a real person is talking! Limit the script to 3 sentences or about 220 characters maximum.\n\nPrevious card: {previous_content}\nCurrent card: {content}"
-            )
-        response = client.chat.completions.create(
+        content = strip_title_line(text)
+        response = chat_completion(
+            client,
+            "card_scripts",
+            index=idx,
             model="gpt-4-0125-preview",
-            messages=[{"role": "system", "content": "You are a lively YouTube Shorts host. Rewrite the content as a natural, spoken script, not just reading the text. For cards after the first, make sure to connect the script smoothly to the previous card, using transition phrases or referencing what was just said. Keep it short: 3 sentences or about 220 characters max."},
-                      {"role": "user", "content": prompt}],
+            messages=build_script_messages(content, previous_content, language),
             max_tokens=180,
             temperature=0.95
         )
@@ -218,10 +655,234 @@ def generate_card_scripts(card_contents):
     print(f"[Agent] Card scripts generated.")
     return scripts
 
+# Background revalidation tasks, referenced until they finish so they are not garbage collected
+_revalidation_tasks = set()
+
+async def fetch_news_results_async(query, max_results=3, engine="google_news"):
+    """
+    Asyncio counterpart of fetch_news_results.
+
+    Args:
+        query (str): The search keyword or phrase.
+        max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
+    Returns:
+        list[dict] or None: Articles with 'title', 'summary', and 'url', or None if the request failed.
+    """
+    import httpx
+    params = {
+        "q": query,
+        "api_key": os.getenv("SERPAPI_API_KEY"),
+        "num": max_results,
+        "engine": engine
+    }
+    with span("serpapi.search", "api", engine=engine, num=max_results) as s:
+        try:
+            response = await get_async_http_client().get(SERPAPI_URL, params=params, timeout=call_timeout(30))
+        except (httpx.HTTPError, TimeoutError) as e:
+            print(f"[Agent] Failed to fetch articles: {e}")
+            return None
+        s.set(status=response.status_code, bytes=len(response.content))
+    if response.status_code != 200:
+        print(f"[Agent] Failed to fetch articles. Status code: {response.status_code}")
+        return None
+    return parse_news_results(response.json())
+
+async def revalidate_search_cache_async(cache_path, query, max_results, engine):
+    """
+    Asyncio counterpart of revalidate_search_cache.
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+        query (str): The search keyword or phrase.
+        max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
+    Returns:
+        list[dict] or None: Fresh results, or None if the request failed.
+    """
+    results = await fetch_news_results_async(query, max_results, engine)
+    if results:
+        write_search_cache(cache_path, query, engine, max_results, results)
+    return results
+
+async def revalidate_in_background_async(cache_path, query, max_results, engine):
+    """
+    Asyncio counterpart of revalidate_in_background (the body of the background refresh task).
+
+    Args:
+        cache_path (str): Path to the JSON cache file.
+        query (str): The search keyword or phrase.
+        max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
+    Returns:
+        None.
+    """
+    try:
+        await revalidate_search_cache_async(cache_path, query, max_results, engine)
+    finally:
+        release_revalidation(cache_path)
+
+async def web_search_async(query, max_results=3, engine="google_news", use_cache=True, cache_ttl=None, stale_ttl=None, cache_dir=None):
+    """
+    Asyncio counterpart of web_search, sharing its on-disk cache. Stale entries are returned immediately
+    and refreshed in a background task.
+
+    Args:
+        query (str): The search keyword or phrase.
+        max_results (int): Maximum number of articles to return.
+        engine (str): SerpAPI engine name.
+        use_cache (bool): Read/write the on-disk result cache.
+        cache_ttl (int or None): Freshness TTL in seconds (defaults to SERPAPI_CACHE_TTL).
+        stale_ttl (int or None): Stale-while-revalidate window in seconds (defaults to SERPAPI_CACHE_STALE_TTL).
+        cache_dir (str or None): Cache directory (defaults to SERPAPI_CACHE_DIR).
+    Returns:
+        list[dict]: List of articles, each as a dict with 'title', 'summary', and 'url'.
+    """
+    import asyncio
+    import contextvars
+    print(f"[Agent] Searching for news articles about: {query}")
+    if not use_cache:
+        return await fetch_news_results_async(query, max_results, engine) or []
+    cache_ttl = SERPAPI_CACHE_TTL if cache_ttl is None else cache_ttl
+    stale_ttl = SERPAPI_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+    cache_path = get_search_cache_path(query, engine, max_results, cache_dir)
+    cached = read_search_cache(cache_path)
+    if cached is not None:
+        results, age = cached
+        if age <= cache_ttl:
+            print(f"[Agent] Using cached search results ({age:.0f}s old).")
+            return results
+        if age <= cache_ttl + stale_ttl:
+            if claim_revalidation(cache_path):
+                print(f"[Agent] Using stale search results ({age:.0f}s old), refreshing in background.")
+                # Created in an empty context so the refresh is not bound by this job's deadline or cancelled with it
+                task = contextvars.Context().run(asyncio.ensure_future, revalidate_in_background_async(cache_path, query, max_results, engine))
+                _revalidation_tasks.add(task)
+                task.add_done_callback(_revalidation_tasks.discard)
+            else:
+                print(f"[Agent] Using stale search results ({age:.0f}s old), refresh already in progress.")
+            return results
+    results = await revalidate_search_cache_async(cache_path, query, max_results, engine)
+    if results is None and cached is not None:
+        print(f"[Agent] Search failed, falling back to expired cached results.")
+        return cached[0]
+    return results or []
+
+async def chat_completion_async(client, stage, index=None, **kwargs):
+    """
+    Asyncio counterpart of chat_completion, for an AsyncOpenAI client.
+
+    Args:
+        client: AsyncOpenAI client.
+        stage (str): Pipeline stage making the call (e.g. 'summarize', 'card_scripts').
+        index (int or None): Article/card index the call is for, recorded on the span.
+        **kwargs: Arguments for client.chat.completions.create.
+    Returns:
+        ChatCompletion: OpenAI response.
+    """
+    limiter = get_limiter("openai")
+    estimated_tokens = estimate_chat_tokens(kwargs)
+
+    async def attempt(timeout):
+        call_kwargs = dict(kwargs, timeout=timeout) if timeout is not None else kwargs
+        return await limiter.acall(client.chat.completions.create, tokens=estimated_tokens, **call_kwargs)
+
+    with span("openai.chat", "api", stage=stage, index=index, model=kwargs.get("model")) as s:
+        response = await hedged_call_async("openai.chat", attempt, default_timeout=CALL_TIMEOUTS["openai.chat"])
+        record_openai_usage(s, response)
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "total_tokens", None):
+        limiter.refund_tokens(estimated_tokens - usage.total_tokens)
+    return response
+
+async def summarize_articles_async(articles, max_summaries=3):
+    """
+    Asyncio counterpart of summarize_articles; the articles are summarized concurrently.
+
+    Args:
+        articles (list[dict]): List of articles with 'title', 'summary', and 'url'.
+        max_summaries (int): Maximum number of articles to summarize.
+    Returns:
+        list[str]: List of summary strings (with fun facts), in article order.
+    """
+    import asyncio
+    print(f"[Agent] Summarizing up to {max_summaries} articles for card news...")
+    client = get_async_openai_client()
+    calls = []
+    for idx, article in enumerate(articles[:max_summaries], 1):
+        print(f"[Agent] Summarizing article {idx}: {article['title']}")
+        calls.append(chat_completion_async(
+            client,
+            "summarize",
+            index=idx,
+            model="gpt-4-0125-preview",
+            messages=build_summary_messages(article),
+            max_tokens=220,
+            temperature=0.7
+        ))
+    responses = await asyncio.gather(*calls)
+    print(f"[Agent] All articles summarized.")
+    return [response.choices[0].message.content.strip() for response in responses]
+
+async def generate_card_news_contents_async(summaries, topic, num_cards=3, max_chars_per_card=220):
+    """
+    Asyncio counterpart of generate_card_news_contents.
+
+    Args:
+        summaries (list[str]): List of article summaries.
+        topic (str): The main topic or keyword.
+        num_cards (int): Number of card slides to generate.
+        max_chars_per_card (int): Max characters per card.
+    Returns:
+        list[str]: List of card content strings (with hashtags as title line).
+    """
+    print(f"[Agent] Generating {num_cards} fun, joyful card news slides from all summaries...")
+    response = await chat_completion_async(
+        get_async_openai_client(),
+        "card_contents",
+        model="gpt-4-0125-preview",
+        messages=build_card_contents_messages(summaries, topic, num_cards, max_chars_per_card),
+        max_tokens=1200,
+        temperature=0.9
+    )
+    card_contents = parse_card_contents(response.choices[0].message.content.strip(), num_cards, max_chars_per_card)
+    print(f"[Agent] Card news contents generated.")
+    return card_contents
+
+async def generate_card_scripts_async(card_contents, language=None):
+    """
+    Asyncio counterpart of generate_card_scripts. Each card's transition only needs the previous card's
+    content, so every card's script is generated concurrently.
+
+    Args:
+        card_contents (list[str]): List of card content strings (with hashtags/title line).
+        language (str or None): Language to write the scripts in (None keeps the content's language).
+    Returns:
+        list[str]: List of spoken script strings for each card.
+    """
+    import asyncio
+    print(f"[Agent] Generating lively spoken scripts for each card{f' in {language}' if language else ''}...")
+    client = get_async_openai_client()
+    contents = [strip_title_line(text) for text in card_contents]
+    responses = await asyncio.gather(*[
+        chat_completion_async(
+            client,
+            "card_scripts",
+            index=idx,
+            model="gpt-4-0125-preview",
+            messages=build_script_messages(content, contents[idx - 2] if idx > 1 else None, language),
+            max_tokens=180,
+            temperature=0.95
+        )
+        for idx, content in enumerate(contents, 1)
+    ])
+    print(f"[Agent] Card scripts generated.")
+    return [response.choices[0].message.content.strip() for response in responses]
+
 def main():
     # Example usage for testing
     query = input("Enter a search query for news articles: ")
-    articles = web_search(query)
+    articles = dedup_articles(web_search(query))
     summaries = summarize_articles(articles)
     card_contents = generate_card_news_contents(summaries, query)
     scripts = generate_card_scripts(card_contents)
@@ -1,28 +1,22 @@
 """
 bg_music_retrieval.py: Downloads copyright-free background music from Jamendo based on topic/tags for use in card news videos.
+The *_async functions are asyncio counterparts used by run_pipeline_async.
 """
-import requests
 import os
 from dotenv import load_dotenv
 import json
+from tracing import span
+from api_clients import get_http_session, get_async_http_client
+import media_probe
+# Tag lists live with the classifier; re-exported here for existing importers
+from music_tags import POPULAR_GENRE_TAGS, POPULAR_MOOD_TAGS, suggest_tags
 
 # Load environment variables from .env file
 load_dotenv()
 
 JAMENDO_CLIENT_ID = os.getenv("JAMENDO_CLIENT_ID")
-print(f"[DEBUG] JAMENDO_CLIENT_ID: {JAMENDO_CLIENT_ID}")  # Debug print
-
-# Popular Jamendo tags that are known to work
-POPULAR_GENRE_TAGS = [
-    "pop", "rock", "electronic", "jazz", "classical", "metal", 
-    "hiphop", "folk", "blues", "reggae", "funk", "country",
-    "soundtrack", "world", "ambient", "lounge"
-]
-
-POPULAR_MOOD_TAGS = [
-    "happy", "energetic", "calm", "upbeat", "chill", "romantic",
-    "dark", "uplifting", "peaceful", "dramatic", "party"
-]
+# Jamendo tracks endpoint (overridable to point at a local stand-in, see fake_services.py)
+JAMENDO_TRACKS_URL = os.getenv("JAMENDO_TRACKS_URL", "https://api.jamendo.com/v3.0/tracks/")
 
 # Featured selections recommended by Jamendo API documentation
 FEATURED_GENRES = [
@@ -33,67 +27,47 @@ FEATURED_GENRES = [
 
 def get_working_tags_by_topic(topic):
     """
-    Return a list of single, popular Jamendo tags based on the topic string.
+    Return a list of single, popular Jamendo tags based on the topic string (see music_tags.classify).
 
     Args:
         topic (str): Topic or keyword string.
     Returns:
         list[str]: List of Jamendo tags suitable for the topic.
     """
-    topic = topic.lower()
-    
-    # Map topics to single, popular tags
-    if any(word in topic for word in ["kids", "children", "playful", "funny", "cartoon"]):
-        return ["pop", "happy"]  # Children-friendly content
-    elif any(word in topic for word in ["tech", "ai", "robot", "future", "startup"]):
-        return ["electronic", "upbeat"]  # Tech/corporate content
-    elif any(word in topic for word in ["news", "update", "trend", "today"]):
-        return ["pop", "upbeat"]  # News content
-    elif any(word in topic for word in ["happy", "joy", "smile", "celebrate"]):
-        return ["happy", "upbeat"]  # Happy content
-    elif any(word in topic for word in ["calm", "relax", "meditation", "peaceful"]):
-        return ["calm", "relaxation"]  # Calm content
-    elif any(word in topic for word in ["party", "dance", "club", "energetic"]):
-        return ["party", "energetic"]  # Party content
-    elif any(word in topic for word in ["romantic", "love", "date", "wedding"]):
-        return ["romantic", "pop"]  # Romantic content
-    else:
-        # Default fallback to most popular working tags
-        return ["pop", "happy"]
+    return suggest_tags(topic, use_llm=False)
 
-def search_jamendo_tracks_single_tag(tag, limit=10):
+def build_jamendo_params(tag, limit):
     """
-    Query Jamendo API for tracks using a single tag.
+    Build Jamendo track search parameters.
 
     Args:
-        tag (str): Jamendo tag to search for.
+        tag (str or None): Single Jamendo tag (None for the most popular tracks overall).
         limit (int): Number of tracks to return.
     Returns:
-        list[dict]: List of track dicts from Jamendo API.
+        dict: Query parameters.
     """
-    url = "https://api.jamendo.com/v3.0/tracks/"
     params = {
         "client_id": JAMENDO_CLIENT_ID,
         "format": "json",
         "limit": limit,
-        "tags": tag,  # Single tag only
         "audioformat": "mp32",
         "order": "popularity_total",
         "include": "musicinfo",
         "featured": "1"  # Only featured content for better quality
     }
-    
-    print(f"[DEBUG] Trying tag: '{tag}'")
-    response = requests.get(url, params=params)
-    print(f"[DEBUG] API status: {response.status_code}")
-    
-    if response.status_code != 200:
-        print(f"[DEBUG] API Error: {response.text}")
-        return []
-    
-    data = response.json()
-    print(f"[DEBUG] Results count: {data.get('headers', {}).get('results_count', 0)}")
-    
+    if tag is not None:
+        params["tags"] = tag  # Single tag only
+    return params
+
+def parse_jamendo_tracks(data):
+    """
+    Convert a Jamendo tracks response into track dicts.
+
+    Args:
+        data (dict): Decoded Jamendo JSON response.
+    Returns:
+        list[dict]: Tracks with 'title', 'artist', 'listen_url', 'download_url', 'duration' and 'license'.
+    """
     tracks = []
     for item in data.get("results", []):
         track = {
@@ -107,6 +81,33 @@ def search_jamendo_tracks_single_tag(tag, limit=10):
         tracks.append(track)
     return tracks
 
+def search_jamendo_tracks_single_tag(tag, limit=10):
+    """
+    Query Jamendo API for tracks using a single tag.
+
+    Args:
+        tag (str): Jamendo tag to search for.
+        limit (int): Number of tracks to return.
+    Returns:
+        list[dict]: List of track dicts from Jamendo API.
+    """
+    url = JAMENDO_TRACKS_URL
+    params = build_jamendo_params(tag, limit)
+    
+    print(f"[DEBUG] Trying tag: '{tag}'")
+    with span("jamendo.search", "api", tag=tag, limit=limit) as s:
+        response = get_http_session().get(url, params=params)
+        s.set(status=response.status_code, bytes=len(response.content))
+    print(f"[DEBUG] API status: {response.status_code}")
+    
+    if response.status_code != 200:
+        print(f"[DEBUG] API Error: {response.text}")
+        return []
+    
+    data = response.json()
+    print(f"[DEBUG] Results count: {data.get('headers', {}).get('results_count', 0)}")
+    return parse_jamendo_tracks(data)
+
 def search_jamendo_tracks_comprehensive(topic_tags, limit=5):
     """
     Comprehensive search strategy using multiple approaches.
@@ -154,29 +155,13 @@ def search_jamendo_tracks_comprehensive(topic_tags, limit=5):
     # Strategy 4: Try without tags (most popular)
     if not all_tracks:
         print("[DEBUG] Strategy 4: Most popular tracks (no tags)")
-        url = "https://api.jamendo.com/v3.0/tracks/"
-        params = {
-            "client_id": JAMENDO_CLIENT_ID,
-            "format": "json",
-            "limit": limit,
-            "order": "popularity_total",
-            "featured": "1",
-            "audioformat": "mp32",
-            "include": "musicinfo"
-        }
-        response = requests.get(url, params=params)
+        url = JAMENDO_TRACKS_URL
+        params = build_jamendo_params(None, limit)
+        with span("jamendo.search", "api", tag=None, limit=limit) as s:
+            response = get_http_session().get(url, params=params)
+            s.set(status=response.status_code, bytes=len(response.content))
         if response.status_code == 200:
-            data = response.json()
-            for item in data.get("results", []):
-                track = {
-                    "title": item.get("name"),
-                    "artist": item.get("artist_name"),
-                    "listen_url": item.get("audio"),
-                    "download_url": item.get("audiodownload"),
-                    "duration": item.get("duration"),
-                    "license": item.get("license_ccurl")
-                }
-                all_tracks.append(track)
+            all_tracks.extend(parse_jamendo_tracks(response.json()))
             print(f"[SUCCESS] Found {len(all_tracks)} popular tracks without tags")
     
     return all_tracks[:limit]
@@ -215,12 +200,16 @@ def download_music(url, output_path):
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     print(f"[Music] Attempting to download from: {url}")
     try:
-        response = requests.get(url, stream=True, timeout=30)
-        print(f"[Music] HTTP status: {response.status_code}")
+        with span("jamendo.download", "api") as s:
+            response = get_http_session().get(url, stream=True, timeout=30)
+            print(f"[Music] HTTP status: {response.status_code}")
+            s.set(status=response.status_code)
+            if response.status_code == 200:
+                with open(output_path, 'wb') as f:
+                    for chunk in response.iter_content(1024):
+                        f.write(chunk)
+                        s.add("bytes", len(chunk))
         if response.status_code == 200:
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
             print(f"[Music] Downloaded: {output_path}")
             return True
         else:
@@ -230,55 +219,217 @@ def download_music(url, output_path):
         print(f"[Music] Exception occurred: {e}")
         return False
 
-def suggest_tags_from_card_news(json_path="card_news_output.json"):
+def get_narration_seconds(audio_dir="audio"):
+    """
+    Total narration length, read from the card_*.mp3 headers in audio_dir (see media_probe.py).
+
+    Args:
+        audio_dir (str): Directory with the narration files.
+    Returns:
+        float: Seconds of narration (0 if there is none yet).
+    """
+    if not os.path.isdir(audio_dir):
+        return 0.0
+    names = [name for name in os.listdir(audio_dir) if name.startswith("card_") and name.endswith(".mp3")]
+    return sum(media_probe.get_duration(os.path.join(audio_dir, name)) or 0.0 for name in names)
+
+def rank_tracks_for_duration(tracks, min_seconds):
     """
-    Suggest Jamendo tags based on the generated card news script/content using OpenAI.
+    Order downloadable tracks so that those long enough for the video (by Jamendo's duration) come first.
+
+    Args:
+        tracks (list[dict]): Tracks from the Jamendo search, in relevance order.
+        min_seconds (float): Length the music has to cover.
+    Returns:
+        list[dict]: Downloadable tracks, long-enough ones first, otherwise in their original order.
+    """
+    downloadable = [t for t in tracks if t['download_url']]
+    return sorted(downloadable, key=lambda t: (t['duration'] or 0) < min_seconds)
+
+def get_music_filename(track):
+    filename = f"bg_music_{track['title'][:30].replace(' ', '_')}.mp3"
+    # Remove invalid filename characters
+    return "".join(c for c in filename if c.isalnum() or c in "._-")
+
+def check_downloaded_track(track, path, min_seconds, last_candidate=True):
+    """
+    Check a downloaded track against its MP3 headers instead of trusting Jamendo's duration field.
+    A track that is unreadable, or shorter than the narration while other candidates remain, is deleted.
+
+    Args:
+        track (dict): Track from the Jamendo search.
+        path (str): Downloaded file.
+        min_seconds (float): Length the music has to cover.
+        last_candidate (bool): Keep a readable but short track when there is nothing else to try.
+    Returns:
+        dict or None: Music info for music_info.json ('music_title', 'music_artist', 'music_path',
+        'music_duration', 'music_sample_rate'), or None if the track was rejected.
+    """
+    try:
+        info = media_probe.probe(path)
+    except (OSError, ValueError) as e:
+        print(f"[Music] Downloaded file is not a readable MP3 ({e}); skipping it.")
+        os.remove(path)
+        return None
+    if track['duration'] and abs(info["duration"] - track['duration']) > 2:
+        print(f"[Music] Jamendo lists '{track['title']}' as {track['duration']}s but the file is {info['duration']:.1f}s.")
+    if info["duration"] < min_seconds and not last_candidate:
+        print(f"[Music] '{track['title']}' ({info['duration']:.1f}s) is shorter than the narration ({min_seconds:.1f}s); trying the next track.")
+        os.remove(path)
+        return None
+    return {
+        "music_title": track['title'],
+        "music_artist": track['artist'],
+        "music_path": path,
+        "music_duration": info["duration"],
+        "music_sample_rate": info["sample_rate"]
+    }
+
+async def search_jamendo_tracks_single_tag_async(tag, limit=10):
+    """
+    Asyncio counterpart of search_jamendo_tracks_single_tag.
+
+    Args:
+        tag (str or None): Jamendo tag to search for (None for the most popular tracks overall).
+        limit (int): Number of tracks to return.
+    Returns:
+        list[dict]: List of track dicts from Jamendo API.
+    """
+    import httpx
+    print(f"[DEBUG] Trying tag: '{tag}'")
+    with span("jamendo.search", "api", tag=tag, limit=limit) as s:
+        try:
+            response = await get_async_http_client().get(JAMENDO_TRACKS_URL, params=build_jamendo_params(tag, limit), timeout=30)
+        except httpx.HTTPError as e:
+            print(f"[DEBUG] API Error: {e}")
+            return []
+        s.set(status=response.status_code, bytes=len(response.content))
+    if response.status_code != 200:
+        print(f"[DEBUG] API Error: {response.text}")
+        return []
+    return parse_jamendo_tracks(response.json())
+
+async def search_jamendo_tracks_async(topic_tags, limit=5):
+    """
+    Asyncio counterpart of search_jamendo_tracks_comprehensive. The strategies (topic tags, featured genres,
+    popular moods, no tags) are still tried in turn, but the tags within a strategy are searched concurrently.
+
+    Args:
+        topic_tags (list[str] or str): Tags to search for (a comma-separated string is split).
+        limit (int): Number of tracks to return.
+    Returns:
+        list[dict]: List of track dicts from Jamendo API.
+    """
+    import asyncio
+    if isinstance(topic_tags, str):
+        topic_tags = [tag.strip() for tag in topic_tags.split(",") if tag.strip()]
+    strategies = [topic_tags or ["pop", "happy"], FEATURED_GENRES[:5], ["happy", "upbeat", "energetic"], [None]]
+    for tags in strategies:
+        results = await asyncio.gather(*[search_jamendo_tracks_single_tag_async(tag, limit) for tag in tags])
+        all_tracks = [track for tracks in results for track in tracks]
+        if all_tracks:
+            print(f"[SUCCESS] Found {len(all_tracks)} tracks with tags: {tags}")
+            return all_tracks[:limit]
+    return []
+
+async def download_music_async(url, output_path):
+    """
+    Asyncio counterpart of download_music; the file is streamed to a temporary path and renamed into place,
+    so a cancelled download leaves nothing behind.
+
+    Args:
+        url (str): URL of the music file to download.
+        output_path (str): Local path to save the downloaded music file.
+    Returns:
+        bool: True if download was successful, False otherwise.
+    """
+    import httpx
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    print(f"[Music] Attempting to download from: {url}")
+    tmp_path = f"{output_path}.part"
+    try:
+        with span("jamendo.download", "api") as s:
+            async with get_async_http_client().stream("GET", url, timeout=30, follow_redirects=True) as response:
+                print(f"[Music] HTTP status: {response.status_code}")
+                s.set(status=response.status_code)
+                if response.status_code != 200:
+                    print(f"[Music] Failed to download from {url}. Status: {response.status_code}")
+                    return False
+                with open(tmp_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes():
+                        f.write(chunk)
+                        s.add("bytes", len(chunk))
+        os.replace(tmp_path, output_path)
+        print(f"[Music] Downloaded: {output_path}")
+        return True
+    except httpx.HTTPError as e:
+        print(f"[Music] Exception occurred: {e}")
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+async def fetch_background_music_async(topic_tags, music_dir="music", info_path="music_info.json", min_seconds=0.0):
+    """
+    Search Jamendo for the tags and download the first downloadable track that covers min_seconds
+    (the async equivalent of main()).
+
+    Args:
+        topic_tags (list[str] or str): Tags to search for.
+        music_dir (str): Directory to save the track in.
+        info_path (str): Where to write music_info.json for the video generator.
+        min_seconds (float or awaitable): Length the music has to cover (see check_downloaded_track). An awaitable
+            (e.g. narration that is still being generated) is awaited after the Jamendo search, which overlaps with it.
+    Returns:
+        dict or None: Music info (see check_downloaded_track), or None if nothing was downloaded.
+    """
+    import inspect
+    if not JAMENDO_CLIENT_ID:
+        print("[ERROR] JAMENDO_CLIENT_ID not found in environment variables!")
+        if inspect.iscoroutine(min_seconds):
+            min_seconds.close()
+        return None
+    recommendations = await search_jamendo_tracks_async(topic_tags, limit=5)
+    if inspect.isawaitable(min_seconds):
+        min_seconds = await min_seconds
+    candidates = rank_tracks_for_duration(recommendations, min_seconds)
+    if not candidates:
+        print("[WARNING] No download link available for any track.")
+    for idx, track in enumerate(candidates):
+        full_path = os.path.join(music_dir, get_music_filename(track))
+        if not await download_music_async(track['download_url'], full_path):
+            continue
+        music_info = check_downloaded_track(track, full_path, min_seconds, last_candidate=idx == len(candidates) - 1)
+        if music_info is None:
+            continue
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(music_info, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Music info written to {info_path}")
+        return music_info
+    return None
+
+def suggest_tags_from_card_news(json_path="card_news_output.json", use_llm=None):
+    """
+    Suggest Jamendo tags based on the generated card news script/content with the local tag classifier
+    (music_tags.py); OpenAI is only asked to break close calls when use_llm/MUSIC_TAGS_LLM is on.
     Returns a list of single tags (not comma-separated) from the curated lists.
 
     Args:
         json_path (str): Path to the card news output JSON file.
+        use_llm (bool or None): Let the LLM break ties (defaults to MUSIC_TAGS_LLM).
     Returns:
         list[str]: List of suggested Jamendo tags.
     """
     try:
         with open(json_path, "r", encoding="utf-8") as f:
             data = json.load(f)
-        scripts = data.get("scripts") or data.get("card_contents") or []
+        scripts = data.get("card_scripts") or data.get("scripts") or data.get("card_contents") or []
         text = " ".join(scripts).strip()
         if not text:
             raise ValueError("No script or card content found in JSON.")
-        # Use OpenAI to select tags from the curated lists
-        import openai
-        OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'YOUR_OPENAI_API_KEY')
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        genre_list = ', '.join(POPULAR_GENRE_TAGS)
-        mood_list = ', '.join(POPULAR_MOOD_TAGS)
-        prompt = (
-            f"Given the following YouTube Shorts card news script, select the 1-2 most relevant music genre tags and 1-2 most relevant mood tags from the provided lists. "
-            f"Only choose tags from these lists. Return your answer as a Python list of strings, e.g. ['pop', 'happy', 'energetic'].\n\n"
-            f"Script: {text}\n\n"
-            f"Genre tags: {genre_list}\nMood tags: {mood_list}\n"
-            f"Your answer:"
-        )
-        response = client.chat.completions.create(
-            model="gpt-4-0125-preview",
-            messages=[{"role": "system", "content": "You are a helpful assistant that selects music tags for background music. Only use the provided genre and mood tag lists."},
-                      {"role": "user", "content": prompt}],
-            max_tokens=60,
-            temperature=0.2
-        )
-        import ast
-        # Try to parse the response as a Python list
-        tags = []
-        try:
-            tags = ast.literal_eval(response.choices[0].message.content.strip())
-            # Filter to only allow tags from the curated lists
-            tags = [t for t in tags if t in POPULAR_GENRE_TAGS or t in POPULAR_MOOD_TAGS]
-        except Exception as e:
-            print(f"[Agent] Could not parse OpenAI tag response: {e}")
-        if not tags:
-            # Fallback to keyword-based method
-            tags = get_working_tags_by_topic(text)
+        with span("music.classify_tags", "music", chars=len(text)) as s:
+            tags = suggest_tags(text, use_llm=use_llm)
+            s.set(tags=",".join(tags))
         return tags
     except Exception as e:
         print(f"[Agent] Could not analyze card news output: {e}")
@@ -288,6 +439,7 @@ def main():
     """
     Main function to search and download music.
     """
+    print(f"[DEBUG] JAMENDO_CLIENT_ID configured: {bool(JAMENDO_CLIENT_ID)}")
     # Check if Jamendo client ID is configured
     if not JAMENDO_CLIENT_ID:
         print("[ERROR] JAMENDO_CLIENT_ID not found in environment variables!")
@@ -323,30 +475,27 @@ def main():
                 print(f"   License: {track['license']}")
             print()
         
-        # Automatically download the first track with a download link
+        # Automatically download the first track with a download link that covers the narration
         music_dir = "music"
         os.makedirs(music_dir, exist_ok=True)
         
-        first_downloadable = next((t for t in recommendations if t['download_url']), None)
-        if first_downloadable and first_downloadable['download_url']:
-            filename = f"bg_music_{first_downloadable['title'][:30].replace(' ', '_')}.mp3"
-            # Remove invalid filename characters
-            filename = "".join(c for c in filename if c.isalnum() or c in "._-")
-            full_path = os.path.join(music_dir, filename)
-            success = download_music(first_downloadable['download_url'], full_path)
-            if success:
-                print(f"[SUCCESS] Background music downloaded: {filename}")
-                # Write music info to JSON for video generator
-                music_info = {
-                    "music_title": first_downloadable['title'],
-                    "music_artist": first_downloadable['artist'],
-                    "music_path": full_path
-                }
-                with open("music_info.json", "w", encoding="utf-8") as f:
-                    json.dump(music_info, f, ensure_ascii=False, indent=2)
-                print(f"[INFO] Music info written to music_info.json")
-        else:
+        min_seconds = get_narration_seconds()
+        candidates = rank_tracks_for_duration(recommendations, min_seconds)
+        if not candidates:
             print("[WARNING] No download link available for any track.")
+        for idx, track in enumerate(candidates):
+            full_path = os.path.join(music_dir, get_music_filename(track))
+            if not download_music(track['download_url'], full_path):
+                continue
+            music_info = check_downloaded_track(track, full_path, min_seconds, last_candidate=idx == len(candidates) - 1)
+            if music_info is None:
+                continue
+            print(f"[SUCCESS] Background music downloaded: {os.path.basename(full_path)}")
+            # Write music info to JSON for video generator
+            with open("music_info.json", "w", encoding="utf-8") as f:
+                json.dump(music_info, f, ensure_ascii=False, indent=2)
+            print(f"[INFO] Music info written to music_info.json")
+            break
     else:
         print("[ERROR] No tracks found. This might indicate:")
         print("1. Invalid Jamendo API credentials")
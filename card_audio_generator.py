@@ -2,13 +2,22 @@
 card_audio_generator.py: Generates audio narration for each card using ElevenLabs API and can download music files.
 """
 
-import requests
 import os
+import threading
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
+from tracing import span, current_span
+from rate_limiter import get_limiter
+from api_clients import get_elevenlabs_client, get_http_session, get_async_elevenlabs_client
+from hedging import hedged_call, hedged_call_async, CALL_TIMEOUTS
+# The frame walker lives with the media probe; re-exported here for existing importers
+from media_probe import iter_mp3_frames
 
 load_dotenv()
 
+# Draft previews narrate with a faster, cheaper model at a low bitrate
+DRAFT_MODEL_ID = os.getenv("DRAFT_TTS_MODEL", "eleven_flash_v2_5")
+DRAFT_OUTPUT_FORMAT = os.getenv("DRAFT_TTS_FORMAT", "mp3_22050_32")
+
 def download_music(url, output_path):
     """
     Download music file from a direct URL and save to output_path.
@@ -21,48 +30,296 @@ def download_music(url, output_path):
     """
     print(f"[Music] Attempting to download from: {url}")
     try:
-        response = requests.get(url, stream=True, timeout=20)
-        print(f"[Music] HTTP status: {response.status_code}")
+        with span("music.download", "api") as s:
+            response = get_http_session().get(url, stream=True, timeout=20)
+            print(f"[Music] HTTP status: {response.status_code}")
+            s.set(status=response.status_code)
+            if response.status_code == 200:
+                with open(output_path, 'wb') as f:
+                    for chunk in response.iter_content(1024):
+                        f.write(chunk)
+                        s.add("bytes", len(chunk))
         if response.status_code == 200:
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
             print(f"[Music] Downloaded: {output_path}")
         else:
             print(f"[Music] Failed to download from {url}. Status: {response.status_code}")
     except Exception as e:
         print(f"[Music] Exception occurred: {e}")
 
-def generate_card_audio(texts, output_dir="audio", voice_id="JBFqnCBsd6RMkjVDRZzb", model_id="eleven_multilingual_v2"):
+def synthesize_to_file(elevenlabs, text, output_path, voice_id, model_id, output_format="mp3_44100_128", timeout=None, cancelled=None):
+    """
+    Synthesize one narration with ElevenLabs and stream it to output_path.
+    The audio is written to a temporary file and renamed into place on completion, so a cancelled
+    or failed attempt (e.g. the losing side of a hedge) never leaves a partial output_path behind.
+
+    Args:
+        elevenlabs (ElevenLabs): ElevenLabs client.
+        text (str): Text to speak.
+        output_path (str): Path to save the MP3.
+        voice_id (str): ElevenLabs voice ID.
+        model_id (str): ElevenLabs model ID.
+        output_format (str): ElevenLabs output format.
+        timeout (float or None): Request timeout in seconds.
+        cancelled (threading.Event or None): Set to stop streaming and discard the attempt.
+    Returns:
+        int or None: Number of bytes written, or None if the attempt was cancelled.
+    """
+    # Retries are handled by the shared rate limiter (rate_limiter.py), not the SDK
+    request_options = {"max_retries": 0}
+    if timeout is not None:
+        request_options["timeout_in_seconds"] = max(1, int(timeout))
+    audio = elevenlabs.text_to_speech.convert(
+        text=text,
+        voice_id=voice_id,
+        model_id=model_id,
+        output_format=output_format,
+        request_options=request_options
+    )
+    # convert() streams, so the request only completes once all chunks are written
+    written = 0
+    tmp_path = f"{output_path}.{threading.get_ident()}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in audio:
+                if cancelled is not None and cancelled.is_set():
+                    return None
+                f.write(chunk)
+                written += len(chunk)
+        if cancelled is not None and cancelled.is_set():
+            return None
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    current_span().add("bytes", written)
+    return written
+
+def generate_card_audio(texts, output_dir="audio", voice_id="JBFqnCBsd6RMkjVDRZzb", model_id="eleven_multilingual_v2", output_format="mp3_44100_128", draft=False):
     """
     Generate audio narration for each card using ElevenLabs API.
+    Each request is bounded by the current stage deadline and, when hedging is on,
+    hedged past the rolling P95 latency (see hedging.py).
 
     Args:
         texts (list[str]): List of card scripts/texts.
         output_dir (str): Directory to save audio files.
         voice_id (str): ElevenLabs voice ID.
         model_id (str): ElevenLabs model ID.
+        output_format (str): ElevenLabs output format.
+        draft (bool): Use DRAFT_MODEL_ID and DRAFT_OUTPUT_FORMAT for a fast preview.
     Returns:
         None. (Saves MP3 files to output_dir)
     """
-    api_key = os.getenv("ELEVENLABS_API_KEY")
-    if not api_key:
-        raise ValueError("ELEVENLABS_API_KEY environment variable not set.")
-    elevenlabs = ElevenLabs(api_key=api_key)
+    if draft:
+        model_id, output_format = DRAFT_MODEL_ID, DRAFT_OUTPUT_FORMAT
+    elevenlabs = get_elevenlabs_client()
     os.makedirs(output_dir, exist_ok=True)
+    limiter = get_limiter("elevenlabs")
     for idx, text in enumerate(texts, 1):
         print(f"[Audio] Generating audio for card {idx}...")
-        audio = elevenlabs.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id=model_id,
-            output_format="mp3_44100_128"
-        )
-        with open(os.path.join(output_dir, f"card_{idx}.mp3"), "wb") as f:
-            for chunk in audio:
-                f.write(chunk)
+        output_path = os.path.join(output_dir, f"card_{idx}.mp3")
+
+        def attempt(timeout, cancelled):
+            # Characters count against the ElevenLabs tokens/minute bucket; 429s are retried by the limiter
+            return limiter.call(synthesize_to_file, elevenlabs, text, output_path, voice_id, model_id,
+                                output_format=output_format, timeout=timeout, cancelled=cancelled, tokens=len(text))
+
+        with span("elevenlabs.tts", "api", card=idx, chars=len(text), model=model_id):
+            hedged_call("elevenlabs.tts", attempt, default_timeout=CALL_TIMEOUTS["elevenlabs.tts"])
         print(f"[Audio] Saved: {output_dir}/card_{idx}.mp3")
 
+async def synthesize_to_file_async(elevenlabs, text, output_path, voice_id, model_id, output_format="mp3_44100_128", timeout=None):
+    """
+    Asyncio counterpart of synthesize_to_file. Cancelling the task stops the stream and removes the partial file.
+
+    Args:
+        elevenlabs (AsyncElevenLabs): Async ElevenLabs client.
+        text (str): Text to speak.
+        output_path (str): Path to save the MP3.
+        voice_id (str): ElevenLabs voice ID.
+        model_id (str): ElevenLabs model ID.
+        output_format (str): ElevenLabs output format.
+        timeout (float or None): Request timeout in seconds.
+    Returns:
+        int: Number of bytes written.
+    """
+    import inspect
+    import asyncio
+    request_options = {"max_retries": 0}
+    if timeout is not None:
+        request_options["timeout_in_seconds"] = max(1, int(timeout))
+    audio = elevenlabs.text_to_speech.convert(
+        text=text,
+        voice_id=voice_id,
+        model_id=model_id,
+        output_format=output_format,
+        request_options=request_options
+    )
+    if inspect.isawaitable(audio):
+        audio = await audio
+    written = 0
+    # Hedged attempts run as separate tasks, so the task id keeps their temporary files apart
+    tmp_path = f"{output_path}.{id(asyncio.current_task())}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in audio:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    current_span().add("bytes", written)
+    return written
+
+async def generate_card_audio_async(texts, output_dir="audio", voice_id="JBFqnCBsd6RMkjVDRZzb", model_id="eleven_multilingual_v2", output_format="mp3_44100_128", draft=False):
+    """
+    Asyncio counterpart of generate_card_audio; cards are narrated concurrently, as far as the shared
+    ElevenLabs limiter allows.
+
+    Args:
+        texts (list[str]): List of card scripts/texts.
+        output_dir (str): Directory to save audio files.
+        voice_id (str): ElevenLabs voice ID.
+        model_id (str): ElevenLabs model ID.
+        output_format (str): ElevenLabs output format.
+        draft (bool): Use DRAFT_MODEL_ID and DRAFT_OUTPUT_FORMAT for a fast preview.
+    Returns:
+        list[str]: Paths of the saved MP3 files, in card order.
+    """
+    import asyncio
+    if draft:
+        model_id, output_format = DRAFT_MODEL_ID, DRAFT_OUTPUT_FORMAT
+    elevenlabs = get_async_elevenlabs_client()
+    os.makedirs(output_dir, exist_ok=True)
+    limiter = get_limiter("elevenlabs")
+
+    async def narrate(idx, text):
+        print(f"[Audio] Generating audio for card {idx}...")
+        output_path = os.path.join(output_dir, f"card_{idx}.mp3")
+
+        async def attempt(timeout):
+            return await limiter.acall(synthesize_to_file_async, elevenlabs, text, output_path, voice_id, model_id,
+                                       output_format=output_format, timeout=timeout, tokens=len(text))
+
+        with span("elevenlabs.tts", "api", card=idx, chars=len(text), model=model_id):
+            await hedged_call_async("elevenlabs.tts", attempt, default_timeout=CALL_TIMEOUTS["elevenlabs.tts"])
+        print(f"[Audio] Saved: {output_path}")
+        return output_path
+
+    return list(await asyncio.gather(*[narrate(idx, text) for idx, text in enumerate(texts, 1)]))
+
+def split_mp3_at_times(data, boundaries):
+    """
+    Cut MP3 data at frame boundaries nearest to the given times, without re-encoding.
+
+    Args:
+        data (bytes): MP3 file contents.
+        boundaries (list[float]): Ascending cut times in seconds (len(boundaries) + 1 segments are returned).
+    Returns:
+        list[tuple[bytes, float]]: (segment MP3 bytes, exact segment duration in seconds) per segment.
+    """
+    segments = [[bytearray(), 0.0] for _ in range(len(boundaries) + 1)]
+    elapsed = 0.0
+    segment = 0
+    for offset, length, seconds in iter_mp3_frames(data):
+        # A frame belongs to the segment its midpoint falls in
+        while segment < len(boundaries) and elapsed + seconds / 2 >= boundaries[segment]:
+            segment += 1
+        segments[segment][0] += data[offset:offset + length]
+        segments[segment][1] += seconds
+        elapsed += seconds
+    return [(bytes(audio), duration) for audio, duration in segments]
+
+def group_texts_for_requests(texts, separator, max_chars):
+    """
+    Group consecutive card texts so each group fits in one TTS request.
+
+    Args:
+        texts (list[str]): Card scripts.
+        separator (str): Text placed between cards.
+        max_chars (int): Maximum characters per request.
+    Returns:
+        list[list[int]]: Card indices (0-based) for each request.
+    """
+    groups = []
+    length = 0
+    for idx, text in enumerate(texts):
+        if groups and length + len(separator) + len(text) <= max_chars:
+            groups[-1].append(idx)
+            length += len(separator) + len(text)
+        else:
+            groups.append([idx])
+            length = len(text)
+    return groups
+
+def generate_card_audio_single_request(texts, output_dir="audio", voice_id="JBFqnCBsd6RMkjVDRZzb", model_id="eleven_multilingual_v2", output_format="mp3_44100_128", separator="\n\n", max_chars=5000, draft=False):
+    """
+    Synthesize all card scripts in one ElevenLabs request (convert_with_timestamps) and split the audio per card.
+    The character alignment gives each card's start/end time; cuts are made at the MP3 frame nearest the middle
+    of the pause between cards, so segments need no re-encoding and their durations are frame-exact.
+    Scripts longer than max_chars together are sent in as few requests as fit.
+
+    Args:
+        texts (list[str]): List of card scripts/texts.
+        output_dir (str or None): Directory to save card_{idx}.mp3 files (None to keep segments in memory).
+        voice_id (str): ElevenLabs voice ID.
+        model_id (str): ElevenLabs model ID.
+        output_format (str): ElevenLabs output format (must be an mp3_* format).
+        separator (str): Text placed between cards (a paragraph break gives a natural pause to cut in).
+        max_chars (int): Maximum characters per request.
+        draft (bool): Use DRAFT_MODEL_ID and DRAFT_OUTPUT_FORMAT for a fast preview.
+    Returns:
+        list[dict]: Per card: 'duration' (seconds) and 'path' (when saved) or 'mp3' (bytes, when in memory).
+    """
+    import base64
+    if draft:
+        model_id, output_format = DRAFT_MODEL_ID, DRAFT_OUTPUT_FORMAT
+    elevenlabs = get_elevenlabs_client()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    limiter = get_limiter("elevenlabs")
+    results = [None] * len(texts)
+    for group in group_texts_for_requests(texts, separator, max_chars):
+        full_text = separator.join(texts[idx] for idx in group)
+        print(f"[Audio] Generating audio for cards {group[0] + 1}-{group[-1] + 1} in one request...")
+
+        def attempt(timeout, cancelled):
+            request_options = {"max_retries": 0}
+            if timeout is not None:
+                request_options["timeout_in_seconds"] = max(1, int(timeout))
+            return limiter.call(elevenlabs.text_to_speech.convert_with_timestamps, voice_id=voice_id, text=full_text,
+                                model_id=model_id, output_format=output_format, request_options=request_options,
+                                tokens=len(full_text))
+
+        with span("elevenlabs.tts_timestamps", "api", cards=len(group), chars=len(full_text), model=model_id) as s:
+            response = hedged_call("elevenlabs.tts_timestamps", attempt, default_timeout=CALL_TIMEOUTS["elevenlabs.tts_timestamps"])
+            audio = base64.b64decode(getattr(response, "audio_base_64", None) or getattr(response, "audio_base64"))
+            s.set(bytes=len(audio))
+        alignment = response.alignment
+        starts = alignment.character_start_times_seconds
+        ends = alignment.character_end_times_seconds
+        # Cut halfway between the last character of one card and the first character of the next
+        boundaries = []
+        offset = 0
+        for idx in group[:-1]:
+            last_char = min(offset + len(texts[idx]) - 1, len(ends) - 1)
+            offset += len(texts[idx]) + len(separator)
+            next_char = min(offset, len(starts) - 1)
+            boundaries.append((ends[max(last_char, 0)] + starts[next_char]) / 2)
+        for idx, (segment, duration) in zip(group, split_mp3_at_times(audio, boundaries)):
+            result = {"duration": round(duration, 4)}
+            if output_dir:
+                path = os.path.join(output_dir, f"card_{idx + 1}.mp3")
+                with open(path, "wb") as f:
+                    f.write(segment)
+                result["path"] = path
+                print(f"[Audio] Saved: {path} ({duration:.2f}s)")
+            else:
+                result["mp3"] = segment
+            results[idx] = result
+    return results
+
 def main():
     """
     Example usage for generating card audio and downloading a sample music file.
@@ -3,105 +3,337 @@ card_image_generator.py: Generates card images for each news slide, with emoji s
 """
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import os
-import emoji as emoji_lib
-import subprocess
+import sys
+import functools
+import threading
+from tracing import span, current_span, run_subprocess
+from emoji_bundle import get_bundle
+from emoji_tokenizer import tokenize, find_emojis, twemoji_name
 
-def create_card_image(text, output_path, width=1080, height=1920, bg_color=(0, 102, 204), font_color=(255, 255, 255), max_font_size=90, min_font_size=14, margin=60, line_spacing=2, top_indent_lines=7, top_indent_font_size=22, title_font_size=32, title_box_height=100, box_border_color=(0,0,0), box_border_width=2, shadow_offset=8, shadow_color=(80,80,80,80)):
+# Directory of Twemoji PNGs named by codepoint (filled by download_twemoji_pngs.py)
+EMOJI_PNG_DIR = os.getenv("EMOJI_PNG_DIR", "emoji_png")
+
+@functools.lru_cache(maxsize=128)
+def get_font(size, emoji=False):
     """
-    Create a card image with a title and content, supporting emojis and auto-scaling font size.
+    Load a TrueType font at the given size, preferring emoji-capable fonts if emoji is True.
+    Cached per (size, emoji), since font fitting tries many sizes per card and fonts are reused across cards.
+
+    Args:
+        size (int): Font size in points.
+        emoji (bool): Prefer an emoji-capable font.
+    Returns:
+        ImageFont.FreeTypeFont: Loaded font (or Pillow's default font if none is found).
+    """
+    font_paths = [
+        "/Library/Fonts/Arial.ttf",
+        "/System/Library/Fonts/Supplemental/Arial.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/local/share/fonts/DejaVuSans.ttf",
+    ]
+    emoji_font_paths = [
+        "/System/Library/Fonts/Apple Color Emoji.ttc",  # macOS
+        "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",  # Linux
+        "/usr/share/fonts/emoji/NotoColorEmoji.ttf",
+        "/usr/share/fonts/truetype/seguiemj.ttf",  # Windows
+    ]
+    if emoji:
+        for path in emoji_font_paths:
+            if os.path.exists(path):
+                try:
+                    return ImageFont.truetype(path, size)
+                except Exception:
+                    continue
+    for path in font_paths:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=512)
+def load_emoji_image(emoji_path, size, version=None):
+    """
+    Load an emoji PNG as an RGBA image resized to size x size. Cached so repeated emojis are decoded once.
+
+    Args:
+        emoji_path (str): Path to the emoji PNG.
+        size (int): Target width and height in pixels.
+        version (str or None): The file's version (see get_emoji_source), so a replaced PNG is decoded again.
+    Returns:
+        Image.Image: Resized RGBA emoji image (treat as read-only).
+    """
+    return Image.open(emoji_path).convert("RGBA").resize((size, size))
+
+@functools.lru_cache(maxsize=512)
+def load_bundle_emoji_image(codepoint, size, version):
+    """
+    Get an emoji sprite from the packed bundle resized to size x size. Cached per bundle version.
+
+    Args:
+        codepoint (str): Twemoji codepoint name (e.g. '1f600').
+        size (int): Target width and height in pixels.
+        version (str): The bundle's version (see EmojiBundle.version).
+    Returns:
+        Image.Image or None: Resized RGBA emoji image (treat as read-only).
+    """
+    bundle = get_bundle()
+    sprite = bundle.get_image(codepoint) if bundle is not None else None
+    if sprite is None:
+        return None
+    return sprite if sprite.size == (size, size) else sprite.resize((size, size))
+
+def get_emoji_source(codepoint):
+    """
+    Find where an emoji's sprite comes from right now: the packed bundle (emoji_bundle.py) if it has the emoji,
+    otherwise the PNG in EMOJI_PNG_DIR. Not cached, so a bundle built or a PNG downloaded by a running
+    process (e.g. worker.py) is used by its next card.
+
+    Args:
+        codepoint (str): Twemoji codepoint name (e.g. '1f600').
+    Returns:
+        tuple[str, str] or None: ('bundle' or 'png', version), or None if the emoji is unavailable.
+    """
+    bundle = get_bundle()
+    if bundle is not None and codepoint in bundle:
+        return "bundle", bundle.version()
+    try:
+        st = os.stat(os.path.join(EMOJI_PNG_DIR, f"{codepoint}.png"))
+    except OSError:
+        return None
+    return "png", f"{st.st_size}-{st.st_mtime_ns}"
+
+def get_emoji_image(codepoint, size):
+    """
+    Get an emoji sprite resized to size x size, from the packed bundle (emoji_bundle.py) if one is present,
+    otherwise from the PNG in EMOJI_PNG_DIR. Sprites are cached per source version; a missing emoji is not
+    cached.
+
+    Args:
+        codepoint (str): Twemoji codepoint name (e.g. '1f600').
+        size (int): Target width and height in pixels.
+    Returns:
+        Image.Image or None: Resized RGBA emoji image (treat as read-only), or None if the emoji is unavailable.
+    """
+    source = get_emoji_source(codepoint)
+    if source is None:
+        return None
+    kind, version = source
+    if kind == "bundle":
+        return load_bundle_emoji_image(codepoint, size, version)
+    return load_emoji_image(os.path.join(EMOJI_PNG_DIR, f"{codepoint}.png"), size, version)
+
+# Named output canvases for multi-format rendering (the first is the layout reference)
+CANVAS_SIZES = {
+    "9:16": (1080, 1920),
+    "1:1": (1080, 1080),
+    "16:9": (1920, 1080),
+}
+# Draft previews scale every pixel-valued style parameter by this factor (1080x1920 -> 360x640)
+DRAFT_SCALE = float(os.getenv("DRAFT_SCALE", "0.3334"))
+# Default pixel-valued style parameters of a card (see layout_card and render_card)
+CARD_STYLE = {
+    "max_font_size": 90,
+    "min_font_size": 14,
+    "margin": 60,
+    "line_spacing": 2,
+    "title_font_size": 32,
+    "title_box_height": 100,
+    "box_border_width": 2,
+    "shadow_offset": 8,
+}
+
+def scale_card_params(scale, **params):
+    """
+    Scale pixel-valued card parameters (canvas size, font sizes, margins, borders) for a draft canvas.
+
+    Args:
+        scale (float): Scale factor (1.0 returns the parameters unchanged).
+        **params (int): Pixel values, e.g. width=1080, height=1920, margin=60.
+    Returns:
+        dict[str, int]: Scaled values, at least 1; width and height are rounded to even numbers for video encoding.
+    """
+    if scale == 1.0:
+        return params
+    scaled = {}
+    for name, value in params.items():
+        if name in ("width", "height"):
+            scaled[name] = max(2, int(round(value * scale / 2)) * 2)
+        else:
+            scaled[name] = max(1, int(round(value * scale)))
+    return scaled
+
+def draw_text_with_emojis(draw, img, text, font, x, y, fill, emoji_size):
+    """
+    Draw one line of text, pasting Twemoji sprites for emoji clusters.
+
+    Args:
+        draw (ImageDraw.ImageDraw): Drawing context for img.
+        img (Image.Image): RGBA image to draw on.
+        text (str): Line of text.
+        font (ImageFont.FreeTypeFont): Font for text runs.
+        x, y (int): Top-left position of the line.
+        fill (tuple): Text color.
+        emoji_size (int): Emoji width and height in pixels.
+    Returns:
+        int: X position after the last drawn segment.
+    """
+    cur_x = x
+    for is_emoji, seg in tokenize(text):
+        if is_emoji:
+            emoji_img = get_emoji_image(twemoji_name(seg), emoji_size)
+            if emoji_img is not None:
+                img.alpha_composite(emoji_img, (cur_x, y))
+                cur_x += emoji_size
+            else:
+                # fallback: draw as text (may be square)
+                draw.text((cur_x, y), seg, font=font, fill=fill)
+                bbox = draw.textbbox((0, 0), seg, font=font)
+                cur_x += bbox[2] - bbox[0]
+        else:
+            draw.text((cur_x, y), seg, font=font, fill=fill)
+            bbox = draw.textbbox((0, 0), seg, font=font)
+            cur_x += bbox[2] - bbox[0]
+    return cur_x
+
+def get_content_box(width, height, margin, title_box_height):
+    """
+    Content box of a card canvas, below the title box.
+
+    Args:
+        width, height (int): Canvas dimensions.
+        margin (int): Margin around content.
+        title_box_height (int): Height of the title box.
+    Returns:
+        tuple[int, int, int, int]: (left, top, right, bottom).
+    """
+    return margin // 2, margin + title_box_height + margin // 2, width - margin // 2, height - margin // 2
+
+def layout_card(text, width=1080, height=1920, max_font_size=90, min_font_size=14, margin=60, line_spacing=2, title_box_height=100):
+    """
+    Compute a card's text layout (title, sentence wrapping and fitted font size) for a reference canvas.
+    The layout does not depend on colors, so it can be rendered to several canvases with render_card.
 
     Args:
         text (str): The card's text (title and content, separated by newline).
-        output_path (str): Path to save the generated image.
-        width, height (int): Image dimensions.
-        bg_color, font_color (tuple): Background and text color.
+        width, height (int): Reference canvas dimensions.
         max_font_size, min_font_size (int): Font size range.
         margin (int): Margin around content.
         line_spacing (int): Spacing between lines.
-        top_indent_lines (int): Number of lines to indent the top section (title).
-        top_indent_font_size (int): Font size for the top indent lines.
-        title_font_size (int): Font size for the title.
         title_box_height (int): Height of the title box.
-        box_border_color (tuple): Color of the border around the boxes.
-        box_border_width (int): Width of the border around the boxes.
-        shadow_offset (int): Offset for the shadow effect.
-        shadow_color (tuple): Color of the shadow (RGBA).
-
     Returns:
-        None. (Saves image to output_path)
+        dict: title_line, lines, line_heights, font_size, text_height and the reference content size.
     """
     # Split text into title line and content
     if '\n' in text:
         title_line, content = text.split('\n', 1)
     else:
         title_line, content = text, ''
+    draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+    content_box_left, content_box_top, content_box_right, content_box_bottom = get_content_box(width, height, margin, title_box_height)
+    # Auto-scale font size for content
+    font_size = max_font_size
+    allowed_height = content_box_bottom - content_box_top - margin
+    # Split content into sentences and wrap each sentence for better visibility
+    import re
+    sentence_splitter = re.compile(r'([^.!?]*[.!?])')
+    sentences = [s.strip() for s in sentence_splitter.findall(content) if s.strip()]
+    while font_size >= min_font_size:
+        font = get_font(font_size, emoji=True)
+        lines = []
+        for sentence in sentences:
+            words = sentence.split()
+            line = ''
+            for word in words:
+                test_line = f'{line} {word}'.strip()
+                bbox = draw.textbbox((0, 0), test_line, font=font)
+                w = bbox[2] - bbox[0]
+                if w > content_box_right - content_box_left - margin:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = test_line
+            if line:
+                lines.append(line)
+        max_line_width = max([draw.textbbox((0, 0), l, font=font)[2] - draw.textbbox((0, 0), l, font=font)[0] for l in lines]) if lines else 0
+        total_text_height = sum([draw.textbbox((0, 0), l, font=font)[3] - draw.textbbox((0, 0), l, font=font)[1] + line_spacing for l in lines]) - line_spacing if lines else 0
+        if total_text_height <= allowed_height and max_line_width <= content_box_right - content_box_left - margin:
+            break
+        font_size -= 2
+    # Line heights are measured with the drawing font
+    font = get_font(font_size, emoji=False)
+    line_heights = []
+    for line in lines:
+        bbox = draw.textbbox((0, 0), line, font=font)
+        line_heights.append(bbox[3] - bbox[1])
+    # Add extra spacing between lines (40% of font size)
+    extra_line_spacing = int(font_size * 0.4)
+    total_extra_spacing = extra_line_spacing * (len(lines) - 1) if lines else 0
+    return {
+        "title_line": title_line,
+        "lines": lines,
+        "line_heights": line_heights,
+        "font_size": font_size,
+        "line_spacing": line_spacing,
+        "extra_line_spacing": extra_line_spacing,
+        "text_height": total_text_height + total_extra_spacing,
+        "canvas": (width, height),
+        "content_width": content_box_right - content_box_left,
+        "margin": margin,
+        "blocks": {}
+    }
+
+def render_text_block(layout, font_color):
+    """
+    Draw a layout's content lines onto a transparent layer (once per color; cached in the layout).
+
+    Args:
+        layout (dict): Layout from layout_card.
+        font_color (tuple): Text color.
+    Returns:
+        tuple[Image.Image, int]: RGBA layer and its padding (the first line starts at (padding, padding)).
+    """
+    key = tuple(font_color)
+    if key not in layout["blocks"]:
+        font_size = layout["font_size"]
+        font = get_font(font_size, emoji=False)
+        # Wrapping is measured with the emoji font, so lines drawn with the text font can run a little wide;
+        # the padding also keeps glyphs with negative bearings from being clipped
+        pad = font_size // 4
+        block_width = layout["content_width"] + font_size + 2 * pad
+        block = Image.new('RGBA', (block_width, layout["text_height"] + font_size + 2 * pad), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(block)
+        y = pad
+        emoji_size = font_size  # Make emoji same height as text
+        for line, h in zip(layout["lines"], layout["line_heights"]):
+            draw_text_with_emojis(draw, block, line, font, pad, y, font_color, emoji_size)
+            y += h + layout["line_spacing"] + layout["extra_line_spacing"]
+        bbox = block.getbbox()
+        layout["blocks"][key] = (block.crop((0, 0, bbox[2], bbox[3])) if bbox else block, pad)
+    return layout["blocks"][key]
+
+def render_card(layout, output_path, width=1080, height=1920, bg_color=(0, 102, 204), font_color=(255, 255, 255), margin=60, title_font_size=32, title_box_height=100, box_border_color=(0,0,0), box_border_width=2, shadow_offset=8, shadow_color=(80,80,80,80)):
+    """
+    Render a laid-out card onto a canvas. Boxes and title are drawn for the canvas; the content lines are drawn
+    once per layout and scaled down only if they do not fit this canvas's content box.
+
+    Args:
+        layout (dict): Layout from layout_card.
+        output_path (str or None): Path to save the generated image as PNG (None to only return it).
+        width, height (int): Canvas dimensions.
+        bg_color, font_color (tuple): Background and text color.
+        margin (int): Margin around content.
+        title_font_size (int): Font size for the title.
+        title_box_height (int): Height of the title box.
+        box_border_color (tuple): Color of the border around the boxes.
+        box_border_width (int): Width of the border around the boxes.
+        shadow_offset (int): Offset for the shadow effect.
+        shadow_color (tuple): Color of the shadow (RGBA).
+    Returns:
+        Image.Image: The rendered RGB card (also saved to output_path if given).
+    """
+    title_line = layout["title_line"]
     print(f"[DEBUG] Title line: '{title_line}' for {output_path}")
     # Create a blank image with solid background
     img = Image.new('RGB', (width, height), color=bg_color)
-    draw = ImageDraw.Draw(img)
-
-    def get_font(size, emoji=False):
-        font_paths = [
-            "/Library/Fonts/Arial.ttf",
-            "/System/Library/Fonts/Supplemental/Arial.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-            "/usr/local/share/fonts/DejaVuSans.ttf",
-        ]
-        emoji_font_paths = [
-            "/System/Library/Fonts/Apple Color Emoji.ttc",  # macOS
-            "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",  # Linux
-            "/usr/share/fonts/emoji/NotoColorEmoji.ttf",
-            "/usr/share/fonts/truetype/seguiemj.ttf",  # Windows
-        ]
-        if emoji:
-            for path in emoji_font_paths:
-                if os.path.exists(path):
-                    try:
-                        return ImageFont.truetype(path, size)
-                    except Exception:
-                        continue
-        for path in font_paths:
-            if os.path.exists(path):
-                return ImageFont.truetype(path, size)
-        return ImageFont.load_default()
-
-    def split_text_with_emojis(text):
-        # Returns a list of (is_emoji, segment) tuples
-        result = []
-        buffer = ''
-        for char in text:
-            if emoji_lib.is_emoji(char):
-                if buffer:
-                    result.append((False, buffer))
-                    buffer = ''
-                result.append((True, char))
-            else:
-                buffer += char
-        if buffer:
-            result.append((False, buffer))
-        return result
-
-    def draw_text_with_emojis(draw, img, text, font, x, y, fill, emoji_size):
-        segments = split_text_with_emojis(text)
-        cur_x = x
-        for is_emoji, seg in segments:
-            if is_emoji:
-                codepoint = f"{ord(seg):x}".lower()
-                emoji_path = os.path.join("emoji_png", f"{codepoint}.png")
-                if os.path.exists(emoji_path):
-                    emoji_img = Image.open(emoji_path).convert("RGBA").resize((emoji_size, emoji_size))
-                    img.paste(emoji_img, (cur_x, y), emoji_img)
-                    cur_x += emoji_size
-                else:
-                    # fallback: draw as text (may be square)
-                    draw.text((cur_x, y), seg, font=font, fill=fill)
-                    bbox = draw.textbbox((0, 0), seg, font=font)
-                    cur_x += bbox[2] - bbox[0]
-            else:
-                draw.text((cur_x, y), seg, font=font, fill=fill)
-                bbox = draw.textbbox((0, 0), seg, font=font)
-                cur_x += bbox[2] - bbox[0]
-        return cur_x
 
     # New: Increase border area for title and content boxes
     title_box_top = margin
@@ -129,10 +361,7 @@ def create_card_image(text, output_path, width=1080, height=1920, bg_color=(0, 1
     draw.text((title_x, title_y), title_line, font=title_font, fill=font_color)
 
     # Content box: much closer to the edges, as in the red border
-    content_box_top = title_box_bottom + margin//2
-    content_box_left = margin//2
-    content_box_right = width - margin//2
-    content_box_bottom = height - margin//2
+    content_box_left, content_box_top, content_box_right, content_box_bottom = get_content_box(width, height, margin, title_box_height)
 
     # Draw shadow for content box (separately)
     shadow_img_content = Image.new('RGBA', img.size, (0,0,0,0))
@@ -144,82 +373,352 @@ def create_card_image(text, output_path, width=1080, height=1920, bg_color=(0, 1
     # Draw content box border (thin black)
     draw.rectangle([content_box_left, content_box_top, content_box_right, content_box_bottom], outline=box_border_color, width=box_border_width)
 
-    # Auto-scale font size for content
-    font_size = max_font_size
-    allowed_height = content_box_bottom - content_box_top - margin
-    # Split content into sentences and wrap each sentence for better visibility
-    import re
-    sentence_splitter = re.compile(r'([^.!?]*[.!?])')
-    sentences = [s.strip() for s in sentence_splitter.findall(content) if s.strip()]
-    while font_size >= min_font_size:
-        font = get_font(font_size, emoji=True)
-        lines = []
-        for sentence in sentences:
-            words = sentence.split()
-            line = ''
-            for word in words:
-                test_line = f'{line} {word}'.strip()
-                bbox = draw.textbbox((0, 0), test_line, font=font)
-                w = bbox[2] - bbox[0]
-                if w > content_box_right - content_box_left - margin:
-                    lines.append(line)
-                    line = word
-                else:
-                    line = test_line
-            if line:
-                lines.append(line)
-        max_line_width = max([draw.textbbox((0, 0), l, font=font)[2] - draw.textbbox((0, 0), l, font=font)[0] for l in lines]) if lines else 0
-        total_text_height = sum([draw.textbbox((0, 0), l, font=font)[3] - draw.textbbox((0, 0), l, font=font)[1] + line_spacing for l in lines]) - line_spacing if lines else 0
-        if total_text_height <= allowed_height and max_line_width <= content_box_right - content_box_left - margin:
-            break
-        font_size -= 2
     # Draw content text inside content box (with emoji support)
-    font = get_font(font_size, emoji=False)
-    # Calculate vertical centering so that space above and below content is equal inside the content box
-    y_content_area = content_box_bottom - content_box_top
-    # Add extra spacing between lines (40% of font size)
-    extra_line_spacing = int(font_size * 0.4)
-    y_text_area = total_text_height
-    total_extra_spacing = extra_line_spacing * (len(lines) - 1) if lines else 0
-    y_text_area_adjusted = y_text_area + total_extra_spacing
-    y = content_box_top + (y_content_area - y_text_area_adjusted) // 2 if lines else content_box_top
-    left_indent = content_box_left + margin // 2  # Indent from the left border
-    emoji_size = font_size  # Make emoji same height as text
-    for line in lines:
-        bbox = draw.textbbox((0, 0), line, font=font)
-        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-        x = left_indent  # Left align with indent
-        draw_text_with_emojis(draw, img, line, font, x, y, font_color, emoji_size)
-        y += h + line_spacing + extra_line_spacing
+    if layout["lines"]:
+        block, pad = render_text_block(layout, font_color)
+        # Shrink the block to fit a smaller content box (e.g. 1:1 or 16:9 canvases), never enlarge it
+        scale = 1.0
+        if (width, height) != layout["canvas"]:
+            scale = min(1.0, (content_box_right - content_box_left - margin // 2) / (block.width - pad),
+                        (content_box_bottom - content_box_top - margin) / (block.height - pad))
+        text_height = layout["text_height"]
+        if scale < 1.0:
+            block = block.resize((max(1, int(block.width * scale)), max(1, int(block.height * scale))), Image.LANCZOS)
+            text_height = int(text_height * scale)
+            pad = int(pad * scale)
+        # Calculate vertical centering so that space above and below content is equal inside the content box
+        y_content_area = content_box_bottom - content_box_top
+        y = content_box_top + (y_content_area - text_height) // 2
+        left_indent = content_box_left + margin // 2  # Indent from the left border
+        img.alpha_composite(block, (left_indent - pad, y - pad))
     img = img.convert('RGB')
-    img.save(output_path)
-    print(f"[Card] Saved card image: {output_path} (font size used: {font_size})")
+    current_span().set(font_size=layout["font_size"], lines=len(layout["lines"]))
+    if output_path:
+        with span("card.save_png", "render"):
+            # output_path may be a hard link into the render cache; write a new file instead of through it
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            img.save(output_path)
+        current_span().set(bytes=os.path.getsize(output_path))
+        print(f"[Card] Saved card image: {output_path} (font size used: {layout['font_size']})")
+    else:
+        print(f"[Card] Rendered card image in memory (font size used: {layout['font_size']})")
+    return img
+
+def create_card_image(text, output_path, width=1080, height=1920, bg_color=(0, 102, 204), font_color=(255, 255, 255), max_font_size=90, min_font_size=14, margin=60, line_spacing=2, top_indent_lines=7, top_indent_font_size=22, title_font_size=32, title_box_height=100, box_border_color=(0,0,0), box_border_width=2, shadow_offset=8, shadow_color=(80,80,80,80), scale=1.0):
+    """
+    Create a card image with a title and content, supporting emojis and auto-scaling font size.
+
+    Args:
+        text (str): The card's text (title and content, separated by newline).
+        output_path (str or None): Path to save the generated image as PNG (None to only return it).
+        width, height (int): Image dimensions.
+        bg_color, font_color (tuple): Background and text color.
+        max_font_size, min_font_size (int): Font size range.
+        margin (int): Margin around content.
+        line_spacing (int): Spacing between lines.
+        top_indent_lines (int): Number of lines to indent the top section (title).
+        top_indent_font_size (int): Font size for the top indent lines.
+        title_font_size (int): Font size for the title.
+        title_box_height (int): Height of the title box.
+        box_border_color (tuple): Color of the border around the boxes.
+        box_border_width (int): Width of the border around the boxes.
+        shadow_offset (int): Offset for the shadow effect.
+        shadow_color (tuple): Color of the shadow (RGBA).
+        scale (float): Scale the canvas and every pixel-valued parameter (e.g. DRAFT_SCALE for fast previews).
+
+    Returns:
+        Image.Image: The rendered RGB card (also saved to output_path if given).
+    """
+    if scale != 1.0:
+        scaled = scale_card_params(scale, width=width, height=height, max_font_size=max_font_size, min_font_size=min_font_size,
+                                   margin=margin, line_spacing=line_spacing, title_font_size=title_font_size,
+                                   title_box_height=title_box_height, box_border_width=box_border_width, shadow_offset=shadow_offset)
+        width, height = scaled["width"], scaled["height"]
+        max_font_size, min_font_size = scaled["max_font_size"], scaled["min_font_size"]
+        margin, line_spacing = scaled["margin"], scaled["line_spacing"]
+        title_font_size, title_box_height = scaled["title_font_size"], scaled["title_box_height"]
+        box_border_width, shadow_offset = scaled["box_border_width"], scaled["shadow_offset"]
+    layout = layout_card(text, width=width, height=height, max_font_size=max_font_size, min_font_size=min_font_size,
+                         margin=margin, line_spacing=line_spacing, title_box_height=title_box_height)
+    return render_card(layout, output_path, width=width, height=height, bg_color=bg_color, font_color=font_color,
+                       margin=margin, title_font_size=title_font_size, title_box_height=title_box_height,
+                       box_border_color=box_border_color, box_border_width=box_border_width,
+                       shadow_offset=shadow_offset, shadow_color=shadow_color)
+
+def get_format_dir(output_dir, fmt, formats):
+    """
+    Directory for one output format's cards: the first format uses output_dir itself, others a subdirectory
+    (e.g. cards/1x1), so single-format consumers that scan output_dir keep working.
+
+    Args:
+        output_dir (str): Base card directory.
+        fmt (str): Format name (a CANVAS_SIZES key).
+        formats (list[str]): All formats being rendered.
+    Returns:
+        str: Directory path.
+    """
+    return output_dir if fmt == formats[0] else os.path.join(output_dir, fmt.replace(":", "x"))
+
+# Content-addressed cache of rendered card PNGs, shared across runs (and by worker processes). Absolute, so
+# workers that change into per-job directories keep using the same cache
+CARD_CACHE_DIR = os.path.abspath(os.getenv("CARD_CACHE_DIR", os.path.join(".cache", "cards")))
+# Least recently used entries are evicted once the cache exceeds this many bytes
+CARD_CACHE_MAX_BYTES = int(os.getenv("CARD_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CARD_CACHE = os.getenv("CARD_CACHE", "1") == "1"
+# Bump when layout_card/render_card change how a card looks, so stale renders are never served
+CARD_RENDER_VERSION = 1
+_card_cache_lock = threading.Lock()
+_card_cache_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "evicted_bytes": 0}
+
+def get_asset_versions(text):
+    """
+    Identify the font files and emoji sprites a card's rendering depends on, so replacing a font, rebuilding
+    the emoji bundle or downloading a missing emoji PNG changes the card's cache key.
+
+    Args:
+        text (str): The card's text.
+    Returns:
+        dict: 'fonts' (path, size and mtime of the text and emoji fonts) and 'emojis' (codepoint to the
+        sprite's [source, version] from get_emoji_source, or None if the emoji is unavailable).
+    """
+    fonts = []
+    for emoji in (False, True):
+        # Every size resolves to the same file; Pillow's built-in default font has no path
+        path = getattr(get_font(CARD_STYLE["title_font_size"], emoji=emoji), "path", None)
+        try:
+            st = os.stat(path)
+            fonts.append([path, st.st_size, st.st_mtime_ns])
+        except (OSError, TypeError):
+            fonts.append([path])
+    # The same lookup get_emoji_image draws from, so the key always describes the sprites actually drawn
+    emojis = {}
+    for emoji in find_emojis(text):
+        codepoint = twemoji_name(emoji)
+        source = get_emoji_source(codepoint)
+        emojis[codepoint] = list(source) if source else None
+    return {"fonts": fonts, "emojis": emojis}
+
+def get_card_cache_key(text, assets, **params):
+    """
+    Hash a card's text, render parameters and asset versions into its cache key.
+
+    Args:
+        text (str): The card's text.
+        assets (dict): Asset versions from get_asset_versions.
+        **params: Every value the rendered pixels depend on (canvas, layout canvas, colors, font sizes, margins,
+            borders, shadow).
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    import hashlib
+    import json
+    key = json.dumps({"version": CARD_RENDER_VERSION, "text": text, "assets": assets, "params": params},
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def get_card_cache_path(key, cache_dir=None):
+    return os.path.join(cache_dir or CARD_CACHE_DIR, key[:2], f"{key}.png")
+
+def place_file(src, dst):
+    """
+    Put a copy of src at dst, as a hard link where the filesystem allows it. dst is replaced by rename, so a
+    previous file there (possibly a link to another cache entry) is never written through.
+
+    Args:
+        src (str): Source file.
+        dst (str): Destination path.
+    Returns:
+        str: 'link' or 'copy'.
+    """
+    import shutil
+    try:
+        # Already linked there (rename onto the same inode would be a no-op and leave the temp link behind)
+        if os.path.samefile(src, dst):
+            return "link"
+    except OSError:
+        pass
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp_path)
+        method = "link"
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+        method = "copy"
+    os.replace(tmp_path, dst)
+    return method
+
+def fetch_cached_card(key, output_path, keep_image, cache_dir=None):
+    """
+    Serve a card from the render cache.
+
+    Args:
+        key (str): Cache key from get_card_cache_key.
+        output_path (str or None): Where to place the PNG (None to skip).
+        keep_image (bool): Decode and return the cached image.
+    Returns:
+        tuple[bool, Image.Image or None]: Whether the card was cached, and the decoded RGB image if keep_image.
+    """
+    path = get_card_cache_path(key, cache_dir)
+    try:
+        # mtime marks recency for LRU eviction (atime is unreliable on relatime/noatime mounts)
+        os.utime(path)
+        if output_path:
+            place_file(path, output_path)
+        img = None
+        if keep_image:
+            with Image.open(path) as cached:
+                img = cached.convert("RGB")
+    except (OSError, ValueError):
+        # Missing, evicted by another process mid-hit, or unreadable: render it again
+        with _card_cache_lock:
+            _card_cache_stats["misses"] += 1
+        return False, None
+    with _card_cache_lock:
+        _card_cache_stats["hits"] += 1
+    return True, img
+
+def store_cached_card(key, img, output_path=None, cache_dir=None):
+    """
+    Atomically add a rendered card to the cache and place it at output_path.
+
+    Args:
+        key (str): Cache key from get_card_cache_key.
+        img (Image.Image): The rendered RGB card.
+        output_path (str or None): Where to place the PNG (None to skip).
+    Returns:
+        None.
+    """
+    path = get_card_cache_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with span("card.save_png", "render"):
+        img.save(tmp_path, format="PNG")
+    os.replace(tmp_path, path)
+    current_span().set(bytes=os.path.getsize(path))
+    with _card_cache_lock:
+        _card_cache_stats["stores"] += 1
+    if output_path:
+        place_file(path, output_path)
+        print(f"[Card] Saved card image: {output_path}")
+
+def evict_card_cache(max_bytes=None, cache_dir=None):
+    """
+    Remove least recently used cache entries until the cache fits in max_bytes.
+
+    Args:
+        max_bytes (int or None): Size limit (defaults to CARD_CACHE_MAX_BYTES).
+        cache_dir (str or None): Cache directory (defaults to CARD_CACHE_DIR).
+    Returns:
+        int: Total bytes left in the cache.
+    """
+    max_bytes = CARD_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    try:
+        shards = list(os.scandir(cache_dir or CARD_CACHE_DIR))
+    except OSError:
+        return 0
+    for shard in shards:
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if entry.name.endswith(".png"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        with _card_cache_lock:
+            _card_cache_stats["evictions"] += 1
+            _card_cache_stats["evicted_bytes"] += size
+    return total
+
+def get_card_cache_stats():
+    """
+    Render cache counters for this process.
+
+    Returns:
+        dict: hits, misses, hit_rate, stores, evictions and evicted_bytes.
+    """
+    with _card_cache_lock:
+        stats = dict(_card_cache_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    return stats
+
+def print_card_cache_stats(file=None):
+    """
+    Print the render cache counters.
+
+    Args:
+        file: Output stream (defaults to stdout).
+    Returns:
+        None.
+    """
+    stats = get_card_cache_stats()
+    if stats["hit_rate"] is None:
+        return
+    print(f"[Card] Render cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+          f"{stats['evictions']} evicted ({stats['evicted_bytes'] / 1e6:.1f} MB)", file=file or sys.stdout)
 
-def generate_cards_from_json(json_path="card_news_output.json", output_dir="cards"):
+def generate_cards_from_json(json_path="card_news_output.json", output_dir="cards", in_process=False, save_png=True, formats=None, keep_images=True, draft=False, use_cache=None):
     """
     Generate card images from a JSON file containing card contents.
-    Downloads emoji PNGs if needed.
+    Downloads emoji PNGs if needed (skipped when the packed emoji bundle already has every emoji).
 
     Args:
         json_path (str): Path to card news output JSON.
         output_dir (str): Directory to save card images.
+        in_process (bool): Download emoji PNGs in this process (reusing its HTTP session) instead of a child script.
+        save_png (bool): Also write each card to output_dir as PNG (the returned images can go straight to
+            create_video_from_cards, so the files are only needed by other processes or for inspection).
+        formats (list[str] or None): Canvas formats to render (CANVAS_SIZES keys, e.g. ['9:16', '1:1', '16:9']).
+            Each card is laid out once on the first format's canvas and projected to the others.
+        keep_images (bool): Return the rendered images. With False (requires save_png) each card is dropped
+            once written and the PNG paths are returned, so memory does not grow with the deck length.
+        draft (bool): Render scaled-down preview cards (DRAFT_SCALE of every canvas, font and margin).
+        use_cache (bool or None): Serve unchanged cards from the render cache in CARD_CACHE_DIR and add new
+            renders to it (defaults to CARD_CACHE). A card is re-laid out only if one of its formats misses.
 
     Returns:
-        None. (Saves images to output_dir)
+        list[Image.Image] or dict[str, list[Image.Image]]: Rendered RGB cards (or PNG paths) in card order,
+        or per format when formats is given.
     """
     import json
-    os.makedirs(output_dir, exist_ok=True)
+    format_list = list(formats) if formats else ["9:16"]
+    unknown = [fmt for fmt in format_list if fmt not in CANVAS_SIZES]
+    if unknown:
+        raise ValueError(f"Unknown card formats {unknown}; expected some of {list(CANVAS_SIZES)}.")
+    if not keep_images and not save_png:
+        raise ValueError("keep_images=False needs save_png=True, otherwise the rendered cards are lost.")
+    if save_png:
+        for fmt in format_list:
+            os.makedirs(get_format_dir(output_dir, fmt, format_list), exist_ok=True)
     with open(json_path, "r", encoding="utf-8") as f:
         data = json.load(f)
     card_contents = data.get("card_contents", [])
     topic = data.get("keyword", "topic").replace(' ', '_').replace(':', '').replace('/', '').replace('\\', '').replace('"', '').replace("'", '').replace('.', '').replace(',', '').lower()
     # Check for emojis and download PNGs if needed
-    import emoji as emoji_lib
-    all_text = " ".join(card_contents)
-    emojis = set(c for c in all_text if emoji_lib.is_emoji(c))
-    if emojis:
+    emojis = find_emojis(" ".join(card_contents))
+    bundle = get_bundle()
+    if emojis and bundle is not None and all(twemoji_name(e) in bundle for e in emojis):
+        print(f"[Card] All {len(emojis)} emojis found in {bundle.path}; no downloads needed.")
+    elif emojis:
         print(f"[Card] Detected emojis: {emojis}. Downloading PNGs if missing...")
-        subprocess.run(["python", "download_twemoji_pngs.py"])
+        if in_process:
+            import download_twemoji_pngs
+            download_twemoji_pngs.main(json_path)
+        else:
+            run_subprocess([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "download_twemoji_pngs.py")])
     # Pastel background colors
     bg_colors = [
         (186, 225, 255),  # Pastel Blue
@@ -246,13 +745,61 @@ def generate_cards_from_json(json_path="card_news_output.json", output_dir="card
         (30, 70, 120),   # Blue for pastel sky
         (30, 30, 30),    # Black for white
     ]
+    images = {fmt: [] for fmt in format_list}
+    scale = DRAFT_SCALE if draft else 1.0
+    style = scale_card_params(scale, **CARD_STYLE)
+    canvases = {fmt: scale_card_params(scale, width=CANVAS_SIZES[fmt][0], height=CANVAS_SIZES[fmt][1]) for fmt in format_list}
+    ref_width, ref_height = canvases[format_list[0]]["width"], canvases[format_list[0]]["height"]
+    use_cache = CARD_CACHE if use_cache is None else use_cache
     for idx, text in enumerate(card_contents, 1):
         bg_color = bg_colors[(idx - 1) % len(bg_colors)]
         font_color = text_colors[(idx - 1) % len(text_colors)]
         # Add topic to filename for distinction
         filename = f"card_{idx}_{topic}.png"
-        create_card_image(text, os.path.join(output_dir, filename), bg_color=bg_color, font_color=font_color)
-    print(f"[Card] Card images generated in '{output_dir}' directory.")
+        output_paths = {fmt: os.path.join(get_format_dir(output_dir, fmt, format_list), filename) if save_png else None
+                        for fmt in format_list}
+        # render_card's defaults for the border and shadow colors are part of the look, so they are keyed too
+        keys = {}
+        if use_cache:
+            assets = get_asset_versions(text)
+            keys = {fmt: get_card_cache_key(text, assets, canvas=[canvases[fmt]["width"], canvases[fmt]["height"]],
+                                            layout_canvas=[ref_width, ref_height], bg_color=bg_color, font_color=font_color,
+                                            box_border_color=[0, 0, 0], shadow_color=[80, 80, 80, 80], **style)
+                    for fmt in format_list}
+        rendered = {}
+        for fmt, key in keys.items():
+            with span("card.cache", "render", card=idx, format=fmt):
+                hit, img = fetch_cached_card(key, output_paths[fmt], keep_images)
+                current_span().set(hit=hit)
+            if hit:
+                rendered[fmt] = img
+                print(f"[Card] Cache hit for card {idx} ({fmt}): {output_paths[fmt] or 'in memory'}")
+        layout = None
+        for fmt in format_list:
+            if fmt not in rendered:
+                if layout is None:
+                    with span("card.layout", "render", card=idx):
+                        layout = layout_card(text, width=ref_width, height=ref_height, max_font_size=style["max_font_size"],
+                                             min_font_size=style["min_font_size"], margin=style["margin"],
+                                             line_spacing=style["line_spacing"], title_box_height=style["title_box_height"])
+                width, height = canvases[fmt]["width"], canvases[fmt]["height"]
+                with span("card.render", "render", card=idx, format=fmt):
+                    # Cached cards are saved into the cache first and then linked to output_path
+                    img = render_card(layout, None if use_cache else output_paths[fmt], width=width, height=height,
+                                      bg_color=bg_color, font_color=font_color,
+                                      margin=style["margin"], title_font_size=style["title_font_size"],
+                                      title_box_height=style["title_box_height"], box_border_width=style["box_border_width"],
+                                      shadow_offset=style["shadow_offset"])
+                    if use_cache:
+                        store_cached_card(keys[fmt], img, output_paths[fmt])
+                rendered[fmt] = img
+            images[fmt].append(rendered[fmt] if keep_images else output_paths[fmt])
+    if use_cache:
+        evict_card_cache()
+        print_card_cache_stats()
+    if save_png:
+        print(f"[Card] Card images generated in '{output_dir}' directory.")
+    return images if formats else images[format_list[0]]
 
 def main():
     """
@@ -263,8 +810,12 @@ def main():
     parser = argparse.ArgumentParser(description="Card Image Generator from JSON output")
     parser.add_argument('--json', type=str, default="card_news_output.json", help='Path to the card news output JSON file')
     parser.add_argument('--output_dir', type=str, default="cards", help='Directory to save card images')
+    parser.add_argument('--formats', type=str, default=None, help="Comma-separated canvas formats, e.g. '9:16,1:1,16:9'")
+    parser.add_argument('--draft', action='store_true', help='Render scaled-down preview cards')
+    parser.add_argument('--no_cache', action='store_true', help='Render every card instead of reusing unchanged renders from the cache')
     args = parser.parse_args()
-    generate_cards_from_json(args.json, args.output_dir)
+    generate_cards_from_json(args.json, args.output_dir, formats=args.formats.split(",") if args.formats else None, draft=args.draft,
+                             use_cache=False if args.no_cache else None)
 
 if __name__ == "__main__":
     main()
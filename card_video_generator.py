@@ -1,9 +1,17 @@
 """
 card_video_generator.py: Assembles card images and audio into a final video, adds background music, and handles output naming by topic.
 """
-from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips, CompositeAudioClip
 import os
+import re
 import json
+from tracing import span, current_span
+import media_probe
+import resources
+
+# Draft previews encode at a low frame rate with the fastest x264 preset, with frames no larger than DRAFT_MAX_SIDE
+DRAFT_FPS = int(os.getenv("DRAFT_FPS", "12"))
+DRAFT_PRESET = os.getenv("DRAFT_PRESET", "ultrafast")
+DRAFT_MAX_SIDE = int(os.getenv("DRAFT_MAX_SIDE", "640"))
 
 def get_music_path_from_json(json_path="music_info.json", default_path="music/bg_music.mp3"):
     """
@@ -46,9 +54,406 @@ def get_topic_from_json(json_path="card_news_output.json"):
             print(f"[Video] Could not read topic from {json_path}: {e}")
     return "topic"
 
-def create_video_from_cards(cards_dir="cards", audio_dir="audio", output_file=None, fps=30, duration=None, bg_music_path=None, music_fadeout=2, json_path="card_news_output.json"):
+def get_ffmpeg_binary():
+    """
+    Get the ffmpeg executable moviepy is configured with (falls back to 'ffmpeg' on PATH).
+
+    Returns:
+        str: ffmpeg executable.
+    """
+    try:
+        from moviepy.config import get_setting
+        return get_setting("FFMPEG_BINARY")
+    except Exception:
+        return "ffmpeg"
+
+def plan_card_durations(count, audio_dir, card_durations=None, duration=None):
+    """
+    Work out each card's narration file and length before any decoder is opened: the exact duration when given,
+    else the narration MP3's header-probed duration (see media_probe.py), else the default duration.
+
+    Args:
+        count (int): Number of cards.
+        audio_dir (str): Directory with card_{idx}.mp3 narration files.
+        card_durations (list[float] or None): Exact per-card narration durations.
+        duration (float or None): Default duration per card if no audio.
+    Returns:
+        list[tuple[str or None, float or None]]: (narration path or None, seconds) per card; seconds is None only
+        when a narration file exists but could not be probed, so its decoder has to be asked.
+    """
+    plan = []
+    for idx in range(1, count + 1):
+        audio_path = os.path.join(audio_dir, f"card_{idx}.mp3")
+        if not os.path.exists(audio_path):
+            plan.append((None, duration or 2))
+        elif card_durations and idx <= len(card_durations):
+            plan.append((audio_path, card_durations[idx - 1]))
+        else:
+            plan.append((audio_path, media_probe.get_duration(audio_path)))
+    return plan
+
+def encode_card_segment(task):
+    """
+    Encode one card's still image to its own video-only MP4 segment with exactly task['frames'] frames.
+    Runs in a worker process. Every segment uses the same codec parameters, so segments can be joined with
+    stream copy; narration is added afterwards as one continuous track (per-segment AAC encodes would each add
+    priming delay that the concat demuxer does not remove, so audio would slip behind at every card boundary).
+
+    Args:
+        task (dict): image (path or array), frames, output, fps, preset, threads.
+    Returns:
+        tuple[str, float]: Segment path and duration in seconds.
+    """
+    import subprocess
+    import numpy as np
+    from PIL import Image
+    image = task["image"]
+    if not isinstance(image, str):
+        path = f"{task['output']}.png"
+        Image.fromarray(np.asarray(image)[:, :, :3]).save(path)
+        image = path
+    subprocess.run([get_ffmpeg_binary(), "-y", "-loglevel", "error", "-loop", "1", "-framerate", str(task["fps"]),
+                    "-i", image, "-frames:v", str(task["frames"]), "-c:v", "libx264", "-preset", task["preset"],
+                    "-pix_fmt", "yuv420p", "-threads", str(task["threads"]), task["output"]], check=True)
+    return task["output"], task["frames"] / task["fps"]
+
+def append_card_narration(wav, audio, samples, sample_rate):
+    """
+    Append one card's narration to an open 16-bit stereo WAV as exactly samples samples (cut, or padded with
+    silence), so card boundaries in the narration track line up with the video's frame boundaries.
+
+    Args:
+        wav (wave.Wave_write): Open WAV writer.
+        audio (AudioFileClip or None): The card's narration (None for a silent card).
+        samples (int): Samples to write.
+        sample_rate (int): WAV sample rate.
+    Returns:
+        None.
+    """
+    import numpy as np
+    written = 0
+    if audio is not None:
+        for chunk in audio.iter_chunks(chunksize=sample_rate, fps=sample_rate, quantize=True, nbytes=2):
+            chunk = chunk[:samples - written]
+            wav.writeframes(np.ascontiguousarray(chunk, dtype=np.int16).tobytes())
+            written += len(chunk)
+            if written >= samples:
+                break
+    if written < samples:
+        wav.writeframes(bytes(4 * (samples - written)))
+
+def mux_narration(video_path, narration_path, output_file):
+    """
+    Add a narration track to a video-only file, copying the video stream.
+
+    Args:
+        video_path (str): Video-only MP4.
+        narration_path (str): Narration WAV.
+        output_file (str): Output MP4 path.
+    Returns:
+        str: output_file.
+    """
+    import subprocess
+    subprocess.run([get_ffmpeg_binary(), "-y", "-loglevel", "error", "-i", video_path, "-i", narration_path,
+                    "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", output_file], check=True)
+    return output_file
+
+def concat_segments(segment_paths, output_file):
+    """
+    Join MP4 segments with ffmpeg's concat demuxer and stream copy (no re-encode).
+
+    Args:
+        segment_paths (list[str]): Segments in order.
+        output_file (str): Joined MP4 path.
+    Returns:
+        str: output_file.
+    """
+    import subprocess
+    list_path = f"{output_file}.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        subprocess.run([get_ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+                        "-c", "copy", output_file], check=True)
+    finally:
+        os.remove(list_path)
+    return output_file
+
+def mix_background_music(video_file, bg_music_path, output_file, total_duration, music_fadeout=2, music_volume=0.15):
+    """
+    Mix background music under a video's narration in an audio-only pass (the video stream is copied).
+    Music shorter than the video is looped.
+
+    Args:
+        video_file (str): Video with narration audio.
+        bg_music_path (str): Background music file.
+        output_file (str): Output MP4 path.
+        total_duration (float): Video duration in seconds.
+        music_fadeout (int): Seconds to fade out music and the final mix.
+        music_volume (float): Music gain relative to narration.
+    Returns:
+        str: output_file.
+    """
+    import subprocess
+    fade_start = max(0.0, total_duration - music_fadeout)
+    # amix halves each input, so the mix is scaled back up by 2 to keep narration at its original level
+    audio_filter = (
+        f"[1:a]atrim=0:{total_duration:.3f},asetpts=PTS-STARTPTS,volume={music_volume},"
+        f"afade=t=out:st={fade_start:.3f}:d={music_fadeout}[m];"
+        f"[0:a][m]amix=inputs=2:duration=first:dropout_transition=0,volume=2,"
+        f"afade=t=out:st={fade_start:.3f}:d={music_fadeout}[a]"
+    )
+    subprocess.run([get_ffmpeg_binary(), "-y", "-loglevel", "error", "-i", video_file, "-stream_loop", "-1", "-i", bg_music_path,
+                    "-filter_complex", audio_filter, "-map", "0:v", "-map", "[a]", "-c:v", "copy", "-c:a", "aac",
+                    output_file], check=True)
+    return output_file
+
+def create_video_from_segments(images, audio_dir, output_file, fps=30, duration=None, bg_music_path=None, music_fadeout=2, card_durations=None, workers=None, preset="medium", sample_rate=44100):
+    """
+    Encode each card as its own video-only segment in parallel worker processes and join the segments with
+    stream copy. Meanwhile the narration is written as one continuous track, cut at the same card boundaries,
+    and muxed in after the join; background music is then mixed in with an audio-only pass.
+
+    Args:
+        images (list): Card images (paths or arrays) in card order.
+        audio_dir (str): Directory with card_{idx}.mp3 narration files.
+        output_file (str): Output video filename.
+        fps (int): Frames per second.
+        duration (float or None): Default duration per card if no audio.
+        bg_music_path (str or None): Path to background music file.
+        music_fadeout (int): Seconds to fade out music.
+        card_durations (list[float] or None): Exact per-card narration durations.
+        workers (int or None): Worker processes (defaults to the CPU count).
+        preset (str): x264 preset for every segment.
+        sample_rate (int): Narration sample rate.
+    Returns:
+        str: Path to the saved video file.
+    """
+    import shutil
+    import tempfile
+    import wave
+    from concurrent.futures import ProcessPoolExecutor
+    from moviepy.editor import AudioFileClip
+    workers = max(1, min(workers or os.cpu_count() or 1, len(images)))
+    segment_dir = tempfile.mkdtemp(prefix="card_segments_", dir=os.path.dirname(os.path.abspath(output_file)))
+    narration_path = os.path.join(segment_dir, "narration.wav")
+    tasks = []
+    with span("video.plan", "video", cards=len(images)):
+        plan = plan_card_durations(len(images), audio_dir, card_durations, duration)
+        for idx, (audio_path, card_duration) in enumerate(plan):
+            if card_duration is None:
+                # A narration file that could not be probed has to be asked for its length by its decoder
+                audio = AudioFileClip(audio_path)
+                plan[idx] = (audio_path, audio.duration)
+                audio.close()
+    # Frame and sample counts come from cumulative boundaries so the joined video and the narration never drift apart
+    elapsed = 0.0
+    boundaries = []
+    for idx, (img, (audio_path, card_duration)) in enumerate(zip(images, plan), 1):
+        frames = round((elapsed + card_duration) * fps) - round(elapsed * fps)
+        samples = round((elapsed + card_duration) * sample_rate) - round(elapsed * sample_rate)
+        elapsed += card_duration
+        boundaries.append((audio_path, samples))
+        tasks.append({
+            "image": img,
+            "frames": max(1, frames),
+            "output": os.path.join(segment_dir, f"segment_{idx:04d}.mp4"),
+            "fps": fps,
+            "preset": preset,
+            # Split the cores between concurrent encoders instead of oversubscribing them
+            "threads": max(1, (os.cpu_count() or 1) // workers)
+        })
+    try:
+        with span("video.encode_segments", "video", cards=len(tasks), workers=workers):
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = pool.map(encode_card_segment, tasks)
+                # Decode the narration into one track while the workers encode
+                with span("video.narration", "video", cards=len(boundaries)), wave.open(narration_path, "wb") as wav:
+                    wav.setnchannels(2)
+                    wav.setsampwidth(2)
+                    wav.setframerate(sample_rate)
+                    for audio_path, samples in boundaries:
+                        audio = AudioFileClip(audio_path, fps=sample_rate) if audio_path else None
+                        append_card_narration(wav, audio, samples, sample_rate)
+                        if audio is not None:
+                            audio.close()
+                results = list(pending)
+        total_duration = sum(seg_duration for _, seg_duration in results)
+        video_only = os.path.join(segment_dir, "joined_video.mp4")
+        with span("video.concat_segments", "video", segments=len(results)):
+            concat_segments([path for path, _ in results], video_only)
+        joined = mux_narration(video_only, narration_path, os.path.join(segment_dir, "joined.mp4"))
+        if bg_music_path is None:
+            bg_music_path = get_music_path_from_json()
+        if os.path.exists(bg_music_path):
+            print(f"[Video] Adding background music: {bg_music_path}")
+            with span("video.mix_music", "video", duration=total_duration):
+                mix_background_music(joined, bg_music_path, output_file, total_duration, music_fadeout)
+        else:
+            print(f"[Video] WARNING: Background music file '{bg_music_path}' not found. Video will be generated without background music.")
+            shutil.move(joined, output_file)
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+    print(f"[Video] Video saved as {output_file} ({len(tasks)} segments, {workers} workers)")
+    return output_file
+
+def shrink_frame(img, max_side):
+    """
+    Downscale a card image so its longer side is at most max_side (for draft previews of full-size cards).
+
+    Args:
+        img (str or array-like): Image path or RGB array.
+        max_side (int): Largest allowed width or height.
+    Returns:
+        str or np.ndarray: img unchanged if it already fits, else the downscaled RGB array (even dimensions).
+    """
+    import numpy as np
+    from PIL import Image
+    if isinstance(img, str) and max(media_probe.get_dimensions(img) or (max_side + 1,)) <= max_side:
+        return img
+    frame = Image.open(img) if isinstance(img, str) else Image.fromarray(np.asarray(img))
+    if max(frame.size) <= max_side:
+        return img
+    scale = max_side / max(frame.size)
+    size = (max(2, int(frame.width * scale / 2) * 2), max(2, int(frame.height * scale / 2) * 2))
+    return np.asarray(frame.convert("RGB").resize(size, Image.BILINEAR))
+
+def wait_with_peak_rss(proc):
+    """
+    Wait for a child process (e.g. the ffmpeg encoder) and read that child's own peak RSS, rather than
+    RUSAGE_CHILDREN's maximum over every child this process has ever reaped.
+
+    Args:
+        proc (subprocess.Popen): Running child process.
+    Returns:
+        tuple[int, float or None]: (return code, peak RSS in MB, or None where os.wait4 is not available).
+    """
+    import sys
+    if not hasattr(os, "wait4"):
+        return proc.wait(), None
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return proc.returncode, usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def create_video_streaming(images, audio_dir, output_file, fps=30, duration=None, bg_music_path=None, music_fadeout=2, card_durations=None, preset="medium", sample_rate=44100):
+    """
+    Assemble the video in constant memory: one card's image and narration are open at a time, frames are piped
+    to a single ffmpeg encoder and narration samples are appended to a temporary WAV, and each reader is closed
+    before the next card. Background music is then mixed in an audio-only pass. Peak RSS of this encode (the
+    process high-water mark is reset at the start on Linux, see resources.py) and of the encoder is reported at the end.
+
+    Args:
+        images (list): Card images (paths or arrays) in card order.
+        audio_dir (str): Directory with card_{idx}.mp3 narration files.
+        output_file (str): Output video filename.
+        fps (int): Frames per second.
+        duration (float or None): Default duration per card if no audio.
+        bg_music_path (str or None): Path to background music file.
+        music_fadeout (int): Seconds to fade out music.
+        card_durations (list[float] or None): Exact per-card narration durations.
+        preset (str): x264 preset.
+        sample_rate (int): Narration sample rate.
+    Returns:
+        str: Path to the saved video file.
+    """
+    import shutil
+    import subprocess
+    import tempfile
+    import wave
+    import numpy as np
+    from PIL import Image
+    from moviepy.editor import AudioFileClip
+    work_dir = tempfile.mkdtemp(prefix="card_stream_", dir=os.path.dirname(os.path.abspath(output_file)))
+    narration_path = os.path.join(work_dir, "narration.wav")
+    video_path = os.path.join(work_dir, "video.mp4")
+    encoder = None
+    # Earlier stages (in-memory cards, previous worker jobs) must not show up as this encode's peak
+    resources.reset_rss_peak()
+    try:
+        # The first card fixes the frame size for the raw video pipe
+        if isinstance(images[0], str) and media_probe.get_dimensions(images[0]):
+            width, height = media_probe.get_dimensions(images[0])
+        else:
+            first = np.asarray(Image.open(images[0]).convert("RGB") if isinstance(images[0], str) else images[0])
+            height, width = first.shape[:2]
+            del first
+        with span("video.plan", "video", cards=len(images)):
+            plan = plan_card_durations(len(images), audio_dir, card_durations, duration)
+        encoder = subprocess.Popen([get_ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                                    "-s", f"{width}x{height}", "-r", str(fps), "-i", "-", "-c:v", "libx264",
+                                    "-preset", preset, "-pix_fmt", "yuv420p", video_path], stdin=subprocess.PIPE)
+        elapsed = 0.0
+        with wave.open(narration_path, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            for idx, (img, (audio_path, card_duration)) in enumerate(zip(images, plan), 1):
+                with span("video.stream_card", "video", card=idx) as s:
+                    audio = AudioFileClip(audio_path, fps=sample_rate) if audio_path else None
+                    card_duration = card_duration or audio.duration
+                    # Frame and sample counts come from cumulative boundaries so audio and video never drift apart
+                    frames = round((elapsed + card_duration) * fps) - round(elapsed * fps)
+                    samples = round((elapsed + card_duration) * sample_rate) - round(elapsed * sample_rate)
+                    elapsed += card_duration
+                    frame = np.ascontiguousarray(np.asarray(Image.open(img).convert("RGB") if isinstance(img, str) else img)[:, :, :3])
+                    if frame.shape[:2] != (height, width):
+                        frame = np.asarray(Image.fromarray(frame).resize((width, height)))
+                    frame_bytes = frame.tobytes()
+                    for _ in range(frames):
+                        encoder.stdin.write(frame_bytes)
+                    del frame, frame_bytes
+                    append_card_narration(wav, audio, samples, sample_rate)
+                    if audio is not None:
+                        audio.close()
+                    s.set(duration=card_duration, frames=frames)
+        encoder.stdin.close()
+        returncode, peak_encoder = wait_with_peak_rss(encoder)
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with status {encoder.returncode} while encoding {output_file}")
+        encoder = None
+        # Mux the narration in with the video stream copied
+        narrated_path = mux_narration(video_path, narration_path, os.path.join(work_dir, "narrated.mp4"))
+        if bg_music_path is None:
+            bg_music_path = get_music_path_from_json()
+        if os.path.exists(bg_music_path):
+            print(f"[Video] Adding background music: {bg_music_path}")
+            with span("video.mix_music", "video", duration=elapsed):
+                mix_background_music(narrated_path, bg_music_path, output_file, elapsed, music_fadeout)
+        else:
+            print(f"[Video] WARNING: Background music file '{bg_music_path}' not found. Video will be generated without background music.")
+            shutil.move(narrated_path, output_file)
+    finally:
+        if encoder is not None:
+            encoder.kill()
+            encoder.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    peak_self = resources.max_rss_mb()
+    current_span().set(peak_rss_mb=round(peak_self, 1), peak_encoder_rss_mb=round(peak_encoder, 1) if peak_encoder is not None else None)
+    encoder_note = f", encoder {peak_encoder:.0f} MB" if peak_encoder is not None else ""
+    print(f"[Video] Video saved as {output_file} ({len(images)} cards streamed; peak RSS {peak_self:.0f} MB{encoder_note})")
+    return output_file
+
+def card_sort_key(path):
+    """
+    Order card files by their card number (card_{idx}_{topic}.png), since name order puts card_10 before card_2.
+
+    Args:
+        path (str): Card image path.
+    Returns:
+        tuple: (card number, or a large number for other names, file name).
+    """
+    name = os.path.basename(path)
+    match = re.match(r"card_(\d+)", name)
+    return (int(match.group(1)) if match else float("inf"), name)
+
+def create_video_from_cards(cards_dir="cards", audio_dir="audio", output_file=None, fps=30, duration=None, bg_music_path=None, music_fadeout=2, json_path="card_news_output.json", card_durations=None, card_images=None, formats=None, segment_workers=None, streaming=False, draft=False):
     """
     Create a vertical video from card images and audio, add background music, and save with topic in filename.
+    With several formats (e.g. 9:16, 1:1, 16:9), narration and music are mixed once and every aspect variant is
+    encoded against that same soundtrack.
 
     Args:
         cards_dir (str): Directory with card images.
@@ -59,34 +464,91 @@ def create_video_from_cards(cards_dir="cards", audio_dir="audio", output_file=No
         bg_music_path (str or None): Path to background music file.
         music_fadeout (int): Seconds to fade out music.
         json_path (str): Path to card news output JSON.
+        card_durations (list[float] or None): Exact per-card narration durations (e.g. from
+            generate_card_audio_single_request), used as card lengths instead of the decoder's estimate.
+        card_images (list or None): Rendered cards (PIL images or NumPy arrays) in card order, e.g. from
+            generate_cards_from_json; used directly instead of scanning and decoding PNGs in cards_dir.
+            A dict of format -> images renders every format in it.
+        formats (list[str] or None): Formats to render from cards_dir when card_images is not given
+            (the first from cards_dir itself, the others from its per-format subdirectories, e.g. cards/1x1).
+        segment_workers (int or None): Encode cards as parallel segments in this many processes and join them
+            with stream copy (single format only; see create_video_from_segments).
+        streaming (bool): Assemble in constant memory, one card at a time (single format only; see
+            create_video_streaming).
+        draft (bool): Fast preview: frames shrunk to DRAFT_MAX_SIDE, DRAFT_FPS and the DRAFT_PRESET x264 preset,
+            saved with a '_draft' suffix when output_file is None.
     Returns:
-        None. (Saves video file)
+        str or dict or None: Path to the saved video file (a dict of format -> path for several formats),
+        or None if there were no card images.
     """
+    # moviepy.editor is slow to import, so only load it when a video is actually assembled
+    from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips, CompositeAudioClip
     # Get topic for output file name
     topic = get_topic_from_json(json_path)
     if output_file is None:
-        output_file = f"card_news_video_{topic}.mp4"
-    # Get all card images sorted by name
-    images = sorted([os.path.join(cards_dir, f) for f in os.listdir(cards_dir) if f.endswith('.png')])
+        output_file = f"card_news_video_{topic}_draft.mp4" if draft else f"card_news_video_{topic}.mp4"
+    preset = "medium"
+    if draft:
+        fps, preset = DRAFT_FPS, DRAFT_PRESET
+    if isinstance(card_images, dict):
+        formats = list(card_images)
+    elif card_images is not None:
+        formats = None
+    format_list = list(formats) if formats else [None]
+    images_by_format = {}
+    for fmt in format_list:
+        if card_images is not None:
+            # In-memory frames from the renderer: no PNG encode/decode round trip
+            import numpy as np
+            frames = card_images[fmt] if isinstance(card_images, dict) else card_images
+            images_by_format[fmt] = [img if isinstance(img, str) else np.asarray(img) for img in frames]
+        else:
+            # Get all card images sorted by name
+            fmt_dir = cards_dir
+            if fmt is not None:
+                from card_image_generator import get_format_dir
+                fmt_dir = get_format_dir(cards_dir, fmt, format_list)
+            images_by_format[fmt] = sorted([os.path.join(fmt_dir, f) for f in os.listdir(fmt_dir) if f.endswith('.png')], key=card_sort_key)
+    if draft:
+        images_by_format = {fmt: [shrink_frame(img, DRAFT_MAX_SIDE) for img in imgs] for fmt, imgs in images_by_format.items()}
+    images = images_by_format[format_list[0]]
     if not images:
         print("[Video] No card images found in the directory.")
-        return
+        return None
+    if streaming and len(format_list) == 1:
+        with span("video.stream", "video", cards=len(images)):
+            return create_video_streaming(images, audio_dir, output_file, fps=fps, duration=duration, bg_music_path=bg_music_path,
+                                          music_fadeout=music_fadeout, card_durations=card_durations, preset=preset)
+    if segment_workers and len(format_list) == 1:
+        return create_video_from_segments(images, audio_dir, output_file, fps=fps, duration=duration, bg_music_path=bg_music_path,
+                                          music_fadeout=music_fadeout, card_durations=card_durations, workers=segment_workers,
+                                          preset=preset)
+    with span("video.plan", "video", cards=len(images)):
+        plan = plan_card_durations(len(images), audio_dir, card_durations, duration)
     clips = []
-    for idx, img in enumerate(images, 1):
-        audio_path = os.path.join(audio_dir, f"card_{idx}.mp3")
-        if os.path.exists(audio_path):
-            audio = AudioFileClip(audio_path)
-            clip = ImageClip(img).set_duration(audio.duration).set_audio(audio)
-        else:
-            clip = ImageClip(img).set_duration(duration or 2)
+    for idx, (img, (audio_path, card_duration)) in enumerate(zip(images, plan), 1):
+        with span("video.load_card", "video", card=idx) as s:
+            if audio_path:
+                audio = AudioFileClip(audio_path)
+                clip = ImageClip(img).set_duration(card_duration or audio.duration).set_audio(audio)
+            else:
+                clip = ImageClip(img).set_duration(card_duration)
+            s.set(duration=clip.duration)
         clips.append(clip)
-    video = concatenate_videoclips(clips, method="compose")
+    with span("video.concatenate", "video", cards=len(clips)):
+        video = concatenate_videoclips(clips, method="compose")
     # Use music_info.json if available
     if bg_music_path is None:
         bg_music_path = get_music_path_from_json()
     if os.path.exists(bg_music_path):
         print(f"[Video] Adding background music: {bg_music_path}")
         bgm = AudioFileClip(bg_music_path)
+        music_duration = media_probe.get_duration(bg_music_path)
+        if music_duration is not None and music_duration < video.duration:
+            # subclip cannot extend a track past its end, so a short track is looped under the video
+            from moviepy.audio.fx.all import audio_loop
+            print(f"[Video] Music ({music_duration:.1f}s) is shorter than the video ({video.duration:.1f}s); looping it.")
+            bgm = audio_loop(bgm, duration=video.duration)
         # Always fade out the last N seconds of the video duration
         if video.duration > music_fadeout:
             bgm = bgm.subclip(0, video.duration).audio_fadeout(music_fadeout)
@@ -103,8 +565,37 @@ def create_video_from_cards(cards_dir="cards", audio_dir="audio", output_file=No
         video = video.set_audio(final_audio)
     else:
         print(f"[Video] WARNING: Background music file '{bg_music_path}' not found. Video will be generated without background music.")
-    video.write_videofile(output_file, fps=fps)
-    print(f"[Video] Video saved as {output_file}")
+    if len(format_list) == 1:
+        with span("video.encode", "video", fps=fps, duration=video.duration) as s:
+            video.write_videofile(output_file, fps=fps, preset=preset)
+            s.set(bytes=os.path.getsize(output_file))
+        print(f"[Video] Video saved as {output_file}")
+        return output_file
+    # Several formats: mix the soundtrack once; each encode muxes it in with stream copy
+    base, ext = os.path.splitext(output_file)
+    mixed_audio_path = None
+    if video.audio is not None:
+        mixed_audio_path = f"{base}.mix.m4a"
+        with span("video.mix_audio", "video", duration=video.duration):
+            video.audio.write_audiofile(mixed_audio_path, fps=44100, codec="aac")
+    outputs = {}
+    try:
+        for fmt in format_list:
+            fmt_output = output_file if fmt == format_list[0] else f"{base}_{fmt.replace(':', 'x')}{ext}"
+            if fmt == format_list[0]:
+                fmt_video = video
+            else:
+                fmt_clips = [ImageClip(img).set_duration(clip.duration) for img, clip in zip(images_by_format[fmt], clips)]
+                fmt_video = concatenate_videoclips(fmt_clips, method="compose")
+            with span("video.encode", "video", fps=fps, duration=fmt_video.duration, format=fmt) as s:
+                fmt_video.write_videofile(fmt_output, fps=fps, audio=mixed_audio_path or True, preset=preset)
+                s.set(bytes=os.path.getsize(fmt_output))
+            print(f"[Video] {fmt} video saved as {fmt_output}")
+            outputs[fmt] = fmt_output
+    finally:
+        if mixed_audio_path and os.path.exists(mixed_audio_path):
+            os.remove(mixed_audio_path)
+    return outputs
 
 def main():
     """
@@ -0,0 +1,383 @@
+"""
+cassette.py: Record/replay transport for every external API call (OpenAI, SerpAPI, ElevenLabs, Jamendo, Twemoji).
+
+In record mode each HTTP exchange made through the shared clients (api_clients.py) is appended to a JSON-lines
+cassette; JSON and text bodies are stored inline and binary payloads (audio, images) are stored once each under
+<cassette>.blobs/<sha256>. In replay mode the same requests are answered from the cassette without touching the
+network, in recorded order per request, optionally sleeping for the recorded latency (scaled by latency_scale).
+Replaying with latency_scale=0 measures the pipeline's pure CPU cost; 1.0 reproduces the recorded run's timing.
+
+Requests are matched by method, URL (with credentials such as api_key/client_id removed) and a hash of the body.
+Request headers are never written, so cassettes carry no API keys.
+
+Enable with CASSETTE_MODE=record|replay and CASSETTE_PATH, or run_pipeline --record/--replay. The mode is kept in
+the environment so child scripts (music retrieval, emoji downloads) record and replay too.
+"""
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassette.jsonl")
+CASSETTE_LATENCY = float(os.getenv("CASSETTE_LATENCY", "0"))
+# Query parameters that carry credentials and are dropped from recorded URLs
+SECRET_PARAMS = {"api_key", "client_id", "key", "token", "access_token"}
+# Response headers not stored: wire-encoding headers (bodies are stored decoded), volatile headers and cookies
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "date", "server", "set-cookie"}
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a request the cassette has no recording of."""
+
+
+def normalize_url(url):
+    """
+    Drop credential query parameters and sort the rest so equivalent URLs match.
+
+    Args:
+        url (str): Request URL.
+    Returns:
+        str: Normalized URL.
+    """
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def body_digest(body):
+    """
+    Hash a request body (JSON bodies are canonicalized so key order does not matter).
+
+    Args:
+        body (bytes or str or None): Request body.
+    Returns:
+        str: Hex SHA-256 digest ('' for an empty body).
+    """
+    if not body:
+        return ""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    return hashlib.sha256(body).hexdigest()
+
+
+def is_text(content_type):
+    content_type = (content_type or "").lower()
+    return "json" in content_type or content_type.startswith("text/")
+
+
+class Cassette:
+    """
+    A cassette file and its blob directory.
+
+    Args:
+        path (str): JSON-lines cassette file.
+        mode (str): 'record' (start a new cassette) or 'replay'.
+        latency_scale (float): Replay sleeps for the recorded latency times this factor.
+    """
+
+    def __init__(self, path, mode, latency_scale=0.0):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.blob_dir = f"{path}.blobs"
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.positions = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0, "blob_bytes": 0}
+        if mode == "record":
+            os.makedirs(self.blob_dir, exist_ok=True)
+            # The process that starts recording truncates the cassette; child processes inherit
+            # CASSETTE_OWNER and append to it
+            if "CASSETTE_OWNER" not in os.environ:
+                open(path, "w").close()
+                os.environ["CASSETTE_OWNER"] = str(os.getpid())
+        elif mode == "replay":
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], []).append(entry)
+        else:
+            raise ValueError(f"Unknown cassette mode '{mode}'; expected 'record' or 'replay'.")
+
+    @staticmethod
+    def key(method, url, body):
+        return f"{method.upper()} {normalize_url(url)} {body_digest(body)}"
+
+    def record(self, method, url, body, status, headers, content, elapsed):
+        """
+        Append one exchange to the cassette.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Request URL.
+            body (bytes or str or None): Request body.
+            status (int): Response status code.
+            headers (dict): Response headers.
+            content (bytes): Decoded response body.
+            elapsed (float): Seconds the exchange took.
+        Returns:
+            None.
+        """
+        headers = {k.lower(): v for k, v in headers.items() if k.lower() not in SKIPPED_HEADERS}
+        entry = {"key": self.key(method, url, body), "status": status, "headers": headers, "elapsed": round(elapsed, 4)}
+        text = None
+        if is_text(headers.get("content-type")):
+            try:
+                text = content.decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+        if text is not None:
+            entry["text"] = text
+        else:
+            digest = hashlib.sha256(content).hexdigest()
+            blob_path = os.path.join(self.blob_dir, digest)
+            if not os.path.exists(blob_path):
+                tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, blob_path)
+                self.stats["blob_bytes"] += len(content)
+            entry["blob"] = digest
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self.lock:
+            # One append per line so concurrent writers (threads and child processes) do not interleave
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.stats["recorded"] += 1
+
+    def play(self, method, url, body):
+        """
+        Find the recorded response for a request: the next unplayed recording of it, or the last one when a
+        request is repeated more often than it was recorded.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Request URL.
+            body (bytes or str or None): Request body.
+        Returns:
+            tuple[int, dict, bytes]: (status, headers, content).
+        """
+        entry, content = self._lookup(method, url, body)
+        if self.latency_scale > 0:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+        return entry["status"], entry["headers"], content
+
+    async def play_async(self, method, url, body):
+        """
+        Asyncio counterpart of play: the recorded latency is awaited instead of slept.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Request URL.
+            body (bytes or str or None): Request body.
+        Returns:
+            tuple[int, dict, bytes]: (status, headers, content).
+        """
+        import asyncio
+        entry, content = self._lookup(method, url, body)
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["elapsed"] * self.latency_scale)
+        return entry["status"], entry["headers"], content
+
+    def _lookup(self, method, url, body):
+        key = self.key(method, url, body)
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.stats["misses"] += 1
+                raise CassetteMiss(f"No recording for {key} in {self.path}.")
+            position = self.positions.get(key, 0)
+            entry = entries[min(position, len(entries) - 1)]
+            self.positions[key] = position + 1
+            self.stats["replayed"] += 1
+        if "blob" in entry:
+            with open(os.path.join(self.blob_dir, entry["blob"]), "rb") as f:
+                content = f.read()
+        else:
+            content = entry["text"].encode("utf-8")
+        return entry, content
+
+
+def set_cassette(mode, path=None, latency_scale=None):
+    """
+    Turn recording or replay on or off for this process and its children.
+    Clients created afterwards use it; call api_clients.reset_clients() to rebuild existing ones.
+
+    Args:
+        mode (str): 'record', 'replay' or 'off'.
+        path (str or None): Cassette file (defaults to CASSETTE_PATH).
+        latency_scale (float or None): Replay latency factor (defaults to CASSETTE_LATENCY).
+    Returns:
+        Cassette or None: The active cassette.
+    """
+    global _cassette, CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY
+    with _cassette_lock:
+        CASSETTE_MODE = mode
+        CASSETTE_PATH = path or CASSETTE_PATH
+        CASSETTE_LATENCY = CASSETTE_LATENCY if latency_scale is None else latency_scale
+        os.environ.update(CASSETTE_MODE=CASSETTE_MODE, CASSETTE_PATH=CASSETTE_PATH, CASSETTE_LATENCY=str(CASSETTE_LATENCY))
+        os.environ.pop("CASSETTE_OWNER", None)
+        _cassette = None if mode == "off" else Cassette(CASSETTE_PATH, mode, CASSETTE_LATENCY)
+        return _cassette
+
+
+def get_cassette():
+    """
+    Get the active cassette, opening it from CASSETTE_MODE/CASSETTE_PATH on first use.
+
+    Returns:
+        Cassette or None: None when recording and replay are off.
+    """
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None and CASSETTE_MODE != "off":
+            _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY)
+        return _cassette
+
+
+def make_requests_adapter(cassette, **kwargs):
+    """
+    Build a requests transport adapter that records through, or replays from, a cassette.
+
+    Args:
+        cassette (Cassette): Active cassette.
+        **kwargs: HTTPAdapter arguments (pool sizes).
+    Returns:
+        requests.adapters.HTTPAdapter: Adapter to mount on a session.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    class CassetteAdapter(HTTPAdapter):
+        def send(self, request, stream=False, **send_kwargs):
+            if cassette.mode == "replay":
+                status, headers, content = cassette.play(request.method, request.url, request.body)
+                response = requests.Response()
+                response.status_code = status
+                response.headers = CaseInsensitiveDict(headers)
+                response.encoding = get_encoding_from_headers(response.headers)
+                response.raw = io.BytesIO(content)
+                response._content = content
+                response._content_consumed = True
+                response.url = request.url
+                response.request = request
+                response.reason = "Replayed"
+                return response
+            start = time.monotonic()
+            # Streamed downloads are buffered while recording so the whole body can be stored
+            response = super().send(request, stream=False, **send_kwargs)
+            cassette.record(request.method, request.url, request.body, response.status_code, response.headers,
+                            response.content, time.monotonic() - start)
+            return response
+
+    return CassetteAdapter(**kwargs)
+
+
+def make_httpx_client(cassette):
+    """
+    Build an httpx client (as used by the OpenAI and ElevenLabs SDKs) that records through, or replays from,
+    a cassette.
+
+    Args:
+        cassette (Cassette): Active cassette.
+    Returns:
+        httpx.Client: Client to pass to the SDK.
+    """
+    import httpx
+
+    class CassetteTransport(httpx.BaseTransport):
+        def __init__(self):
+            self.wrapped = httpx.HTTPTransport() if cassette.mode == "record" else None
+
+        def handle_request(self, request):
+            body = request.read()
+            if cassette.mode == "replay":
+                status, headers, content = cassette.play(request.method, str(request.url), body)
+                return httpx.Response(status, headers=headers, content=content, request=request)
+            start = time.monotonic()
+            response = self.wrapped.handle_request(request)
+            try:
+                # Decode through a Response so the stored body is the plain payload
+                content = httpx.Response(response.status_code, headers=response.headers, stream=response.stream, request=request).read()
+            finally:
+                response.close()
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS}
+            cassette.record(request.method, str(request.url), body, response.status_code, headers, content, time.monotonic() - start)
+            return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+        def close(self):
+            if self.wrapped is not None:
+                self.wrapped.close()
+
+    return httpx.Client(transport=CassetteTransport(), timeout=None)
+
+
+def make_async_httpx_client(cassette):
+    """
+    Build an httpx.AsyncClient (as used by AsyncOpenAI, AsyncElevenLabs and the async pipeline) that records
+    through, or replays from, a cassette.
+
+    Args:
+        cassette (Cassette): Active cassette.
+    Returns:
+        httpx.AsyncClient: Client to pass to the SDK.
+    """
+    import httpx
+
+    class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self.wrapped = httpx.AsyncHTTPTransport() if cassette.mode == "record" else None
+
+        async def handle_async_request(self, request):
+            body = await request.aread()
+            if cassette.mode == "replay":
+                status, headers, content = await cassette.play_async(request.method, str(request.url), body)
+                return httpx.Response(status, headers=headers, content=content, request=request)
+            start = time.monotonic()
+            response = await self.wrapped.handle_async_request(request)
+            try:
+                content = await httpx.Response(response.status_code, headers=response.headers, stream=response.stream, request=request).aread()
+            finally:
+                await response.aclose()
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS}
+            cassette.record(request.method, str(request.url), body, response.status_code, headers, content, time.monotonic() - start)
+            return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+        async def aclose(self):
+            if self.wrapped is not None:
+                await self.wrapped.aclose()
+
+    return httpx.AsyncClient(transport=AsyncCassetteTransport(), timeout=None)
+
+
+def print_stats(file=None):
+    """
+    Print what the active cassette recorded or replayed.
+
+    Args:
+        file: Output stream (defaults to stdout).
+    Returns:
+        None.
+    """
+    if _cassette is None:
+        return
+    stats = _cassette.stats
+    if _cassette.mode == "record":
+        print(f"[Cassette] Recorded {stats['recorded']} exchanges to {_cassette.path} ({stats['blob_bytes'] / 1e6:.1f} MB of new blobs)", file=file or sys.stdout)
+    else:
+        print(f"[Cassette] Replayed {stats['replayed']} exchanges from {_cassette.path} ({stats['misses']} misses)", file=file or sys.stdout)
@@ -2,12 +2,13 @@
 download_twemoji_pngs.py: Downloads emoji PNGs from Twemoji CDN for all emojis found in card news content.
 """
 import os
-import requests
-import emoji
 import json
+from tracing import span
+from api_clients import get_http_session
+from emoji_tokenizer import find_emojis, twemoji_name
 
-TWEMOJI_BASE = "https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/"
-EMOJI_PNG_DIR = "emoji_png"
+TWEMOJI_BASE = os.getenv("TWEMOJI_BASE", "https://cdn.jsdelivr.net/gh/twitter/twemoji@14.0.2/assets/72x72/")
+EMOJI_PNG_DIR = os.getenv("EMOJI_PNG_DIR", "emoji_png")
 
 # Utility to get all emojis from card_news_output.json
 
@@ -18,7 +19,7 @@ def get_emojis_from_card_news(json_path="card_news_output.json"):
     Args:
         json_path (str): Path to card news output JSON.
     Returns:
-        set[str]: Set of unique emoji characters found in card contents/scripts.
+        set[str]: Set of unique emoji clusters (including ZWJ sequences and skin tones) found in card contents/scripts.
     """
     if not os.path.exists(json_path):
         print(f"[WARN] {json_path} not found. Please run article_search.py first.")
@@ -27,18 +28,18 @@ def get_emojis_from_card_news(json_path="card_news_output.json"):
         data = json.load(f)
     scripts = data.get("card_contents") or data.get("scripts") or []
     text = " ".join(scripts)
-    return set(c for c in text if emoji.is_emoji(c))
+    return find_emojis(text)
 
 def emoji_to_codepoint(e):
     """
-    Convert an emoji character to its Twemoji codepoint string.
+    Convert an emoji character or cluster to its Twemoji codepoint string.
 
     Args:
-        e (str): Emoji character.
+        e (str): Emoji character or cluster.
     Returns:
-        str: Twemoji codepoint string (e.g., '1f600').
+        str: Twemoji codepoint string (e.g., '1f600', '1f469-200d-1f4bb').
     """
-    return "-".join(f"{ord(c):x}" for c in e)
+    return twemoji_name(e)
 
 def download_emoji_png(codepoint, out_path):
     """
@@ -52,7 +53,9 @@ def download_emoji_png(codepoint, out_path):
     """
     url = f"{TWEMOJI_BASE}{codepoint}.png"
     try:
-        r = requests.get(url, timeout=10)
+        with span("twemoji.download", "api", codepoint=codepoint) as s:
+            r = get_http_session().get(url, timeout=10)
+            s.set(status=r.status_code, bytes=len(r.content))
         if r.status_code == 200:
             with open(out_path, "wb") as f:
                 f.write(r.content)
@@ -64,18 +67,20 @@ def download_emoji_png(codepoint, out_path):
         print(f"[ERROR] {url} - {e}")
     return False
 
-def main():
+def main(json_path="card_news_output.json"):
     """
     Download all required emoji PNGs for the current card news content.
-    No arguments. Runs download if run directly.
+
+    Args:
+        json_path (str): Path to card news output JSON.
     """
     os.makedirs(EMOJI_PNG_DIR, exist_ok=True)
-    emojis = get_emojis_from_card_news()
+    emojis = get_emojis_from_card_news(json_path)
     if not emojis:
         print("No emojis found in card news content.")
         return
     for e in emojis:
-        codepoint = emoji_to_codepoint(e)
+        codepoint = twemoji_name(e)
         out_path = os.path.join(EMOJI_PNG_DIR, f"{codepoint}.png")
         if not os.path.exists(out_path):
             download_emoji_png(codepoint, out_path)
@@ -0,0 +1,272 @@
+"""
+emoji_bundle.py: Packs Twemoji PNGs into a single memory-mapped bundle file so card rendering needs no network
+and no per-emoji file I/O.
+
+Bundle layout:
+    8-byte magic | 4-byte little-endian index length | JSON index | sprite data (each sprite 16-byte aligned)
+The index maps Twemoji codepoint names (e.g. '1f600', '1f468-200d-1f4bb') to [offset, length, width, height].
+Sprites are stored either as pre-decoded RGBA pixels ('rgba', ~20 KB per 72x72 emoji, zero decode cost) or as
+the original PNG bytes ('png', ~1 KB each). Readers mmap the file, so processes on a host share one copy through
+the page cache and sprites are sliced out without copying.
+
+Build a bundle with:
+    python emoji_bundle.py build --source_dir twemoji/assets/72x72      # from a local Twemoji checkout
+    python emoji_bundle.py build                                         # download every emoji from TWEMOJI_BASE
+"""
+import io
+import os
+import sys
+import json
+import mmap
+import struct
+import threading
+
+MAGIC = b"EMJBNDL1"
+ALIGN = 16
+EMOJI_BUNDLE_PATH = os.getenv("EMOJI_BUNDLE", "emoji_bundle.bin")
+
+_bundles = {}
+_bundles_lock = threading.Lock()
+
+
+class EmojiBundle:
+    """
+    Read-only view of a packed emoji bundle.
+
+    Args:
+        path (str): Path to the bundle file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Version of the mapped file, which a rebuild (written to a temp file and renamed) does not change
+        self._version = f"{st.st_size}-{st.st_mtime_ns}"
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an emoji bundle.")
+        (index_len,) = struct.unpack_from("<I", self.mm, len(MAGIC))
+        header_end = len(MAGIC) + 4
+        index = json.loads(self.mm[header_end:header_end + index_len].decode("utf-8"))
+        self.format = index["format"]
+        self.size = index["size"]
+        self.entries = index["entries"]
+        self.data_start = index["data_start"]
+        self.view = memoryview(self.mm)
+
+    def __contains__(self, codepoint):
+        return self.lookup(codepoint) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, codepoint):
+        """
+        Find the index entry for a codepoint name, also trying it without/with the FE0F variation selector
+        (Twemoji drops FE0F from most filenames).
+
+        Args:
+            codepoint (str): Twemoji codepoint name (e.g. '2764-fe0f').
+        Returns:
+            list or None: [offset, length, width, height], or None if the emoji is not in the bundle.
+        """
+        entry = self.entries.get(codepoint)
+        if entry is None and "fe0f" in codepoint:
+            entry = self.entries.get("-".join(p for p in codepoint.split("-") if p != "fe0f"))
+        return entry
+
+    def get_bytes(self, codepoint):
+        """
+        Zero-copy slice of a sprite's stored bytes (RGBA pixels or PNG data, depending on the bundle format).
+
+        Args:
+            codepoint (str): Twemoji codepoint name.
+        Returns:
+            memoryview or None: Sprite bytes backed by the mmap.
+        """
+        entry = self.lookup(codepoint)
+        if entry is None:
+            return None
+        offset, length = self.data_start + entry[0], entry[1]
+        return self.view[offset:offset + length]
+
+    def get_image(self, codepoint):
+        """
+        Get a sprite as a PIL image. For 'rgba' bundles the image shares memory with the mmap (treat it as read-only).
+
+        Args:
+            codepoint (str): Twemoji codepoint name.
+        Returns:
+            Image.Image or None: RGBA image at the bundle's native size.
+        """
+        from PIL import Image
+        entry = self.lookup(codepoint)
+        if entry is None:
+            return None
+        data = self.get_bytes(codepoint)
+        if self.format == "rgba":
+            return Image.frombuffer("RGBA", (entry[2], entry[3]), data, "raw", "RGBA", 0, 1)
+        return Image.open(io.BytesIO(data)).convert("RGBA")
+
+    def version(self):
+        """
+        Identify this bundle's contents (used as an asset version, e.g. for render caches).
+
+        Returns:
+            str: '<size>-<mtime_ns>' of the bundle file as it was when mapped.
+        """
+        return self._version
+
+
+def get_bundle(path=None):
+    """
+    Get the process-wide bundle for path, opening (mmapping) it on first use and reopening it after a rebuild.
+    A missing bundle is not remembered, so one built while a worker is running is picked up by its next card.
+
+    Args:
+        path (str or None): Bundle path (defaults to EMOJI_BUNDLE / 'emoji_bundle.bin').
+    Returns:
+        EmojiBundle or None: The bundle, or None if the file does not exist.
+    """
+    path = path or EMOJI_BUNDLE_PATH
+    try:
+        st = os.stat(path)
+    except OSError:
+        with _bundles_lock:
+            _bundles.pop(path, None)
+        return None
+    with _bundles_lock:
+        bundle = _bundles.get(path)
+        if bundle is None or bundle.version() != f"{st.st_size}-{st.st_mtime_ns}":
+            bundle = _bundles[path] = EmojiBundle(path)
+        return bundle
+
+
+def build_bundle(output_path, sprites, fmt="rgba", size=72):
+    """
+    Write a bundle from PNG sprites.
+
+    Args:
+        output_path (str): Bundle file to write (replaced atomically).
+        sprites (dict[str, bytes]): Twemoji codepoint name to PNG bytes.
+        fmt (str): 'rgba' for pre-decoded pixels or 'png' to store the PNG bytes as-is.
+        size (int): Sprite size in pixels; RGBA sprites of another size are resized.
+    Returns:
+        int: Number of sprites written.
+    """
+    from PIL import Image
+    entries = {}
+    blobs = []
+    offset = 0
+    for codepoint in sorted(sprites):
+        data = sprites[codepoint]
+        if fmt == "rgba":
+            img = Image.open(io.BytesIO(data)).convert("RGBA")
+            if img.size != (size, size):
+                img = img.resize((size, size))
+            width, height = img.size
+            data = img.tobytes()
+        else:
+            width = height = size
+        entries[codepoint] = [offset, len(data), width, height]
+        padding = -len(data) % ALIGN
+        blobs.append(data + bytes(padding))
+        offset += len(data) + padding
+    # data_start depends on the index length, which depends on data_start; reserve a fixed-width field
+    index = {"format": fmt, "size": size, "data_start": 0, "entries": entries}
+    index_len = len(json.dumps(index, separators=(",", ":")).encode("utf-8")) + 20
+    data_start = len(MAGIC) + 4 + index_len
+    data_start += -data_start % ALIGN
+    index["data_start"] = data_start
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    index_bytes += b" " * (data_start - len(MAGIC) - 4 - len(index_bytes))
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, output_path)
+    with _bundles_lock:
+        _bundles.pop(output_path, None)
+    return len(entries)
+
+
+def read_source_dir(source_dir):
+    """
+    Read every '<codepoint>.png' in a directory (e.g. a Twemoji assets/72x72 checkout or emoji_png/).
+
+    Args:
+        source_dir (str): Directory of PNGs.
+    Returns:
+        dict[str, bytes]: Codepoint name to PNG bytes.
+    """
+    sprites = {}
+    for name in os.listdir(source_dir):
+        if name.endswith(".png"):
+            with open(os.path.join(source_dir, name), "rb") as f:
+                sprites[name[:-4]] = f.read()
+    return sprites
+
+
+def download_all_sprites(workers=16):
+    """
+    Download every emoji known to the emoji library from TWEMOJI_BASE.
+
+    Args:
+        workers (int): Concurrent downloads.
+    Returns:
+        dict[str, bytes]: Codepoint name to PNG bytes (emoji Twemoji does not have are skipped).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import emoji
+    from download_twemoji_pngs import TWEMOJI_BASE
+    from emoji_tokenizer import twemoji_name
+    from api_clients import get_http_session
+    session = get_http_session()
+    codepoints = set(twemoji_name(e) for e in emoji.EMOJI_DATA)
+
+    def fetch(codepoint):
+        try:
+            r = session.get(f"{TWEMOJI_BASE}{codepoint}.png", timeout=10)
+            return codepoint, r.content if r.status_code == 200 else None
+        except Exception:
+            return codepoint, None
+
+    sprites = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for codepoint, data in pool.map(fetch, sorted(codepoints)):
+            if data:
+                sprites[codepoint] = data
+    print(f"[Emoji] Downloaded {len(sprites)} of {len(codepoints)} emoji sprites.")
+    return sprites
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or inspect the packed emoji bundle.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Pack Twemoji PNGs into a bundle")
+    build.add_argument("--source_dir", type=str, default=None, help="Directory of <codepoint>.png files (default: download all from TWEMOJI_BASE)")
+    build.add_argument("--output", type=str, default=EMOJI_BUNDLE_PATH, help="Bundle file to write")
+    build.add_argument("--format", type=str, choices=["rgba", "png"], default="rgba", help="Store pre-decoded RGBA pixels or PNG bytes")
+    build.add_argument("--size", type=int, default=72, help="Sprite size in pixels")
+    info = sub.add_parser("info", help="Show bundle contents")
+    info.add_argument("--path", type=str, default=EMOJI_BUNDLE_PATH)
+    args = parser.parse_args()
+    if args.command == "build":
+        sprites = read_source_dir(args.source_dir) if args.source_dir else download_all_sprites()
+        count = build_bundle(args.output, sprites, fmt=args.format, size=args.size)
+        print(f"[Emoji] Wrote {count} sprites to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB, {args.format}).")
+    else:
+        bundle = get_bundle(args.path)
+        if bundle is None:
+            print(f"[Emoji] No bundle at {args.path}.")
+            sys.exit(1)
+        print(f"[Emoji] {args.path}: {len(bundle)} sprites, format {bundle.format}, size {bundle.size}px.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+emoji_tokenizer.py: Single-pass splitting of text into text and emoji runs, with Twemoji filenames.
+
+The emoji pattern is compiled once from every sequence the emoji library knows, arranged as a trie so the regex
+engine matches the longest sequence at each position in C. Sequences the library does not list are still kept
+whole: skin-tone modifiers and variation selectors attach to the preceding emoji, and ZWJ-joined emoji form one
+cluster. Tokenization results are cached per line, since card rendering re-tokenizes the same lines.
+"""
+import re
+import functools
+
+ZWJ = "\u200d"
+VS16 = "\ufe0f"
+# Skin-tone modifiers and variation selectors that extend the preceding emoji
+MODIFIERS = "[\U0001F3FB-\U0001F3FF\ufe0e\ufe0f]"
+
+
+def _char_class(chars):
+    """
+    Build a regex character class, merging consecutive codepoints into ranges (the regex engine scans
+    ranges far faster than long lists of astral-plane literals).
+
+    Args:
+        chars (iterable[str]): Single characters.
+    Returns:
+        str: Character class (or a single escaped character).
+    """
+    codes = sorted(set(ord(c) for c in chars))
+    if len(codes) == 1:
+        return re.escape(chr(codes[0]))
+    ranges = []
+    for code in codes:
+        if ranges and code == ranges[-1][1] + 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return "[" + "".join(re.escape(chr(a)) if a == b else f"{re.escape(chr(a))}-{re.escape(chr(b))}" for a, b in ranges) + "]"
+
+
+def _trie_pattern(node):
+    """
+    Build a regex for a character trie (dict of char -> child node; '' marks the end of a sequence).
+
+    Args:
+        node (dict): Trie node.
+    Returns:
+        str: Regex matching every sequence below node, longest first.
+    """
+    terminal = "" in node
+    branches = []
+    singles = []
+    for char in sorted(k for k in node if k):
+        child = node[char]
+        if list(child) == [""]:
+            singles.append(char)
+        else:
+            branches.append(re.escape(char) + _trie_pattern(child))
+    if singles:
+        branches.append(_char_class(singles))
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if terminal:
+        pattern = "(?:" + pattern + ")?"
+    return pattern
+
+
+@functools.lru_cache(maxsize=1)
+def get_emoji_pattern():
+    """
+    Compile the emoji cluster regex (once per process).
+
+    Returns:
+        re.Pattern: Pattern with one capturing group around each emoji cluster.
+    """
+    import emoji
+    trie = {}
+    for sequence in emoji.EMOJI_DATA:
+        node = trie
+        for char in sequence:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    known = _trie_pattern(trie)
+    # The lookahead rejects ordinary characters with one range check before the trie is tried
+    first = _char_class(trie)
+    cluster = f"(?={first})(?:{known}){MODIFIERS}*(?:{ZWJ}(?:{known}){MODIFIERS}*)*"
+    return re.compile(f"({cluster})")
+
+
+@functools.lru_cache(maxsize=4096)
+def tokenize(line):
+    """
+    Split a line into text and emoji runs in one pass.
+
+    Args:
+        line (str): Text to split.
+    Returns:
+        tuple[tuple[bool, str], ...]: (is_emoji, segment) pairs in order; consecutive text is one segment and
+        each emoji cluster (including ZWJ sequences, skin tones and flags) is one segment.
+    """
+    parts = get_emoji_pattern().split(line)
+    # re.split with one group alternates text, emoji, text, ...
+    return tuple((idx % 2 == 1, part) for idx, part in enumerate(parts) if part)
+
+
+def find_emojis(text):
+    """
+    Get the unique emoji clusters in a text.
+
+    Args:
+        text (str): Text to scan.
+    Returns:
+        set[str]: Emoji clusters.
+    """
+    return set(get_emoji_pattern().findall(text))
+
+
+def twemoji_name(cluster):
+    """
+    Twemoji asset name for an emoji cluster: lowercase hex codepoints joined by '-', with FE0F dropped unless the
+    cluster contains a ZWJ (the rule Twemoji uses for its filenames).
+
+    Args:
+        cluster (str): Emoji cluster (e.g. '❤️', '👩🏽‍💻').
+    Returns:
+        str: Asset name without extension (e.g. '2764', '1f469-1f3fd-200d-1f4bb').
+    """
+    if ZWJ not in cluster:
+        cluster = cluster.replace(VS16, "")
+    return "-".join(f"{ord(c):x}" for c in cluster)
@@ -0,0 +1,324 @@
+"""
+fake_services.py: Local stand-ins for every external API used by the Card News pipeline (OpenAI, SerpAPI, ElevenLabs, Jamendo, Twemoji).
+
+A single threaded HTTP server answers all five APIs with realistic canned payloads, with configurable latency,
+jitter and failure rate. The pipeline modules read their endpoints from environment variables, so
+FakeServices.env() is all that is needed to point a run (including child scripts) at the fakes.
+"""
+import io
+import os
+import base64
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding, mono: 417-byte frames of 1152 samples
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC4])
+MP3_FRAME_BYTES = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+
+SAMPLE_EMOJIS = ["😀", "🚀", "🎉", "🤖", "🔥", "✨"]
+
+SAMPLE_HEADLINES = [
+    "Researchers unveil new model that writes code from sketches",
+    "Startup raises $40M to build robots for warehouse logistics",
+    "City launches free public Wi-Fi across downtown district",
+    "New battery chemistry promises twice the range for e-bikes",
+    "Global streaming hit breaks viewership record in first week",
+    "Scientists map deep-sea coral reef previously thought lost",
+    "Chipmaker posts record quarter on surging AI demand",
+    "Local bakery goes viral for croissant shaped like a rocket",
+    "Space agency confirms launch window for lunar rover",
+    "Music festival announces lineup with surprise headliner",
+]
+
+
+def make_silent_mp3(seconds):
+    """
+    Build a decodable silent MP3 of roughly the given length.
+
+    Args:
+        seconds (float): Target duration in seconds.
+    Returns:
+        bytes: MP3 data (a run of silent Layer III frames).
+    """
+    frames = max(1, int(round(seconds / MP3_FRAME_SECONDS)))
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_BYTES - len(MP3_FRAME_HEADER))
+    return frame * frames
+
+
+def make_emoji_png(codepoint):
+    """
+    Build a 72x72 RGBA PNG standing in for a Twemoji asset.
+
+    Args:
+        codepoint (str): Twemoji codepoint string (used to pick a color).
+    Returns:
+        bytes: PNG data.
+    """
+    from PIL import Image, ImageDraw
+    rng = random.Random(codepoint)
+    img = Image.new("RGBA", (72, 72), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([4, 4, 68, 68], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def fake_chat_content(messages, rng):
+    """
+    Produce a canned chat completion text matching what each pipeline prompt expects.
+
+    Args:
+        messages (list[dict]): Chat messages from the request.
+        rng (random.Random): Random source.
+    Returns:
+        str: Assistant message content.
+    """
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    if "selects music tags" in system:
+        return "['electronic', 'upbeat']"
+    if "scriptwriter" in system:
+        cards = []
+        for idx in range(1, 6):
+            e1, e2 = rng.sample(SAMPLE_EMOJIS, 2)
+            cards.append(
+                f"Card {idx}: {e1} {rng.choice(SAMPLE_HEADLINES)}! Experts say the change arrives this year! "
+                f"Fans are already lining up to try it! {e2}"
+            )
+        return "#Tech, #Trending, #Future\n" + "\n\n".join(cards)
+    if "Shorts host" in system:
+        return "Hey there! You won't believe this one! It's fast, it's fun, and it's happening right now!"
+    return (
+        f"{rng.choice(SAMPLE_HEADLINES)}! The announcement came on Tuesday! Analysts expect big changes!\n"
+        "Fun fact: the first prototype was built in a garage!"
+    )
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    """
+    Request handler routing OpenAI, SerpAPI, ElevenLabs, Jamendo, Twemoji and music download paths.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self):
+        # Returns True if this request should fail
+        svc = self.server.services
+        with svc.lock:
+            delay = max(0.0, svc.latency + svc.rng.uniform(-svc.jitter, svc.jitter))
+            fail = svc.rng.random() < svc.failure_rate
+        if delay:
+            time.sleep(delay)
+        path = urlsplit(self.path).path
+        if path.endswith("/chat/completions"):
+            service = "openai"
+        elif "/text-to-speech/" in path:
+            service = "elevenlabs"
+        else:
+            service = path.strip("/").split("/")[0] or "root"
+        svc.count(service)
+        if fail:
+            self._send(429, {"error": {"message": "Rate limit exceeded (simulated)"}}, headers={"Retry-After": "1"})
+        return fail
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        svc = self.server.services
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        if self._simulate():
+            return
+        if parts.path == "/serpapi/search":
+            num = int(query.get("num", 10))
+            results = []
+            for idx in range(num):
+                headline = SAMPLE_HEADLINES[idx % len(SAMPLE_HEADLINES)]
+                results.append({
+                    "position": idx + 1,
+                    "title": headline,
+                    "snippet": f"{headline}. The story is developing and more details are expected soon.",
+                    "link": f"https://news.example.com/{idx}/story"
+                })
+            self._send(200, {"search_metadata": {"status": "Success"}, "news_results": results})
+        elif parts.path == "/jamendo/tracks/":
+            limit = int(query.get("limit", 5))
+            results = [{
+                "id": str(1000 + idx),
+                "name": f"Sunny Loop {idx + 1}",
+                "artist_name": "Fake Artist",
+                "duration": int(svc.music_seconds),
+                "audio": f"{svc.base_url}/music/track_{idx}.mp3",
+                "audiodownload": f"{svc.base_url}/music/track_{idx}.mp3",
+                "license_ccurl": "http://creativecommons.org/licenses/by/3.0/"
+            } for idx in range(limit)]
+            self._send(200, {"headers": {"status": "success", "results_count": len(results)}, "results": results})
+        elif parts.path.startswith("/music/"):
+            self._send(200, svc.music_mp3, "audio/mpeg")
+        elif parts.path.startswith("/twemoji/"):
+            codepoint = os.path.basename(parts.path).rsplit(".", 1)[0]
+            self._send(200, make_emoji_png(codepoint), "image/png")
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        svc = self.server.services
+        parts = urlsplit(self.path)
+        body = self._read_body()
+        if self._simulate():
+            return
+        if parts.path.endswith("/chat/completions"):
+            with svc.lock:
+                content = fake_chat_content(body.get("messages", []), svc.rng)
+            prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+            completion_tokens = len(content) // 4
+            self._send(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4-0125-preview"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+            })
+        elif "/text-to-speech/" in parts.path and parts.path.endswith("/with-timestamps"):
+            text = body.get("text", "")
+            seconds = max(1.0, len(text) / 15.0)
+            audio = make_silent_mp3(seconds)
+            # Spread characters evenly over the generated audio
+            step = (len(audio) // MP3_FRAME_BYTES) * MP3_FRAME_SECONDS / max(1, len(text))
+            self._send(200, {
+                "audio_base64": base64.b64encode(audio).decode("ascii"),
+                "alignment": {
+                    "characters": list(text),
+                    "character_start_times_seconds": [round(i * step, 3) for i in range(len(text))],
+                    "character_end_times_seconds": [round((i + 1) * step, 3) for i in range(len(text))]
+                }
+            })
+        elif "/text-to-speech/" in parts.path:
+            # ~15 characters of narration per second
+            seconds = max(1.0, len(body.get("text", "")) / 15.0)
+            self._send(200, make_silent_mp3(seconds), "audio/mpeg")
+        else:
+            self._send(404, {"error": "not found"})
+
+
+class FakeServices:
+    """
+    Run the fake API server on a background thread.
+
+    Args:
+        latency (float): Mean added latency per request in seconds.
+        jitter (float): Uniform +/- jitter on latency in seconds.
+        failure_rate (float): Probability in [0, 1] that a request gets a 429.
+        music_seconds (float): Length of the fake background music track.
+        seed (int): Random seed for payloads, latency and failures.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, music_seconds=30.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.music_seconds = music_seconds
+        self.music_mp3 = make_silent_mp3(music_seconds)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_counts = {}
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, service):
+        with self.lock:
+            self.request_counts[service] = self.request_counts.get(service, 0) + 1
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeServiceHandler)
+        self.server.daemon_threads = True
+        self.server.services = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def env(self):
+        """
+        Environment variables that point every pipeline client at this server.
+
+        Returns:
+            dict[str, str]: Endpoint and dummy credential variables.
+        """
+        return {
+            "OPENAI_API_KEY": "fake-openai-key",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "SERPAPI_API_KEY": "fake-serpapi-key",
+            "SERPAPI_URL": f"{self.base_url}/serpapi/search",
+            "ELEVENLABS_API_KEY": "fake-elevenlabs-key",
+            "ELEVENLABS_BASE_URL": self.base_url,
+            "JAMENDO_CLIENT_ID": "fake-jamendo-id",
+            "JAMENDO_TRACKS_URL": f"{self.base_url}/jamendo/tracks/",
+            "TWEMOJI_BASE": f"{self.base_url}/twemoji/"
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    """
+    Run the fake services in the foreground and print the environment to export.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Local stand-ins for the Card News external APIs")
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean added latency per request (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Uniform +/- jitter on latency (seconds)')
+    parser.add_argument('--failure_rate', type=float, default=0.0, help='Probability that a request returns 429')
+    args = parser.parse_args()
+    services = FakeServices(args.latency, args.jitter, args.failure_rate).start()
+    print(f"[Fake] Serving fake APIs at {services.base_url}. Export:")
+    for key, value in services.env().items():
+        print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == "__main__":
+    main()
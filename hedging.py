@@ -0,0 +1,369 @@
+"""
+hedging.py: Per-stage deadline budgets and hedged requests for tail-latency control of OpenAI and ElevenLabs calls.
+
+- deadline(seconds) sets a budget for a block (e.g. one pipeline stage); calls inside it get a timeout of at most
+  the remaining budget and raise DeadlineExceeded once it is spent.
+- hedged_call(key, attempt) runs attempt(timeout, cancelled); if it is slower than the rolling P95 latency for key,
+  a duplicate is sent and whichever finishes first wins. The loser's cancelled event is set so streaming attempts
+  stop reading and clean up; non-streaming attempts finish in the background and their result is dropped.
+- hedged_call_async(key, attempt) is the asyncio counterpart for coroutine attempts; losers are cancelled outright.
+
+Deadlines are context variables, so each thread and each asyncio task (e.g. one job of run_pipeline_async) has its own.
+
+Hedging is off by default (HEDGE_ENABLED=1 or run_pipeline --hedge turns it on), since each hedge costs an extra request.
+"""
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tracing import current_span, activate
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+# Hedge only once this many latencies have been observed for a call key
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "5"))
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+# Per-attempt timeouts in seconds, used when no stage deadline is tighter
+CALL_TIMEOUTS = {
+    "openai.chat": float(os.getenv("OPENAI_CALL_TIMEOUT", "60")),
+    "elevenlabs.tts": float(os.getenv("ELEVENLABS_CALL_TIMEOUT", "120")),
+    # Whole-deck convert_with_timestamps calls; tracked separately so their latency does not skew per-card hedging
+    "elevenlabs.tts_timestamps": float(os.getenv("ELEVENLABS_TIMESTAMPS_CALL_TIMEOUT", "300")),
+}
+
+_deadline = contextvars.ContextVar("card_news_deadline", default=None)
+_executor = None
+_executor_lock = threading.Lock()
+_trackers = {}
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call starts, or is still running, after its stage's deadline budget is spent."""
+
+
+def set_hedging(enabled):
+    """
+    Turn hedging on or off for this process.
+
+    Args:
+        enabled (bool): Whether slow calls should be hedged.
+    Returns:
+        None.
+    """
+    global HEDGE_ENABLED
+    HEDGE_ENABLED = bool(enabled)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Apply a deadline budget to the enclosed block (nested deadlines keep the earliest).
+
+    Args:
+        seconds (float or None): Budget in seconds (None for no deadline).
+    Yields:
+        float or None: Absolute monotonic deadline in effect.
+    """
+    previous = _deadline.get()
+    current = previous
+    if seconds is not None:
+        candidate = time.monotonic() + seconds
+        current = candidate if previous is None else min(previous, candidate)
+    token = _deadline.set(current)
+    try:
+        yield current
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """
+    Seconds left in the current deadline budget.
+
+    Returns:
+        float or None: Remaining seconds, or None if no deadline is set.
+    """
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+def call_timeout(default=None):
+    """
+    Timeout for the next call: the smaller of default and the remaining deadline budget.
+
+    Args:
+        default (float or None): Per-call timeout when no deadline is tighter.
+    Returns:
+        float or None: Timeout in seconds.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Stage deadline exceeded before the call started.")
+    return left if default is None else min(default, left)
+
+
+def parse_stage_deadlines(spec):
+    """
+    Parse a stage deadline spec such as 'summarize=60,audio=120'.
+
+    Args:
+        spec (str or None): Comma-separated stage=seconds pairs.
+    Returns:
+        dict[str, float]: Stage name to budget in seconds.
+    """
+    deadlines = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            stage, seconds = item.split("=", 1)
+            deadlines[stage.strip()] = float(seconds)
+    return deadlines
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent call latencies for one call key.
+    """
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def quantile(self, q):
+        """
+        Latency quantile over the window.
+
+        Args:
+            q (float): Quantile in [0, 1].
+        Returns:
+            float or None: Latency in seconds, or None with fewer than HEDGE_MIN_SAMPLES samples.
+        """
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def get_tracker(key):
+    with _stats_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = LatencyTracker()
+        return tracker
+
+
+def _count(key, name, amount=1):
+    with _stats_lock:
+        stats = _stats.setdefault(key, {"calls": 0, "hedges_fired": 0, "hedges_won": 0, "deadline_exceeded": 0})
+        stats[name] += amount
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+        return _executor
+
+
+def hedged_call(key, attempt, default_timeout=None, hedge=None):
+    """
+    Run attempt under the current deadline, hedging it with a duplicate if it is slower than the rolling P95.
+
+    Args:
+        key (str): Call key for latency tracking and counters (e.g. 'openai.chat', 'elevenlabs.tts').
+        attempt (callable): attempt(timeout, cancelled) performing one idempotent call; cancelled is a
+            threading.Event set when the attempt lost and should stop early.
+        default_timeout (float or None): Per-attempt timeout when no deadline is tighter.
+        hedge (bool or None): Override HEDGE_ENABLED for this call.
+    Returns:
+        Any: The first successful attempt's result.
+    """
+    _count(key, "calls")
+    try:
+        timeout = call_timeout(default_timeout)
+    except DeadlineExceeded:
+        _count(key, "deadline_exceeded")
+        raise
+    tracker = get_tracker(key)
+    hedge_delay = tracker.quantile(HEDGE_QUANTILE) if (HEDGE_ENABLED if hedge is None else hedge) else None
+    span = current_span()
+    if hedge_delay is None and remaining() is None:
+        # No hedging and no deadline to enforce: call inline
+        start = time.monotonic()
+        result = attempt(timeout, threading.Event())
+        tracker.record(time.monotonic() - start)
+        return result
+
+    deadline_at = _deadline.get()
+
+    def run(cancelled, attempt_timeout):
+        # Worker threads do not inherit the caller's deadline or span
+        token = _deadline.set(deadline_at)
+        start = time.monotonic()
+        try:
+            with activate(span):
+                result = attempt(attempt_timeout, cancelled)
+        finally:
+            _deadline.reset(token)
+        return result, time.monotonic() - start
+
+    executor = _get_executor()
+    events = [threading.Event()]
+    attempts = [executor.submit(run, events[0], timeout)]
+    pending = set(attempts)
+    hedged = False
+    first_error = None
+    while pending:
+        left = remaining()
+        wait_for = left
+        if not hedged and hedge_delay is not None:
+            wait_for = hedge_delay if left is None else min(hedge_delay, left)
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result, seconds = future.result()
+            except Exception as e:
+                first_error = first_error or e
+                continue
+            tracker.record(seconds)
+            winner = attempts.index(future)
+            for idx, event in enumerate(events):
+                if idx != winner:
+                    event.set()
+            if winner > 0:
+                _count(key, "hedges_won")
+                span.set(hedge_won=True)
+            return result
+        if done:
+            # Every finished attempt failed; keep waiting on the rest
+            continue
+        if remaining() is not None and remaining() <= 0:
+            for event in events:
+                event.set()
+            _count(key, "deadline_exceeded")
+            raise DeadlineExceeded(f"{key} did not finish within the stage deadline.")
+        if not hedged and hedge_delay is not None:
+            hedged = True
+            _count(key, "hedges_fired")
+            span.set(hedged=True, hedge_delay_ms=round(hedge_delay * 1000, 1))
+            events.append(threading.Event())
+            future = executor.submit(run, events[-1], call_timeout(default_timeout))
+            attempts.append(future)
+            pending.add(future)
+    raise first_error
+
+
+async def hedged_call_async(key, attempt, default_timeout=None, hedge=None):
+    """
+    Asyncio counterpart of hedged_call: attempts are tasks in the caller's event loop, the losing attempt is
+    cancelled, and a spent deadline cancels every attempt.
+
+    Args:
+        key (str): Call key for latency tracking and counters (e.g. 'openai.chat', 'elevenlabs.tts').
+        attempt (callable): async attempt(timeout) performing one idempotent call.
+        default_timeout (float or None): Per-attempt timeout when no deadline is tighter.
+        hedge (bool or None): Override HEDGE_ENABLED for this call.
+    Returns:
+        Any: The first successful attempt's result.
+    """
+    import asyncio
+    _count(key, "calls")
+    try:
+        timeout = call_timeout(default_timeout)
+    except DeadlineExceeded:
+        _count(key, "deadline_exceeded")
+        raise
+    tracker = get_tracker(key)
+    hedge_delay = tracker.quantile(HEDGE_QUANTILE) if (HEDGE_ENABLED if hedge is None else hedge) else None
+    span = current_span()
+
+    async def run(attempt_timeout):
+        start = time.monotonic()
+        result = await attempt(attempt_timeout)
+        return result, time.monotonic() - start
+
+    # Tasks copy the caller's context, so each attempt sees the current deadline and span
+    attempts = [asyncio.ensure_future(run(timeout))]
+    pending = set(attempts)
+    hedged = False
+    first_error = None
+    try:
+        while pending:
+            left = remaining()
+            wait_for = left
+            if not hedged and hedge_delay is not None:
+                wait_for = hedge_delay if left is None else min(hedge_delay, left)
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    first_error = first_error or e
+                    continue
+                tracker.record(seconds)
+                if attempts.index(future) > 0:
+                    _count(key, "hedges_won")
+                    span.set(hedge_won=True)
+                return result
+            if done:
+                continue
+            if remaining() is not None and remaining() <= 0:
+                _count(key, "deadline_exceeded")
+                raise DeadlineExceeded(f"{key} did not finish within the stage deadline.")
+            if not hedged and hedge_delay is not None:
+                hedged = True
+                _count(key, "hedges_fired")
+                span.set(hedged=True, hedge_delay_ms=round(hedge_delay * 1000, 1))
+                future = asyncio.ensure_future(run(call_timeout(default_timeout)))
+                attempts.append(future)
+                pending.add(future)
+    finally:
+        # Losing, timed-out or abandoned (caller cancelled) attempts stop here
+        for future in attempts:
+            future.cancel()
+    raise first_error
+
+
+def get_stats():
+    """
+    Hedge and deadline counters per call key, with the current P95 latency.
+
+    Returns:
+        dict[str, dict]: calls, hedges_fired, hedges_won, deadline_exceeded, p95_s.
+    """
+    with _stats_lock:
+        stats = {key: dict(value) for key, value in _stats.items()}
+        trackers = dict(_trackers)
+    for key, value in stats.items():
+        tracker = trackers.get(key)
+        value["p95_s"] = tracker.quantile(0.95) if tracker else None
+    return stats
+
+
+def print_stats(file=None):
+    """
+    Print hedge and deadline counters for every call key that hedged or hit a deadline.
+
+    Args:
+        file: Output stream (defaults to stdout).
+    Returns:
+        None.
+    """
+    out = file or sys.stdout
+    for key, stats in get_stats().items():
+        if stats["hedges_fired"] or stats["deadline_exceeded"]:
+            print(f"[Hedge] {key}: {stats['calls']} calls, {stats['hedges_fired']} hedges fired, {stats['hedges_won']} won, "
+                  f"{stats['deadline_exceeded']} deadline exceeded", file=out)
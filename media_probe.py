@@ -0,0 +1,252 @@
+"""
+media_probe.py: Header-based MP3 and PNG probing for planning video timing and picking background music,
+without starting a decoder (no ffmpeg reader subprocess, no pixel decode).
+
+- MP3: duration, sample rate, channels and bitrate. Files with a Xing/Info or VBRI header are timed from its
+  frame count; other files are timed by walking the frame headers (exact, also for VBR without a header),
+  or, above MP3_SCAN_BYTES, estimated from the first frame's bitrate and the file size.
+- PNG: width, height, bit depth and color type from the IHDR chunk.
+
+Results are cached per (path, size, mtime), so a file rewritten in place is probed again.
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+# MP3 files up to this size without a Xing/VBRI header have every frame header walked for an exact duration
+MP3_SCAN_BYTES = int(os.getenv("MP3_SCAN_BYTES", str(4 * 1024 * 1024)))
+PROBE_CACHE_SIZE = int(os.getenv("PROBE_CACHE_SIZE", "1024"))
+
+# MPEG audio Layer III header tables, indexed by the header's version bits
+MP3_BITRATES_KBPS = {
+    "1": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    "2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def id3v2_size(data):
+    """
+    Length of a leading ID3v2 tag (header, body and optional footer).
+
+    Args:
+        data (bytes): Start of the file (at least 10 bytes).
+    Returns:
+        int: Bytes to skip (0 without a tag).
+    """
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+def parse_frame_header(data, pos):
+    """
+    Decode the MPEG audio Layer III frame header at pos.
+
+    Args:
+        data (bytes): MP3 data.
+        pos (int): Offset of a candidate header.
+    Returns:
+        dict or None: 'length', 'samples', 'sample_rate', 'bitrate' and 'channels', or None if there is no valid header.
+    """
+    if pos + 4 > len(data):
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = (b1 >> 3) & 3
+    if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or ((b1 >> 1) & 3) != 1:
+        return None
+    # Bitrate index 15 and sample rate index 3 are reserved (invalid), index 0 is 'free format'
+    bitrate_idx = b2 >> 4
+    rate_idx = (b2 >> 2) & 3
+    if bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    bitrate = MP3_BITRATES_KBPS["1" if version == 3 else "2"][bitrate_idx] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_idx]
+    samples = 1152 if version == 3 else 576
+    return {
+        "length": samples // 8 * bitrate // sample_rate + ((b2 >> 1) & 1),
+        "samples": samples,
+        "sample_rate": sample_rate,
+        "bitrate": bitrate,
+        "channels": 1 if (b3 >> 6) == 3 else 2,
+    }
+
+
+def iter_mp3_frames(data):
+    """
+    Walk the Layer III frames of an MP3 byte string (skipping a leading ID3v2 tag and any Xing/Info header frame).
+
+    Args:
+        data (bytes): MP3 file contents.
+    Yields:
+        tuple: (offset, length, seconds) for each audio frame.
+    """
+    pos = id3v2_size(data)
+    first = True
+    while pos + 4 <= len(data):
+        header = parse_frame_header(data, pos)
+        if header is None:
+            pos += 1
+            continue
+        length = header["length"]
+        frame = data[pos:pos + length]
+        if first and (b"Xing" in frame[:64] or b"Info" in frame[:64]):
+            # VBR/LAME header frame: carries whole-file frame counts, so it must not end up in a segment
+            first = False
+            pos += length
+            continue
+        first = False
+        yield pos, length, header["samples"] / header["sample_rate"]
+        pos += length
+
+
+def read_vbr_frame_count(frame):
+    """
+    Total frame count from a Xing/Info or VBRI header frame.
+
+    Args:
+        frame (bytes): The first audio frame.
+    Returns:
+        int or None: Number of audio frames, or None if the frame carries no count.
+    """
+    for tag in (b"Xing", b"Info"):
+        idx = frame.find(tag, 0, 64)
+        if idx >= 0 and len(frame) >= idx + 12:
+            (flags,) = struct.unpack_from(">I", frame, idx + 4)
+            return struct.unpack_from(">I", frame, idx + 8)[0] if flags & 1 else None
+    # VBRI headers sit 32 bytes after the frame header
+    if frame[36:40] == b"VBRI" and len(frame) >= 54:
+        return struct.unpack_from(">I", frame, 50)[0]
+    return None
+
+
+def _probe_mp3(path, size):
+    with open(path, "rb") as f:
+        head = f.read(10)
+        skip = id3v2_size(head)
+        f.seek(skip)
+        # The first frame is within a few KB of the tag, unless the file starts with junk
+        data = f.read(64 * 1024)
+        pos = 0
+        while pos < len(data) and parse_frame_header(data, pos) is None:
+            pos += 1
+        header = parse_frame_header(data, pos)
+        if header is None:
+            raise ValueError(f"{path}: no MPEG audio frame found.")
+        info = {"type": "mp3", "sample_rate": header["sample_rate"], "channels": header["channels"],
+                "bitrate": header["bitrate"]}
+        vbr_frames = read_vbr_frame_count(data[pos:pos + header["length"]])
+        if vbr_frames is not None:
+            info.update(duration=vbr_frames * header["samples"] / header["sample_rate"], frames=vbr_frames, method="vbr_header")
+        elif size <= MP3_SCAN_BYTES:
+            f.seek(0)
+            frames = 0
+            seconds = 0.0
+            for _, _, frame_seconds in iter_mp3_frames(f.read()):
+                frames += 1
+                seconds += frame_seconds
+            info.update(duration=seconds, frames=frames, method="frame_scan")
+        else:
+            # A trailing ID3v1 tag is not audio
+            f.seek(-128, os.SEEK_END)
+            audio_bytes = size - skip - pos - (128 if f.read(3) == b"TAG" else 0)
+            info.update(duration=audio_bytes * 8 / header["bitrate"], method="bitrate_estimate")
+    info["duration"] = round(info["duration"], 4)
+    return info
+
+
+def _probe_png(path):
+    with open(path, "rb") as f:
+        head = f.read(33)
+    if head[:8] != PNG_SIGNATURE or head[12:16] != b"IHDR":
+        raise ValueError(f"{path}: not a PNG file.")
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", head[16:26])
+    return {"type": "png", "width": width, "height": height, "bit_depth": bit_depth, "color_type": color_type}
+
+
+def probe(path):
+    """
+    Read an MP3's or PNG's metadata from its headers, using the cache when the file is unchanged.
+    Raises OSError if the file cannot be read and ValueError if it is not an MP3 or PNG or its headers are malformed.
+
+    Args:
+        path (str): MP3 or PNG file.
+    Returns:
+        dict: 'type' ('mp3' or 'png') and, for MP3, 'duration' (seconds), 'sample_rate', 'channels', 'bitrate'
+        and 'method'; for PNG, 'width', 'height', 'bit_depth' and 'color_type'.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _cache_lock:
+        info = _cache.get(key)
+        if info is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return dict(info)
+        _stats["misses"] += 1
+    with open(path, "rb") as f:
+        magic = f.read(8)
+    try:
+        info = _probe_png(path) if magic == PNG_SIGNATURE else _probe_mp3(path, st.st_size)
+    except (IndexError, KeyError, struct.error, ZeroDivisionError) as e:
+        # Truncated or corrupt headers: callers treat every unreadable file as ValueError
+        raise ValueError(f"{path}: malformed header ({e!r}).") from e
+    with _cache_lock:
+        _cache[key] = info
+        while len(_cache) > PROBE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return dict(info)
+
+
+def get_duration(path):
+    """
+    Duration of an MP3 from its headers.
+
+    Args:
+        path (str): MP3 file.
+    Returns:
+        float or None: Seconds, or None if the file is missing or not a readable MP3.
+    """
+    try:
+        return probe(path).get("duration")
+    except (OSError, ValueError):
+        return None
+
+
+def get_dimensions(path):
+    """
+    Width and height of a PNG from its IHDR chunk.
+
+    Args:
+        path (str): PNG file.
+    Returns:
+        tuple[int, int] or None: (width, height), or None if the file is missing or not a PNG.
+    """
+    try:
+        info = probe(path)
+    except (OSError, ValueError):
+        return None
+    return (info["width"], info["height"]) if info["type"] == "png" else None
+
+
+def get_stats():
+    """
+    Probe cache counters.
+
+    Returns:
+        dict: hits, misses and entries.
+    """
+    with _cache_lock:
+        return dict(_stats, entries=len(_cache))
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
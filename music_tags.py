@@ -0,0 +1,225 @@
+"""
+music_tags.py: Local, weighted lexicon classifier that picks Jamendo genre and mood tags for a card news script.
+
+Text is split into lowercase word tokens (so 'ai' matches the word 'AI' or '#AI' but not 'said'), and each
+token, adjacent word pair and naive singular form is looked up in LEXICON, which maps terms to weighted tags.
+Repeated terms count with diminishing weight. The best one or two genres and moods are returned with their
+scores; when the top candidates are too close to call, an LLM can optionally break the tie (MUSIC_TAGS_LLM=1).
+"""
+import os
+import re
+import math
+
+# Popular Jamendo tags that are known to work
+POPULAR_GENRE_TAGS = [
+    "pop", "rock", "electronic", "jazz", "classical", "metal",
+    "hiphop", "folk", "blues", "reggae", "funk", "country",
+    "soundtrack", "world", "ambient", "lounge"
+]
+
+POPULAR_MOOD_TAGS = [
+    "happy", "energetic", "calm", "upbeat", "chill", "romantic",
+    "dark", "uplifting", "peaceful", "dramatic", "party"
+]
+
+DEFAULT_TAGS = ["pop", "happy"]
+# Let the LLM choose between close candidates (costs one OpenAI round trip)
+MUSIC_TAGS_LLM = os.getenv("MUSIC_TAGS_LLM", "0") == "1"
+# A runner-up is kept when it scores at least this fraction of the winner
+RUNNER_UP_RATIO = 0.6
+# The pick is ambiguous when a tag left out scores at least this fraction of the last tag kept
+AMBIGUOUS_RATIO = 0.9
+
+# Theme -> (terms, tag weights); flattened into LEXICON below
+THEMES = {
+    "kids": (["kid", "kids", "child", "children", "playful", "funny", "cartoon", "toy", "family", "animation", "animated"],
+             {"pop": 2, "happy": 2}),
+    "tech": (["tech", "technology", "ai", "artificial intelligence", "robot", "robotics", "future", "futuristic", "startup",
+              "software", "app", "digital", "computer", "chip", "chipmaker", "data", "algorithm", "innovation", "gadget",
+              "smartphone", "cyber", "crypto", "blockchain", "machine learning", "model", "code"],
+             {"electronic": 2, "upbeat": 1}),
+    "space": (["space", "rocket", "lunar", "moon", "mars", "orbit", "galaxy", "planet", "astronaut", "satellite"],
+              {"ambient": 2, "electronic": 1, "uplifting": 1}),
+    "news": (["news", "update", "trend", "trending", "today", "report", "announce", "announces", "breaking"],
+             {"pop": 1, "upbeat": 1}),
+    "happy": (["happy", "joy", "smile", "celebrate", "celebration", "win", "winner", "victory", "success", "fun"],
+              {"happy": 2, "upbeat": 1, "pop": 1}),
+    "calm": (["calm", "relax", "relaxing", "meditation", "peaceful", "nature", "sleep", "wellness", "yoga", "ocean",
+              "forest", "mindful", "mindfulness"],
+             {"calm": 2, "peaceful": 1, "ambient": 2}),
+    "party": (["party", "dance", "club", "energetic", "festival", "concert", "dj", "nightlife"],
+              {"party": 2, "energetic": 2, "electronic": 1, "pop": 1}),
+    "romance": (["romantic", "romance", "love", "dating", "wedding", "couple", "valentine"],
+                {"romantic": 2, "pop": 1}),
+    "sports": (["sport", "sports", "game", "match", "championship", "football", "soccer", "basketball", "baseball",
+                "olympics", "athlete", "tournament", "league"],
+               {"rock": 2, "energetic": 2}),
+    "drama": (["crime", "war", "crisis", "disaster", "tragedy", "death", "scandal", "investigation", "mystery",
+               "storm", "earthquake", "attack"],
+              {"soundtrack": 2, "dramatic": 2, "dark": 1}),
+    "film": (["movie", "film", "netflix", "series", "trailer", "cinema", "drama", "episode", "streaming"],
+             {"soundtrack": 2, "dramatic": 1}),
+    "business": (["business", "market", "economy", "finance", "stock", "company", "corporate", "investment",
+                  "investor", "funding", "revenue", "quarter"],
+                 {"lounge": 1, "electronic": 1, "upbeat": 1}),
+    "world": (["travel", "culture", "world", "global", "international", "tradition", "heritage"],
+              {"world": 2, "uplifting": 1}),
+    "inspiring": (["inspiring", "inspiration", "hope", "dream", "achievement", "breakthrough", "discover", "discovery",
+                   "record"],
+                  {"uplifting": 2}),
+    "food": (["food", "recipe", "cooking", "bakery", "coffee", "cafe", "restaurant", "chef", "croissant"],
+             {"lounge": 2, "chill": 2, "happy": 1}),
+    "kpop": (["kpop", "k pop", "idol", "idols"],
+             {"pop": 3, "energetic": 2}),
+    "hiphop": (["hiphop", "hip hop", "rap", "rapper"],
+               {"hiphop": 3, "energetic": 1}),
+}
+
+LEXICON = {}
+for _terms, _weights in THEMES.values():
+    for _term in _terms:
+        _entry = LEXICON.setdefault(_term, {})
+        for _tag, _weight in _weights.items():
+            _entry[_tag] = _entry.get(_tag, 0) + _weight
+# Naming a genre outright is the strongest signal
+for _tag in POPULAR_GENRE_TAGS:
+    _entry = LEXICON.setdefault(_tag, {})
+    _entry[_tag] = _entry.get(_tag, 0) + 3
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens (punctuation, hashtags and hyphens separate words).
+
+    Args:
+        text (str): Script or topic text.
+    Returns:
+        list[str]: Tokens in order.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def score_tags(text):
+    """
+    Score every tag for a text.
+
+    Args:
+        text (str): Script or topic text.
+    Returns:
+        dict[str, float]: Tag to score (only tags with a positive score).
+    """
+    tokens = tokenize(text)
+    counts = {}
+    for idx, token in enumerate(tokens):
+        term = token if token in LEXICON else (token[:-1] if len(token) > 3 and token.endswith("s") and token[:-1] in LEXICON else None)
+        if term:
+            counts[term] = counts.get(term, 0) + 1
+        if idx + 1 < len(tokens):
+            pair = f"{token} {tokens[idx + 1]}"
+            if pair in LEXICON:
+                counts[pair] = counts.get(pair, 0) + 1
+    scores = {}
+    for term, count in counts.items():
+        # A term repeated across every card should not drown out everything else
+        damping = 1 + math.log(count)
+        for tag, weight in LEXICON[term].items():
+            scores[tag] = scores.get(tag, 0) + weight * damping
+    return scores
+
+
+def _top(ranked):
+    """
+    Pick the winner and, if it scores close enough, the runner-up.
+
+    Args:
+        ranked (list[tuple[str, float]]): (tag, score) pairs, best first.
+    Returns:
+        tuple[list[str], bool]: Chosen tags, and whether the first tag left out nearly tied the last one chosen.
+    """
+    if not ranked:
+        return [], True
+    chosen = [tag for tag, score in ranked[:2] if score >= ranked[0][1] * RUNNER_UP_RATIO]
+    left_out = ranked[len(chosen)][1] if len(ranked) > len(chosen) else 0
+    return chosen, left_out >= ranked[len(chosen) - 1][1] * AMBIGUOUS_RATIO
+
+
+def classify(text):
+    """
+    Rank genre and mood tags for a text.
+
+    Args:
+        text (str): Script or topic text.
+    Returns:
+        dict: 'tags' (1-2 genres then 1-2 moods, defaulting to DEFAULT_TAGS), 'genres' and 'moods'
+        (ranked (tag, score) pairs) and 'ambiguous' (True when there was no signal, or a genre or mood that was
+        left out nearly ties the last one chosen).
+    """
+    scores = score_tags(text)
+    genres = sorted(((t, round(s, 3)) for t, s in scores.items() if t in POPULAR_GENRE_TAGS), key=lambda item: (-item[1], item[0]))
+    moods = sorted(((t, round(s, 3)) for t, s in scores.items() if t in POPULAR_MOOD_TAGS), key=lambda item: (-item[1], item[0]))
+    top_genres, genres_tied = _top(genres)
+    top_moods, moods_tied = _top(moods)
+    tags = (top_genres or DEFAULT_TAGS[:1]) + (top_moods or DEFAULT_TAGS[1:])
+    ambiguous = genres_tied or moods_tied
+    return {"tags": tags, "genres": genres, "moods": moods, "ambiguous": ambiguous}
+
+
+def suggest_tags(text, use_llm=None):
+    """
+    Suggest Jamendo tags for a text with the local classifier, asking the LLM only to break close calls.
+
+    Args:
+        text (str): Script or topic text.
+        use_llm (bool or None): Let the LLM choose among the top candidates when the classifier is unsure
+            (defaults to MUSIC_TAGS_LLM).
+    Returns:
+        list[str]: 2-4 tags from POPULAR_GENRE_TAGS and POPULAR_MOOD_TAGS.
+    """
+    result = classify(text)
+    if result["ambiguous"] and (MUSIC_TAGS_LLM if use_llm is None else use_llm) and text.strip():
+        candidates = [tag for tag, _ in result["genres"][:3]] + [tag for tag, _ in result["moods"][:3]]
+        chosen = llm_choose_tags(text, candidates or POPULAR_GENRE_TAGS + POPULAR_MOOD_TAGS)
+        if chosen:
+            return chosen
+    return result["tags"]
+
+
+def llm_choose_tags(text, candidates):
+    """
+    Ask OpenAI to pick 1-2 genre and 1-2 mood tags from a candidate list.
+
+    Args:
+        text (str): Script text.
+        candidates (list[str]): Tags the answer must come from.
+    Returns:
+        list[str]: Chosen tags (empty if the call or parsing failed).
+    """
+    import ast
+    from api_clients import get_openai_client
+    from article_search import chat_completion
+    genre_list = ', '.join(t for t in candidates if t in POPULAR_GENRE_TAGS) or ', '.join(POPULAR_GENRE_TAGS)
+    mood_list = ', '.join(t for t in candidates if t in POPULAR_MOOD_TAGS) or ', '.join(POPULAR_MOOD_TAGS)
+    prompt = (
+        f"Given the following YouTube Shorts card news script, select the 1-2 most relevant music genre tags and 1-2 most relevant mood tags from the provided lists. "
+        f"Only choose tags from these lists. Return your answer as a Python list of strings, e.g. ['pop', 'happy', 'energetic'].\n\n"
+        f"Script: {text}\n\n"
+        f"Genre tags: {genre_list}\nMood tags: {mood_list}\n"
+        f"Your answer:"
+    )
+    try:
+        response = chat_completion(
+            get_openai_client(),
+            "music_tags",
+            model="gpt-4-0125-preview",
+            messages=[{"role": "system", "content": "You are a helpful assistant that selects music tags for background music. Only use the provided genre and mood tag lists."},
+                      {"role": "user", "content": prompt}],
+            max_tokens=60,
+            temperature=0.2
+        )
+        tags = ast.literal_eval(response.choices[0].message.content.strip())
+        return [t for t in tags if t in POPULAR_GENRE_TAGS or t in POPULAR_MOOD_TAGS]
+    except Exception as e:
+        print(f"[Agent] Could not get LLM music tags: {e}")
+        return []
@@ -0,0 +1,398 @@
+"""
+rate_limiter.py: Shared per-provider rate limiting for OpenAI and ElevenLabs calls.
+
+Each provider gets one AdaptiveRateLimiter per process, combining:
+- a requests/minute token bucket,
+- a tokens/minute token bucket (OpenAI tokens, ElevenLabs characters),
+- an AIMD concurrency limit that halves on 429s (honoring Retry-After) and grows by ~1 per window of successes.
+
+Limits come from environment variables (e.g. OPENAI_RPM, OPENAI_TPM, OPENAI_MAX_CONCURRENCY); 0 disables a bucket.
+Threads use call(); coroutines use acall(), which waits on the event loop instead of blocking it. Both share
+the same limiter, so sync and async callers in one process are limited together.
+"""
+import os
+import sys
+import time
+import random
+import threading
+from collections import deque
+
+from tracing import current_span
+
+# Defaults per provider: requests/minute, tokens/minute, initial and max concurrency
+PROVIDER_DEFAULTS = {
+    "openai": {"rpm": 500, "tpm": 30000, "concurrency": 4, "max_concurrency": 16},
+    "elevenlabs": {"rpm": 120, "tpm": 0, "concurrency": 2, "max_concurrency": 5},
+}
+
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+# How often a waiting coroutine re-checks for a free concurrency slot (threads are woken directly)
+ASYNC_POLL_INTERVAL = float(os.getenv("RATE_LIMIT_ASYNC_POLL", "0.02"))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most one minute of tokens.
+    Reservations may overdraw the bucket; the caller then waits until the debt is repaid.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """
+        Take amount tokens, returning how long the caller must wait before using them.
+
+        Args:
+            amount (float): Tokens to take.
+        Returns:
+            float: Seconds to wait (0 if tokens were available).
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount):
+        """
+        Return over-reserved tokens (e.g. when actual usage was below the estimate).
+
+        Args:
+            amount (float): Tokens to return (negative to charge extra).
+        Returns:
+            None.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def is_rate_limit_error(exc):
+    """
+    Check whether an exception from OpenAI, ElevenLabs or requests represents HTTP 429.
+
+    Args:
+        exc (Exception): Exception raised by an API call.
+    Returns:
+        bool: True for rate-limit errors.
+    """
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def get_retry_after(exc):
+    """
+    Extract the Retry-After delay from a rate-limit exception, if the server sent one.
+
+    Args:
+        exc (Exception): Exception raised by an API call.
+    Returns:
+        float or None: Seconds to wait.
+    """
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Shared limiter for one provider.
+
+    Args:
+        name (str): Provider name (used in logs and stats).
+        rpm (int): Requests per minute (0 for unlimited).
+        tpm (int): Tokens per minute (0 for unlimited).
+        concurrency (int): Initial concurrency limit.
+        max_concurrency (int): Upper bound for the concurrency limit.
+    """
+
+    def __init__(self, name, rpm=0, tpm=0, concurrency=4, max_concurrency=16):
+        self.name = name
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.limit = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.cond = threading.Condition()
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "queue_wait_s": 0.0, "max_queue_wait_s": 0.0}
+        self.recent_waits = deque(maxlen=1024)
+
+    def acquire(self, tokens=0):
+        """
+        Block until a concurrency slot and bucket capacity are available.
+
+        Args:
+            tokens (float): Estimated tokens for this request.
+        Returns:
+            float: Seconds spent waiting.
+        """
+        start = time.monotonic()
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    self.cond.wait(self.blocked_until - now)
+                elif self.in_flight >= max(1, int(self.limit)):
+                    self.cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return self._record_wait(time.monotonic() - start)
+
+    async def acquire_async(self, tokens=0):
+        """
+        Asyncio counterpart of acquire: waits for a slot and bucket capacity without blocking the event loop.
+
+        Args:
+            tokens (float): Estimated tokens for this request.
+        Returns:
+            float: Seconds spent waiting.
+        """
+        import asyncio
+        start = time.monotonic()
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.in_flight >= max(1, int(self.limit)):
+                    delay = ASYNC_POLL_INTERVAL
+                else:
+                    self.in_flight += 1
+                    break
+            await asyncio.sleep(delay)
+        try:
+            wait = self._reserve(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+        except BaseException:
+            # Cancelled while waiting for bucket capacity: give the slot back
+            self.release()
+            raise
+        return self._record_wait(time.monotonic() - start)
+
+    def _reserve(self, tokens):
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket and tokens:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        return wait
+
+    def _record_wait(self, waited):
+        with self.cond:
+            self.stats["requests"] += 1
+            self.stats["queue_wait_s"] += waited
+            self.stats["max_queue_wait_s"] = max(self.stats["max_queue_wait_s"], waited)
+            self.recent_waits.append(waited)
+        return waited
+
+    def release(self, throttled=False, retry_after=None):
+        """
+        Release a slot and adapt the concurrency limit (additive increase, multiplicative decrease).
+
+        Args:
+            throttled (bool): Whether the request hit a 429.
+            retry_after (float or None): Server-requested delay in seconds.
+        Returns:
+            None.
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.stats["throttled"] += 1
+                self.limit = max(1.0, self.limit / 2)
+                delay = retry_after if retry_after is not None else 1.0 + random.random()
+                self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def refund_tokens(self, amount):
+        """
+        Correct the tokens/minute bucket once actual usage is known.
+
+        Args:
+            amount (float): Estimated minus actual tokens.
+        Returns:
+            None.
+        """
+        if self.token_bucket and amount:
+            self.token_bucket.refund(amount)
+
+    def call(self, func, *args, tokens=0, max_retries=None, **kwargs):
+        """
+        Run func under the limiter, retrying on 429 after backing off.
+
+        Args:
+            func (callable): The API call.
+            *args, **kwargs: Arguments for func.
+            tokens (float): Estimated tokens for this request.
+            max_retries (int or None): Retries on 429 (defaults to MAX_RETRIES).
+        Returns:
+            Any: func's return value.
+        """
+        max_retries = MAX_RETRIES if max_retries is None else max_retries
+        s = current_span()
+        attempt = 0
+        while True:
+            waited = self.acquire(tokens)
+            s.add("queue_wait_ms", round(waited * 1000, 1))
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt, max_retries, s):
+                    raise
+                attempt += 1
+                continue
+            except BaseException:
+                # Interrupted mid-request (e.g. KeyboardInterrupt): free the slot without counting a 429
+                self.release()
+                raise
+            self.release()
+            return result
+
+    async def acall(self, func, *args, tokens=0, max_retries=None, **kwargs):
+        """
+        Asyncio counterpart of call: await func(*args, **kwargs) under the limiter, retrying on 429.
+
+        Args:
+            func (callable): Coroutine function making the API call.
+            *args, **kwargs: Arguments for func.
+            tokens (float): Estimated tokens for this request.
+            max_retries (int or None): Retries on 429 (defaults to MAX_RETRIES).
+        Returns:
+            Any: func's return value.
+        """
+        max_retries = MAX_RETRIES if max_retries is None else max_retries
+        s = current_span()
+        attempt = 0
+        while True:
+            waited = await self.acquire_async(tokens)
+            s.add("queue_wait_ms", round(waited * 1000, 1))
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt, max_retries, s):
+                    raise
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (or timed out) mid-request: free the slot without counting a 429
+                self.release()
+                raise
+            self.release()
+            return result
+
+    def _should_retry(self, exc, attempt, max_retries, s):
+        """
+        Release the slot after a failed request and decide whether to retry it.
+
+        Args:
+            exc (Exception): The error raised by the request.
+            attempt (int): Retries made so far.
+            max_retries (int): Retry limit.
+            s (Span): Span to record retries on.
+        Returns:
+            bool: True to retry (a 429 within the retry limit), False to re-raise.
+        """
+        if not is_rate_limit_error(exc):
+            self.release()
+            return False
+        self.release(throttled=True, retry_after=get_retry_after(exc))
+        if attempt >= max_retries:
+            return False
+        with self.cond:
+            self.stats["retries"] += 1
+        s.set(retries=attempt + 1)
+        print(f"[RateLimit] {self.name} returned 429; retry {attempt + 1}/{max_retries} (concurrency limit {self.limit:.1f}).")
+        return True
+
+    def get_stats(self):
+        """
+        Snapshot of limiter metrics.
+
+        Returns:
+            dict: requests, throttled, retries, queue wait totals/max/p95 and current concurrency limit.
+        """
+        with self.cond:
+            stats = dict(self.stats)
+            waits = sorted(self.recent_waits)
+            stats["concurrency_limit"] = round(self.limit, 2)
+        stats["mean_queue_wait_s"] = stats["queue_wait_s"] / stats["requests"] if stats["requests"] else 0.0
+        stats["p95_queue_wait_s"] = waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+        return stats
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    """
+    Get the process-wide limiter for a provider, creating it from env/default settings on first use.
+
+    Args:
+        provider (str): 'openai' or 'elevenlabs' (other names get unlimited buckets).
+    Returns:
+        AdaptiveRateLimiter: Shared limiter.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            defaults = PROVIDER_DEFAULTS.get(provider, {"rpm": 0, "tpm": 0, "concurrency": 4, "max_concurrency": 16})
+            prefix = provider.upper()
+            limiter = AdaptiveRateLimiter(
+                provider,
+                rpm=int(os.getenv(f"{prefix}_RPM", defaults["rpm"])),
+                tpm=int(os.getenv(f"{prefix}_TPM", defaults["tpm"])),
+                concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", defaults["concurrency"])),
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", defaults["max_concurrency"]))
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def get_all_stats():
+    """
+    Metrics for every limiter created in this process.
+
+    Returns:
+        dict[str, dict]: Provider name to stats.
+    """
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.get_stats() for limiter in limiters}
+
+
+def print_stats(file=None):
+    """
+    Print queue-wait and throttling metrics for every limiter.
+
+    Args:
+        file: Output stream (defaults to stdout).
+    Returns:
+        None.
+    """
+    out = file or sys.stdout
+    for name, stats in get_all_stats().items():
+        print(f"[RateLimit] {name}: {stats['requests']} requests, {stats['throttled']} throttled, {stats['retries']} retries, "
+              f"queue wait mean {stats['mean_queue_wait_s'] * 1000:.1f} ms / p95 {stats['p95_queue_wait_s'] * 1000:.1f} ms / "
+              f"max {stats['max_queue_wait_s'] * 1000:.1f} ms, concurrency limit {stats['concurrency_limit']}", file=out)
@@ -0,0 +1,268 @@
+"""
+resources.py: Per-stage memory, CPU and file-handle accounting for the Card News pipeline, with budgets.
+
+measure(stage) wraps a pipeline stage and records:
+- rss_peak_mb: RSS high-water mark during the stage (Linux resets VmHWM at stage start; elsewhere this is the
+  process high-water mark so far)
+- tracemalloc_peak_mb: peak Python heap growth during the stage (only with tracemalloc on, since it slows
+  allocation-heavy code; RESOURCE_TRACEMALLOC=1 or run_pipeline --tracemalloc)
+- cpu_user_s / cpu_sys_s: CPU time of this process, and cpu_children_s for finished child processes
+  (helper scripts, ffmpeg)
+- open_files: file handles open at the end of the stage, and open_files_delta (leaks show up as growth)
+
+CPU and RSS are process-wide, so stages that run concurrently (e.g. variant fan-out threads) share them.
+Budgets such as 'cards.rss_peak_mb=800,video.cpu_user_s=120,*.open_files=256' are checked when a stage ends;
+an exceeded budget prints a warning or, with action 'abort', raises ResourceBudgetExceeded.
+"""
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+from tracing import current_span
+
+RESOURCE_BUDGETS = os.getenv("RESOURCE_BUDGETS", "")
+RESOURCE_BUDGET_ACTION = os.getenv("RESOURCE_BUDGET_ACTION", "warn")
+RESOURCE_TRACEMALLOC = os.getenv("RESOURCE_TRACEMALLOC", "0") == "1"
+
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+class ResourceBudgetExceeded(RuntimeError):
+    """Raised when a stage exceeds a resource budget and the budget action is 'abort'."""
+
+
+def parse_budgets(spec):
+    """
+    Parse a budget spec such as 'cards.rss_peak_mb=800,*.open_files=256' ('*' applies to every stage).
+
+    Args:
+        spec (str or None): Comma-separated stage.metric=limit entries.
+    Returns:
+        dict[str, dict[str, float]]: Stage name to metric limits.
+    """
+    budgets = {}
+    for item in (spec or "").split(","):
+        if "=" in item and "." in item.split("=", 1)[0]:
+            name, limit = item.split("=", 1)
+            stage, metric = name.strip().split(".", 1)
+            budgets.setdefault(stage, {})[metric] = float(limit)
+    return budgets
+
+
+def set_budgets(spec, action=None):
+    """
+    Set the budgets (and optionally the action) used by later stages.
+
+    Args:
+        spec (str): Budget spec (see parse_budgets).
+        action (str or None): 'warn' or 'abort'.
+    Returns:
+        None.
+    """
+    global RESOURCE_BUDGETS, RESOURCE_BUDGET_ACTION
+    parse_budgets(spec)
+    RESOURCE_BUDGETS = spec
+    if action:
+        RESOURCE_BUDGET_ACTION = action
+
+
+def set_tracemalloc(enabled):
+    """
+    Turn tracemalloc measurement on or off for later stages.
+
+    Args:
+        enabled (bool): Whether measure() should record tracemalloc peaks.
+    Returns:
+        None.
+    """
+    global RESOURCE_TRACEMALLOC
+    RESOURCE_TRACEMALLOC = bool(enabled)
+
+
+def read_status_mb(field):
+    """
+    Read a memory field (e.g. 'VmHWM', 'VmRSS') from /proc/self/status.
+
+    Args:
+        field (str): Field name.
+    Returns:
+        float or None: Value in MB, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_rss_peak():
+    """
+    Reset the kernel's RSS high-water mark for this process (Linux 4.0+).
+
+    Returns:
+        bool: Whether the peak was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def max_rss_mb():
+    """
+    Process RSS high-water mark: VmHWM where available, else ru_maxrss.
+
+    Returns:
+        float: Peak RSS in MB.
+    """
+    hwm = read_status_mb("VmHWM")
+    if hwm is not None:
+        return hwm
+    import resource
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def count_open_files():
+    """
+    Count this process's open file descriptors.
+
+    Returns:
+        int or None: Open descriptors, or None if they cannot be listed on this platform.
+    """
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(fd_dir)) - 1  # listdir's own handle
+        except OSError:
+            continue
+    return None
+
+
+def cpu_times():
+    import resource
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime, own.ru_stime, children.ru_utime + children.ru_stime
+
+
+def check_budgets(stage, metrics, budgets=None, action=None):
+    """
+    Compare a stage's metrics with its budgets (and the '*' budgets).
+
+    Args:
+        stage (str): Stage name.
+        metrics (dict): Metrics from measure().
+        budgets (dict or None): Parsed budgets (defaults to RESOURCE_BUDGETS).
+        action (str or None): 'warn' or 'abort' (defaults to RESOURCE_BUDGET_ACTION).
+    Returns:
+        list[str]: Descriptions of the exceeded budgets.
+    """
+    budgets = parse_budgets(RESOURCE_BUDGETS) if budgets is None else budgets
+    action = action or RESOURCE_BUDGET_ACTION
+    limits = dict(budgets.get("*", {}), **budgets.get(stage, {}))
+    exceeded = []
+    for metric, limit in limits.items():
+        value = metrics.get(metric)
+        if value is not None and value > limit:
+            exceeded.append(f"{metric}={value} exceeds budget {limit:g}")
+    if exceeded:
+        message = f"Stage '{stage}': " + "; ".join(exceeded)
+        if action == "abort":
+            raise ResourceBudgetExceeded(message)
+        print(f"[Resources] WARNING: {message}")
+    return exceeded
+
+
+@contextmanager
+def measure(stage, budgets=None, action=None):
+    """
+    Record resource usage for a stage and check it against the budgets when the stage ends.
+
+    Args:
+        stage (str): Stage name (e.g. 'cards', 'video').
+        budgets (dict or None): Parsed budgets (defaults to RESOURCE_BUDGETS).
+        action (str or None): 'warn' or 'abort' (defaults to RESOURCE_BUDGET_ACTION).
+    Yields:
+        dict: The stage's metrics, filled in when the block exits.
+    """
+    import tracemalloc
+    metrics = {}
+    started_tracemalloc = False
+    if RESOURCE_TRACEMALLOC:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracemalloc = True
+        tracemalloc.reset_peak()
+        heap_start = tracemalloc.get_traced_memory()[0]
+    reset_rss_peak()
+    user_start, sys_start, children_start = cpu_times()
+    files_start = count_open_files()
+    wall_start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        user_end, sys_end, children_end = cpu_times()
+        files_end = count_open_files()
+        metrics.update({
+            "wall_s": round(time.perf_counter() - wall_start, 3),
+            "cpu_user_s": round(user_end - user_start, 3),
+            "cpu_sys_s": round(sys_end - sys_start, 3),
+            "cpu_children_s": round(children_end - children_start, 3),
+            "rss_peak_mb": round(max_rss_mb(), 1),
+            "open_files": files_end,
+            "open_files_delta": files_end - files_start if files_end is not None and files_start is not None else None,
+        })
+        if RESOURCE_TRACEMALLOC:
+            metrics["tracemalloc_peak_mb"] = round((tracemalloc.get_traced_memory()[1] - heap_start) / 1e6, 1)
+            if started_tracemalloc:
+                tracemalloc.stop()
+        for key in [k for k, v in metrics.items() if v is None]:
+            del metrics[key]
+        with _usage_lock:
+            _usage[stage] = metrics
+        current_span().set(**{f"res.{k}": v for k, v in metrics.items()})
+    check_budgets(stage, metrics, budgets, action)
+
+
+def get_usage():
+    """
+    Metrics of every measured stage so far.
+
+    Returns:
+        dict[str, dict]: Stage name to metrics.
+    """
+    with _usage_lock:
+        return {stage: dict(metrics) for stage, metrics in _usage.items()}
+
+
+def clear_usage():
+    with _usage_lock:
+        _usage.clear()
+
+
+def print_usage(file=None):
+    """
+    Print a per-stage resource table.
+
+    Args:
+        file: Output stream (defaults to stdout).
+    Returns:
+        None.
+    """
+    out = file or sys.stdout
+    usage = get_usage()
+    if not usage:
+        return
+    print(f"[Resources] {'stage':<14} {'rss peak MB':>11} {'heap peak MB':>12} {'cpu user s':>10} {'cpu sys s':>9} {'children s':>10} {'files':>6}", file=out)
+    for stage, m in usage.items():
+        heap = m.get("tracemalloc_peak_mb")
+        print(f"[Resources] {stage:<14} {m['rss_peak_mb']:>11.1f} {heap if heap is not None else '-':>12} {m['cpu_user_s']:>10.2f} "
+              f"{m['cpu_sys_s']:>9.2f} {m['cpu_children_s']:>10.2f} {m.get('open_files', '-'):>6}", file=out)
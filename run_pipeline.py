@@ -2,64 +2,490 @@
 Run the full Card News pipeline: article search, summarization, card content, image, audio, video, and music.
 This script links together all modules: article_search, card_image_generator, card_audio_generator, card_video_generator.
 """
+import time
+MODULE_LOADED_AT = time.perf_counter()
 import os
-import subprocess
+import sys
 import json
-from article_search import web_search, summarize_articles, generate_card_news_contents, generate_card_scripts
-from card_image_generator import generate_cards_from_json
-from card_audio_generator import generate_card_audio
-from card_video_generator import create_video_from_cards
+import importlib
+import tracing
+import rate_limiter
+import hedging
+import cassette
+import resources
+from tracing import span, run_subprocess
+
+# Seconds spent importing each lazily loaded module, reported by --startup_profile
+IMPORT_TIMINGS = {}
+
+def timed_import(module_name):
+    """
+    Import a module on first use, recording how long the import took.
+    Pipeline modules and their heavy dependencies (openai, elevenlabs, PIL, moviepy) are loaded this way,
+    so `--help` and partial runs (e.g. `--no_video`) only pay for what they use.
+
+    Args:
+        module_name (str): Dotted module name.
+    Returns:
+        module: The imported module.
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    start = time.perf_counter()
+    with span(f"import.{module_name}", "startup"):
+        module = importlib.import_module(module_name)
+    IMPORT_TIMINGS[module_name] = time.perf_counter() - start
+    return module
+
+def print_startup_profile():
+    """
+    Print import timings recorded by timed_import, slowest first.
+    """
+    total = sum(IMPORT_TIMINGS.values())
+    print(f"[Startup] Lazy imports took {total * 1000:.1f} ms in total:")
+    for name, seconds in sorted(IMPORT_TIMINGS.items(), key=lambda item: item[1], reverse=True):
+        print(f"[Startup]   {name:<24} {seconds * 1000:>8.1f} ms")
 
 def suggest_music_tags_from_scripts(scripts):
     """
-    Suggest music theme tags based on the content of the generated card scripts.
-    Returns a comma-separated string of music tags suitable for the video's mood.
+    Suggest music theme tags based on the content of the generated card scripts (see music_tags.classify).
+    Returns a comma-separated string of music tags suitable for the video's mood, and the ranked tag scores.
     """
-    text = " ".join(scripts).lower()
-    if any(word in text for word in ["kids", "children", "playful", "funny", "cartoon"]):
-        return "children,playful,fun,cheerful"
-    if any(word in text for word in ["tech", "ai", "robot", "future", "startup"]):
-        return "electronic,upbeat,corporate,techno,fun"
-    if any(word in text for word in ["news", "update", "trend", "today"]):
-        return "pop,upbeat,corporate,fun,cheerful"
-    if any(word in text for word in ["happy", "joy", "smile", "celebrate"]):
-        return "happy,cheerful,fun,upbeat,pop"
-    return "fun,upbeat,cheerful,pop"
+    result = timed_import("music_tags").classify(" ".join(scripts))
+    return ",".join(result["tags"]), {"genres": result["genres"], "moods": result["moods"]}
 
-def run_pipeline(keyword, max_results=10, max_summaries=6, num_cards=3, generate_cards=True, generate_audio=True, generate_video=True, auto_music=True):
+def parse_variants(spec):
     """
-    Run the full Card News pipeline: search articles, summarize, generate card content, images, audio, music, and final video.
-    Saves all intermediate and final outputs to disk.
+    Parse a voice/language variant spec such as 'JBFqnCBsd6RMkjVDRZzb:eleven_multilingual_v2:English,XB0fDUnXU5powFXDhCwa::Korean'.
+
+    Args:
+        spec (str): Comma-separated voice_id[:model_id[:language]] entries (an empty model_id uses the default).
+    Returns:
+        list[dict]: Variants with 'voice_id', 'model_id' and 'language' (None keeps the scripts' language).
     """
-    print(f"[Pipeline] Starting pipeline for keyword: '{keyword}'")
-    articles = web_search(keyword, max_results)
-    summaries = summarize_articles(articles, max_summaries)
-    card_contents = generate_card_news_contents(summaries, keyword, num_cards=num_cards)
-    card_scripts = generate_card_scripts(card_contents)
-    music_theme_tags = suggest_music_tags_from_scripts(card_scripts)
-    output = {
-        "keyword": keyword,
-        "articles": articles,
-        "summaries": summaries,
-        "card_contents": card_contents,
-        "card_scripts": card_scripts,
-        "music_theme_tags": music_theme_tags
-    }
-    with open("card_news_output.json", "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
-    print(f"[Pipeline] Results saved to card_news_output.json.")
-    if generate_cards:
-        generate_cards_from_json(json_path="card_news_output.json", output_dir="cards")
+    variants = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        fields = [field.strip() for field in item.split(":")] + ["", ""]
+        variants.append({"voice_id": fields[0], "model_id": fields[1] or "eleven_multilingual_v2", "language": fields[2] or None})
+    return variants
+
+def get_variant_name(variant):
+    """
+    Filesystem-safe name for a variant, used for its audio directory and video filename.
+
+    Args:
+        variant (dict): Variant with 'voice_id', 'language' and optionally 'name'.
+    Returns:
+        str: e.g. 'korean_xb0fdunx'.
+    """
+    import re
+    name = variant.get("name") or f"{variant.get('language') or 'default'}_{variant['voice_id'][:8]}"
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def assign_variant_names(variants):
+    """
+    Give every variant a unique name, so variants that differ only in model_id (or whose voice ids share
+    their first 8 characters) do not write the same audio directory and video file.
+
+    Args:
+        variants (list[dict]): Variants from parse_variants.
+    Returns:
+        list[dict]: Copies of the variants with 'name' set; repeated names get a '_2', '_3', ... suffix.
+    """
+    named = []
+    used = set()
+    for variant in variants:
+        base = name = get_variant_name(variant)
+        suffix = 1
+        while name in used:
+            suffix += 1
+            name = f"{base}_{suffix}"
+        used.add(name)
+        named.append(dict(variant, name=name))
+    return named
+
+def run_variant(variant, card_contents, card_scripts, card_images=None, generate_audio=True, generate_video=True, stage_deadlines=None, single_tts_request=False, formats=None, draft=False, bg_music_path=None):
+    """
+    Narrate and encode one voice/language variant of an already prepared deck (card images and music are shared).
+
+    Args:
+        variant (dict): 'voice_id', 'model_id' and 'language' (see parse_variants).
+        card_contents (list[str]): Card contents, rewritten as scripts when the variant has a language.
+        card_scripts (list[str]): Scripts used as-is when the variant has no language.
+        card_images: Rendered cards from generate_cards_from_json (None to read them from cards/).
+        generate_audio, generate_video (bool): Which stages to run.
+        stage_deadlines (dict or None): Stage name to time budget in seconds.
+        single_tts_request, formats, draft: As for run_pipeline.
+        bg_music_path (str or None): Background music shared by every variant.
+    Returns:
+        dict: The variant with its 'name', 'card_scripts', 'audio_dir' and 'video_file' (or 'video_files').
+    """
+    stage_deadlines = stage_deadlines or {}
+    name = get_variant_name(variant)
+    result = dict(variant, name=name, audio_dir=os.path.join("audio", name))
+    with span(f"variant.{name}", "stage", voice_id=variant["voice_id"], model_id=variant["model_id"], language=variant["language"]):
+        if variant["language"]:
+            with span("stage.card_scripts", "stage", cards=len(card_contents)), hedging.deadline(stage_deadlines.get("card_scripts")):
+                card_scripts = timed_import("article_search").generate_card_scripts(card_contents, language=variant["language"])
+        result["card_scripts"] = card_scripts
+        durations = None
+        if generate_audio:
+            with span("stage.audio", "stage", cards=len(card_scripts)), hedging.deadline(stage_deadlines.get("audio")):
+                audio_gen = timed_import("card_audio_generator")
+                if single_tts_request:
+                    durations = [r["duration"] for r in audio_gen.generate_card_audio_single_request(
+                        card_scripts, output_dir=result["audio_dir"], voice_id=variant["voice_id"], model_id=variant["model_id"], draft=draft)]
+                    result["audio_durations"] = durations
+                else:
+                    audio_gen.generate_card_audio(card_scripts, output_dir=result["audio_dir"], voice_id=variant["voice_id"],
+                                                  model_id=variant["model_id"], draft=draft)
+        if generate_video:
+            with span("stage.video", "stage"):
+                video_gen = timed_import("card_video_generator")
+                suffix = "_draft" if draft else ""
+                output_file = f"card_news_video_{video_gen.get_topic_from_json()}_{name}{suffix}.mp4"
+                video_file = video_gen.create_video_from_cards(audio_dir=result["audio_dir"], output_file=output_file, duration=None,
+                                                               bg_music_path=bg_music_path, card_durations=durations,
+                                                               card_images=card_images, formats=formats, draft=draft)
+                if isinstance(video_file, dict):
+                    result["video_files"] = video_file
+                    video_file = video_file[formats[0]]
+                result["video_file"] = video_file
+    print(f"[Pipeline] Variant '{name}' done.")
+    return result
+
+def run_variants(variants, output, card_images=None, generate_audio=True, generate_video=True, stage_deadlines=None, single_tts_request=False, formats=None, draft=False):
+    """
+    Run every variant concurrently against the shared deck (see run_variant).
+
+    Args:
+        variants (list[dict]): Variants from parse_variants.
+        output (dict): Pipeline output with 'card_contents' and 'card_scripts'.
+        Other arguments: As for run_variant.
+    Returns:
+        list[dict]: Variant results in the order given.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    # Load shared modules and resolve the music once, before the variant threads start
+    timed_import("article_search")
     if generate_audio:
-        generate_card_audio(card_scripts)
-        print(f"[Pipeline] Audio files generated in 'audio/' directory.")
-    if auto_music:
-        print("[Pipeline] Fetching background music using bg_music_retrieval.py ...")
-        subprocess.run(["python", "bg_music_retrieval.py"])
+        timed_import("card_audio_generator")
+    bg_music_path = None
     if generate_video:
-        create_video_from_cards(duration=None)
-        print(f"[Pipeline] Card news video generated.")
+        timed_import("moviepy.editor")
+        bg_music_path = timed_import("card_video_generator").get_music_path_from_json()
+    parent = tracing.current_span()
+    variants = assign_variant_names(variants)
+
+    def run(variant):
+        with tracing.activate(parent):
+            return run_variant(variant, output["card_contents"], output["card_scripts"], card_images=card_images,
+                               generate_audio=generate_audio, generate_video=generate_video, stage_deadlines=stage_deadlines,
+                               single_tts_request=single_tts_request, formats=formats, draft=draft, bg_music_path=bg_music_path)
+
+    print(f"[Pipeline] Fanning out {len(variants)} voice/language variants...")
+    with span("stage.variants", "stage", variants=len(variants)), resources.measure("variants"), ThreadPoolExecutor(max_workers=len(variants), thread_name_prefix="variant") as pool:
+        return list(pool.map(run, variants))
+
+def run_pipeline(keyword, max_results=10, max_summaries=6, num_cards=3, generate_cards=True, generate_audio=True, generate_video=True, auto_music=True, dedup_threshold=0.7, use_search_cache=True, trace_file="trace.json", in_process=False, stage_deadlines=None, hedge=None, single_tts_request=False, save_card_pngs=True, formats=None, segment_workers=None, streaming_video=False, draft=False, from_draft=False, variants=None, resource_budgets=None, budget_action=None, trace_malloc=None):
+    """
+    Run the full Card News pipeline: search articles, summarize, generate card content, images, audio, music, and final video.
+    Saves all intermediate and final outputs to disk and returns the card news output dict
+    (plus 'video_file' when a video was generated).
+    Each stage is traced; the trace is written to trace_file (Chrome trace JSON) and summarized at the end.
+    With in_process=True, music retrieval and emoji downloads run in this process instead of child scripts,
+    so a long-running worker (worker.py) reuses its warm clients and caches for them too.
+    stage_deadlines maps stage names (search, summarize, card_contents, card_scripts, audio) to time budgets in
+    seconds (defaults to the STAGE_DEADLINES env var); hedge turns hedged OpenAI/ElevenLabs requests on or off.
+    With single_tts_request=True all card scripts are narrated in one timestamped ElevenLabs request and split per card;
+    the exact per-card durations are returned as 'audio_durations' and used for the video timing.
+    Rendered cards are handed to the video step in memory; save_card_pngs=False skips writing them to cards/.
+    formats (e.g. ['9:16', '1:1', '16:9']) renders every card layout to each canvas and encodes one video per
+    format from a single narration/music mix; 'video_files' then maps each format to its video.
+    segment_workers encodes cards as parallel segments joined with stream copy (single format).
+    streaming_video assembles the video one card at a time in constant memory (cards are read back from their
+    PNGs instead of being held in memory) and reports the peak RSS.
+    draft=True renders a fast preview: scaled-down cards, cheaper narration and a low-resolution ultrafast encode
+    saved as card_news_video_<topic>_draft.mp4. from_draft=True then renders the final video from the approved
+    card_news_output.json, skipping search, summaries and scripts, and reuses the draft's background music.
+    variants (see parse_variants) fans the deck out into one narrated video per voice/language: search, summaries,
+    card images and music are shared, and each variant's scripts, narration and encode run concurrently
+    (results in 'variants'; audio goes to audio/<variant>/).
+    Every stage's peak RSS, CPU time and open file handles (and tracemalloc peak with trace_malloc) are recorded
+    under 'resources' in the output and card_news_output.json; resource_budgets (e.g. 'cards.rss_peak_mb=800',
+    defaults to RESOURCE_BUDGETS) warns or, with budget_action='abort', stops the run when a stage exceeds them.
+    """
+    print(f"[Pipeline] Starting pipeline for keyword: '{keyword}'")
+    if stage_deadlines is None:
+        stage_deadlines = hedging.parse_stage_deadlines(os.getenv("STAGE_DEADLINES"))
+    if hedge is not None:
+        hedging.set_hedging(hedge)
+    if resource_budgets is not None or budget_action is not None:
+        resources.set_budgets(resources.RESOURCE_BUDGETS if resource_budgets is None else resource_budgets, budget_action)
+    if trace_malloc is not None:
+        resources.set_tracemalloc(trace_malloc)
+    resources.clear_usage()
+    with span("pipeline", "stage", keyword=keyword):
+        if from_draft:
+            # The scripts were approved in the draft preview: render them as they are
+            with open("card_news_output.json", "r", encoding="utf-8") as f:
+                output = json.load(f)
+            output.pop("audio_durations", None)
+            card_scripts = output["card_scripts"]
+            print(f"[Pipeline] Rendering final version of approved draft '{output.get('keyword')}'.")
+        else:
+            timed_import("openai")
+            search = timed_import("article_search")
+            with span("stage.search", "stage"), resources.measure("search"), hedging.deadline(stage_deadlines.get("search")):
+                articles = search.web_search(keyword, max_results, use_cache=use_search_cache)
+                # Drop syndicated copies so summarize_articles spends its slots on distinct stories
+                articles = search.dedup_articles(articles, threshold=dedup_threshold)
+            with span("stage.summarize", "stage", articles=min(len(articles), max_summaries)), resources.measure("summarize"), hedging.deadline(stage_deadlines.get("summarize")):
+                summaries = search.summarize_articles(articles, max_summaries)
+            with span("stage.card_contents", "stage", cards=num_cards), resources.measure("card_contents"), hedging.deadline(stage_deadlines.get("card_contents")):
+                card_contents = search.generate_card_news_contents(summaries, keyword, num_cards=num_cards)
+            with span("stage.card_scripts", "stage", cards=len(card_contents)), resources.measure("card_scripts"), hedging.deadline(stage_deadlines.get("card_scripts")):
+                card_scripts = search.generate_card_scripts(card_contents)
+            music_theme_tags, music_tag_scores = suggest_music_tags_from_scripts(card_scripts)
+            output = {
+                "keyword": keyword,
+                "articles": articles,
+                "summaries": summaries,
+                "card_contents": card_contents,
+                "card_scripts": card_scripts,
+                "music_theme_tags": music_theme_tags,
+                "music_tag_scores": music_tag_scores
+            }
+        output["fidelity"] = "draft" if draft else "final"
+        with open("card_news_output.json", "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"[Pipeline] Results saved to card_news_output.json.")
+        card_images = None
+        if generate_cards:
+            with span("stage.cards", "stage"), resources.measure("cards"):
+                timed_import("PIL.Image")
+                card_images = timed_import("card_image_generator").generate_cards_from_json(json_path="card_news_output.json", output_dir="cards", in_process=in_process, save_png=save_card_pngs or streaming_video, formats=formats, keep_images=not streaming_video, draft=draft)
+        if generate_audio and not variants:
+            with span("stage.audio", "stage", cards=len(card_scripts)), resources.measure("audio"), hedging.deadline(stage_deadlines.get("audio")):
+                timed_import("elevenlabs.client")
+                audio_gen = timed_import("card_audio_generator")
+                if single_tts_request:
+                    output["audio_durations"] = [r["duration"] for r in audio_gen.generate_card_audio_single_request(card_scripts, draft=draft)]
+                else:
+                    audio_gen.generate_card_audio(card_scripts, draft=draft)
+            print(f"[Pipeline] Audio files generated in 'audio/' directory.")
+        if auto_music and from_draft and os.path.exists(timed_import("card_video_generator").get_music_path_from_json()):
+            print("[Pipeline] Reusing the draft's background music.")
+        elif auto_music:
+            print("[Pipeline] Fetching background music using bg_music_retrieval.py ...")
+            with span("stage.music", "stage"), resources.measure("music"):
+                if in_process:
+                    timed_import("bg_music_retrieval").main()
+                else:
+                    run_subprocess([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bg_music_retrieval.py")])
+        if variants:
+            if segment_workers or streaming_video:
+                print("[Pipeline] WARNING: --segment_workers and --streaming_video are not supported with variants; encoding each variant in one pass.")
+            output["variants"] = run_variants(variants, output, card_images=card_images, generate_audio=generate_audio,
+                                              generate_video=generate_video, stage_deadlines=stage_deadlines,
+                                              single_tts_request=single_tts_request, formats=formats, draft=draft)
+            if output["variants"] and output["variants"][0].get("video_file"):
+                output["video_file"] = output["variants"][0]["video_file"]
+        elif generate_video:
+            with span("stage.video", "stage"), resources.measure("video"):
+                timed_import("moviepy.editor")
+                video_file = timed_import("card_video_generator").create_video_from_cards(duration=None, card_durations=output.get("audio_durations"), card_images=card_images, formats=formats, segment_workers=segment_workers, streaming=streaming_video, draft=draft)
+                if isinstance(video_file, dict):
+                    output["video_files"] = video_file
+                    video_file = video_file[formats[0]]
+                output["video_file"] = video_file
+            print(f"[Pipeline] Card news video generated.")
+        output["resources"] = resources.get_usage()
+        with open("card_news_output.json", "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
     print(f"[Pipeline] Pipeline complete.")
+    if trace_file:
+        tracing.write_chrome_trace(trace_file)
+        print(f"[Pipeline] Trace written to {trace_file}.")
+        tracing.print_summary()
+    rate_limiter.print_stats()
+    hedging.print_stats()
+    cassette.print_stats()
+    resources.print_usage()
+    return output
+
+# Threads for the CPU-bound stages (card rendering, video encoding) of run_pipeline_async jobs
+PIPELINE_CPU_WORKERS = int(os.getenv("PIPELINE_CPU_WORKERS", str(os.cpu_count() or 4)))
+_cpu_executor = None
+
+def get_cpu_executor():
+    """
+    Get the shared thread pool that run_pipeline_async offloads blocking work to, creating it on first use.
+
+    Returns:
+        ThreadPoolExecutor: Pool of PIPELINE_CPU_WORKERS threads.
+    """
+    global _cpu_executor
+    if _cpu_executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _cpu_executor = ThreadPoolExecutor(max_workers=PIPELINE_CPU_WORKERS, thread_name_prefix="pipeline-cpu")
+    return _cpu_executor
+
+async def run_in_executor(executor, func, *args, **kwargs):
+    """
+    Run a blocking function in an executor without blocking the event loop. In a thread pool the call keeps
+    the caller's span and stage deadline.
+
+    Args:
+        executor (Executor or None): Executor to use (defaults to get_cpu_executor()).
+        func (callable): Blocking function.
+        *args, **kwargs: Arguments for func.
+    Returns:
+        Any: func's return value.
+    """
+    import asyncio
+    import functools
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+    executor = executor or get_cpu_executor()
+    call = functools.partial(func, *args, **kwargs)
+    if isinstance(executor, ThreadPoolExecutor):
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+async def run_pipeline_async(keyword, output_dir=".", max_results=10, max_summaries=6, num_cards=3, generate_cards=True, generate_audio=True, generate_video=True, auto_music=True, dedup_threshold=0.7, use_search_cache=True, stage_deadlines=None, formats=None, draft=False, timeout=None, executor=None, trace_file="trace.json"):
+    """
+    Asyncio counterpart of run_pipeline for embedding in services: many jobs can run concurrently in one event loop.
+    API calls use the async OpenAI/ElevenLabs/HTTP clients (sharing the process-wide rate limiters), card
+    rendering and video encoding run in executor threads, and card images, narration and music are produced
+    concurrently once the scripts are ready. Every output (card_news_output.json, music_info.json, cards/, audio/,
+    music/ and the video) goes to output_dir, so jobs need distinct output directories.
+    Cancelling the job, or exceeding timeout, cancels its in-flight API calls; an executor stage that has already
+    started runs to completion in the background and its result is discarded.
+    Each job records its spans in its own buffer (tracing.collect), written to output_dir/trace_file when the job
+    ends and then dropped, so a long-lived service does not accumulate them. Stages are measured as in run_pipeline
+    and saved under 'resources'; CPU and RSS are process-wide, so they include concurrent stages and jobs.
+    The loop's clients can be closed with api_clients.close_async_clients() when the service shuts down.
+
+    Args:
+        keyword (str): Keyword to search for articles.
+        output_dir (str): Directory for this job's outputs.
+        max_results, max_summaries, num_cards, generate_cards, generate_audio, generate_video, auto_music,
+            dedup_threshold, use_search_cache, formats, draft: As for run_pipeline.
+        stage_deadlines (dict or None): Stage name to time budget in seconds (defaults to the STAGE_DEADLINES env var).
+        timeout (float or None): Time limit for the whole job in seconds; asyncio.TimeoutError is raised when exceeded.
+        executor (Executor or None): Executor for the blocking stages (defaults to get_cpu_executor()).
+        trace_file (str or None): Trace file name inside output_dir (None to discard the job's spans).
+    Returns:
+        dict: The card news output (plus 'video_file' when a video was generated).
+    """
+    import asyncio
+    if stage_deadlines is None:
+        stage_deadlines = hedging.parse_stage_deadlines(os.getenv("STAGE_DEADLINES"))
+    # The job's task (created by wait_for inside this block) and its executor calls inherit the buffer
+    with tracing.collect() as events:
+        job = _run_pipeline_job(keyword, output_dir, max_results, max_summaries, num_cards, generate_cards, generate_audio,
+                                generate_video, auto_music, dedup_threshold, use_search_cache, stage_deadlines, formats, draft, executor)
+        try:
+            return await asyncio.wait_for(job, timeout)
+        except asyncio.TimeoutError:
+            print(f"[Pipeline] Job '{keyword}' timed out after {timeout}s.")
+            raise
+        except asyncio.CancelledError:
+            print(f"[Pipeline] Job '{keyword}' cancelled.")
+            raise
+        finally:
+            if trace_file:
+                tracing.write_chrome_trace(os.path.join(output_dir, trace_file), list(events))
+
+async def _run_pipeline_job(keyword, output_dir, max_results, max_summaries, num_cards, generate_cards, generate_audio, generate_video, auto_music, dedup_threshold, use_search_cache, stage_deadlines, formats, draft, executor):
+    import asyncio
+    print(f"[Pipeline] Starting async pipeline for keyword: '{keyword}' in '{output_dir}'")
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, "card_news_output.json")
+    cards_dir = os.path.join(output_dir, "cards")
+    audio_dir = os.path.join(output_dir, "audio")
+    # Per job rather than resources.get_usage(), which concurrent jobs would overwrite
+    usage = {}
+    with span("pipeline", "stage", keyword=keyword, output_dir=output_dir):
+        # Module imports block, so the first job in a process pays for them off the event loop
+        search = await run_in_executor(executor, timed_import, "article_search")
+        with span("stage.search", "stage"), resources.measure("search") as usage["search"], hedging.deadline(stage_deadlines.get("search")):
+            articles = await search.web_search_async(keyword, max_results, use_cache=use_search_cache)
+            articles = search.dedup_articles(articles, threshold=dedup_threshold)
+        with span("stage.summarize", "stage", articles=min(len(articles), max_summaries)), resources.measure("summarize") as usage["summarize"], hedging.deadline(stage_deadlines.get("summarize")):
+            summaries = await search.summarize_articles_async(articles, max_summaries)
+        with span("stage.card_contents", "stage", cards=num_cards), resources.measure("card_contents") as usage["card_contents"], hedging.deadline(stage_deadlines.get("card_contents")):
+            card_contents = await search.generate_card_news_contents_async(summaries, keyword, num_cards=num_cards)
+        with span("stage.card_scripts", "stage", cards=len(card_contents)), resources.measure("card_scripts") as usage["card_scripts"], hedging.deadline(stage_deadlines.get("card_scripts")):
+            card_scripts = await search.generate_card_scripts_async(card_contents)
+        music_theme_tags, music_tag_scores = suggest_music_tags_from_scripts(card_scripts)
+        output = {
+            "keyword": keyword,
+            "articles": articles,
+            "summaries": summaries,
+            "card_contents": card_contents,
+            "card_scripts": card_scripts,
+            "music_theme_tags": music_theme_tags,
+            "music_tag_scores": music_tag_scores,
+            "fidelity": "draft" if draft else "final"
+        }
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+
+        async def render_cards():
+            if not generate_cards:
+                return None
+            with span("stage.cards", "stage"), resources.measure("cards") as usage["cards"]:
+                card_gen = await run_in_executor(executor, timed_import, "card_image_generator")
+                return await run_in_executor(executor, card_gen.generate_cards_from_json, json_path=json_path, output_dir=cards_dir,
+                                             in_process=True, formats=formats, draft=draft)
+
+        async def narrate():
+            if not generate_audio:
+                return
+            with span("stage.audio", "stage", cards=len(card_scripts)), resources.measure("audio") as usage["audio"], hedging.deadline(stage_deadlines.get("audio")):
+                audio_gen = await run_in_executor(executor, timed_import, "card_audio_generator")
+                await audio_gen.generate_card_audio_async(card_scripts, output_dir=audio_dir, draft=draft)
+
+        async def fetch_music():
+            if not auto_music:
+                return None
+            with span("stage.music", "stage"), resources.measure("music") as usage["music"]:
+                music = await run_in_executor(executor, timed_import, "bg_music_retrieval")
+
+                async def narration_seconds():
+                    await narration
+                    return music.get_narration_seconds(audio_dir)
+                # The Jamendo search overlaps with narration; tracks are checked against its length once it is done
+                return await music.fetch_background_music_async(music_theme_tags.split(","), music_dir=os.path.join(output_dir, "music"),
+                                                                info_path=os.path.join(output_dir, "music_info.json"),
+                                                                min_seconds=narration_seconds() if generate_audio else 0.0)
+
+        narration = asyncio.ensure_future(narrate())
+        card_images, _, music_info = await asyncio.gather(render_cards(), narration, fetch_music())
+        if generate_video:
+            with span("stage.video", "stage"), resources.measure("video") as usage["video"]:
+                video_gen = await run_in_executor(executor, timed_import, "card_video_generator")
+                await run_in_executor(executor, timed_import, "moviepy.editor")
+                suffix = "_draft" if draft else ""
+                output_file = os.path.join(output_dir, f"card_news_video_{video_gen.get_topic_from_json(json_path)}{suffix}.mp4")
+                bg_music_path = music_info["music_path"] if music_info else os.path.join(output_dir, "music", "bg_music.mp3")
+                video_file = await run_in_executor(executor, video_gen.create_video_from_cards, cards_dir=cards_dir, audio_dir=audio_dir,
+                                                   output_file=output_file, duration=None, bg_music_path=bg_music_path,
+                                                   json_path=json_path, card_images=card_images, formats=formats, draft=draft)
+                if isinstance(video_file, dict):
+                    output["video_files"] = video_file
+                    video_file = video_file[formats[0]]
+                output["video_file"] = video_file
+            print(f"[Pipeline] Card news video generated.")
+        output["resources"] = usage
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"[Pipeline] Async pipeline for '{keyword}' complete.")
+    return output
 
 def main():
     """
@@ -71,13 +497,39 @@ def main():
     parser.add_argument('--max_results', type=int, default=10, help='Number of articles to search (SERPAPI)')
     parser.add_argument('--max_summaries', type=int, default=6, help='Number of articles to summarize (reference articles)')
     parser.add_argument('--num_cards', type=int, default=3, help='Number of card news slides to generate')
+    parser.add_argument('--dedup_threshold', type=float, default=0.7, help='Similarity (0-1) at which two articles are treated as duplicates')
+    parser.add_argument('--no_search_cache', action='store_true', help='Always query SerpAPI instead of using cached search results')
+    parser.add_argument('--trace_file', type=str, default="trace.json", help='Where to write the Chrome trace JSON (empty to disable)')
+    parser.add_argument('--stage_deadlines', type=str, default=None, help="Per-stage time budgets in seconds, e.g. 'summarize=60,audio=120'")
+    parser.add_argument('--hedge', action='store_true', help='Hedge OpenAI/ElevenLabs calls slower than their rolling P95 latency')
+    parser.add_argument('--single_tts_request', action='store_true', help='Narrate all cards in one timestamped ElevenLabs request and split it per card')
+    parser.add_argument('--no_card_pngs', action='store_true', help='Pass rendered cards to the video step in memory without writing cards/*.png')
+    parser.add_argument('--formats', type=str, default=None, help="Comma-separated output formats, e.g. '9:16,1:1,16:9' (default: 9:16 only)")
+    parser.add_argument('--segment_workers', type=int, default=None, help='Encode card segments in this many parallel processes and join them with stream copy')
+    parser.add_argument('--streaming_video', action='store_true', help='Assemble the video one card at a time in constant memory and report peak RSS')
+    parser.add_argument('--draft', action='store_true', help='Render a fast low-fidelity preview (small cards, cheap narration, ultrafast encode)')
+    parser.add_argument('--from_draft', action='store_true', help='Render the final video from the approved draft scripts and music in card_news_output.json')
+    parser.add_argument('--variants', type=str, default=None, help="Voice/language fan-out, e.g. 'voiceA:eleven_multilingual_v2:English,voiceB::Korean' (voice_id[:model_id[:language]])")
+    parser.add_argument('--record', type=str, default=None, metavar='CASSETTE', help='Record every external API exchange to this cassette file')
+    parser.add_argument('--replay', type=str, default=None, metavar='CASSETTE', help='Serve every external API call from this cassette file instead of the network')
+    parser.add_argument('--replay_latency', type=float, default=0.0, help='Sleep for the recorded latency times this factor when replaying (0 measures pure CPU cost)')
+    parser.add_argument('--resource_budgets', type=str, default=None, help="Per-stage resource budgets, e.g. 'cards.rss_peak_mb=800,video.cpu_user_s=120,*.open_files=256'")
+    parser.add_argument('--budget_action', type=str, choices=['warn', 'abort'], default=None, help='What to do when a stage exceeds its budget (default: warn)')
+    parser.add_argument('--tracemalloc', action='store_true', help='Also record each stage\'s tracemalloc peak (slows allocation-heavy stages)')
+    parser.add_argument('--startup_profile', '--startup-profile', action='store_true', help='Report interpreter-to-main and lazy import timings')
     parser.add_argument('--no_cards', action='store_true', help='Do not generate card images')
     parser.add_argument('--no_audio', action='store_true', help='Do not generate audio files')
     parser.add_argument('--no_video', action='store_true', help='Do not generate video file')
     parser.add_argument('--no_music', action='store_true', help='Do not fetch background music')
     args = parser.parse_args()
+    if args.startup_profile:
+        print(f"[Startup] run_pipeline module to argument parsing: {(time.perf_counter() - MODULE_LOADED_AT) * 1000:.1f} ms")
 
-    keyword = args.keyword or input("Enter a keyword to search for articles: ")
+    if args.record:
+        cassette.set_cassette("record", args.record)
+    elif args.replay:
+        cassette.set_cassette("replay", args.replay, latency_scale=args.replay_latency)
+    keyword = args.keyword or (None if args.from_draft else input("Enter a keyword to search for articles: "))
     run_pipeline(
         keyword,
         max_results=args.max_results,
@@ -86,8 +538,26 @@ def main():
         generate_cards=not args.no_cards,
         generate_audio=not args.no_audio,
         generate_video=not args.no_video,
-        auto_music=not args.no_music
+        auto_music=not args.no_music,
+        dedup_threshold=args.dedup_threshold,
+        use_search_cache=not args.no_search_cache,
+        trace_file=args.trace_file,
+        stage_deadlines=hedging.parse_stage_deadlines(args.stage_deadlines) if args.stage_deadlines else None,
+        hedge=True if args.hedge else None,
+        single_tts_request=args.single_tts_request,
+        save_card_pngs=not args.no_card_pngs,
+        formats=args.formats.split(",") if args.formats else None,
+        segment_workers=args.segment_workers,
+        streaming_video=args.streaming_video,
+        draft=args.draft,
+        from_draft=args.from_draft,
+        variants=parse_variants(args.variants) if args.variants else None,
+        resource_budgets=args.resource_budgets,
+        budget_action=args.budget_action,
+        trace_malloc=True if args.tracemalloc else None
     )
+    if args.startup_profile:
+        print_startup_profile()
 
 if __name__ == "__main__":
     main()
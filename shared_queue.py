@@ -0,0 +1,578 @@
+"""
+shared_queue.py: Multi-host Card News job distribution over a shared directory (NFS or any POSIX shared filesystem), with no broker.
+
+Layout under the queue root:
+    jobs/<job_id>.json                 job spec (keyword, run_pipeline params, stages)
+    leases/<job_id>.<stage>.lease      exclusive stage lease (created with O_EXCL), renewed by heartbeats
+    done/<job_id>.<stage>.json         stage commit record with artifact digests (published with link(), so only one commit wins)
+    failed/<job_id>.<stage>.<n>.json   failed attempt records
+    store/<ab>/<sha256>                content-addressed artifact store
+
+Stages run in dependency order (content -> cards/audio/music -> video), and any host may claim any ready stage.
+A worker that dies stops heartbeating; once its lease expires another worker reclaims the stage and reruns it.
+Because a stage's results only count once its done record is linked into place, every stage of every job
+commits exactly once even if a slow worker finishes after its lease was reclaimed.
+
+Usage:
+    python shared_queue.py --root /mnt/shared/cardq submit --keyword "AI news"
+    python shared_queue.py --root /mnt/shared/cardq run [--processes 4]
+    python shared_queue.py --root /mnt/shared/cardq status
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import hashlib
+import threading
+import traceback
+
+LEASE_TTL = float(os.getenv("SHARED_QUEUE_LEASE_TTL", "120"))
+MAX_ATTEMPTS = int(os.getenv("SHARED_QUEUE_MAX_ATTEMPTS", "3"))
+
+# Stage -> stages whose artifacts it needs
+STAGE_DEPENDENCIES = {
+    "content": [],
+    "cards": ["content"],
+    "audio": ["content"],
+    # After audio, so the downloaded track can be checked against the narration length
+    "music": ["content", "audio"],
+    "video": ["content", "cards", "audio", "music"],
+}
+STAGE_ORDER = ["content", "cards", "audio", "music", "video"]
+
+
+def atomic_write_json(path, data):
+    """
+    Write JSON via a temp file and rename, so readers never see a partial file.
+
+    Args:
+        path (str): Destination path.
+        data (dict): JSON-serializable data.
+    Returns:
+        None.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    """
+    Read a JSON file, returning None if it is missing or partially written.
+
+    Args:
+        path (str): File path.
+    Returns:
+        dict or None: Parsed JSON.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SharedQueue:
+    """
+    Job queue, stage leases and artifact store rooted at a shared directory.
+
+    Args:
+        root (str): Shared queue directory (same path on every host).
+        lease_ttl (float): Seconds a lease stays valid without a heartbeat.
+    """
+
+    def __init__(self, root, lease_ttl=LEASE_TTL):
+        self.root = os.path.abspath(root)
+        self.lease_ttl = lease_ttl
+        for sub in ("jobs", "leases", "done", "failed", "store"):
+            os.makedirs(os.path.join(self.root, sub), exist_ok=True)
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    # Jobs
+
+    def submit(self, keyword, stages=None, **params):
+        """
+        Add a job.
+
+        Args:
+            keyword (str): Search keyword for the pipeline.
+            stages (list[str] or None): Stages to run (defaults to all).
+            **params: run_pipeline keyword arguments for the content stage (max_results, num_cards, ...).
+        Returns:
+            str: Job ID.
+        """
+        stages = [s for s in STAGE_ORDER if s in (stages or STAGE_ORDER)]
+        job_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        atomic_write_json(self.path("jobs", f"{job_id}.json"), {
+            "id": job_id,
+            "keyword": keyword,
+            "stages": stages,
+            "params": params,
+            "submitted_at": time.time()
+        })
+        return job_id
+
+    def list_jobs(self):
+        """
+        Load all job specs, oldest first.
+
+        Returns:
+            list[dict]: Job specs.
+        """
+        jobs = []
+        for name in os.listdir(self.path("jobs")):
+            if name.endswith(".json"):
+                job = read_json(self.path("jobs", name))
+                if job:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job.get("submitted_at", 0))
+
+    def stage_record(self, job_id, stage):
+        """
+        Get a stage's commit record.
+
+        Args:
+            job_id (str): Job ID.
+            stage (str): Stage name.
+        Returns:
+            dict or None: Commit record, or None if the stage has not committed.
+        """
+        return read_json(self.path("done", f"{job_id}.{stage}.json"))
+
+    def failed_attempts(self, job_id, stage):
+        prefix = f"{job_id}.{stage}."
+        return sum(1 for name in os.listdir(self.path("failed")) if name.startswith(prefix))
+
+    def job_status(self, job):
+        """
+        Summarize a job's progress from its commit and failure records.
+
+        Args:
+            job (dict): Job spec.
+        Returns:
+            str: 'done', 'failed', or 'pending'.
+        """
+        if all(os.path.exists(self.path("done", f"{job['id']}.{s}.json")) for s in job["stages"]):
+            return "done"
+        if any(self.failed_attempts(job["id"], s) >= MAX_ATTEMPTS for s in job["stages"]):
+            return "failed"
+        return "pending"
+
+    def ready_stages(self, job):
+        """
+        Stages of a job that are not committed, not exhausted, and whose dependencies have committed.
+
+        Args:
+            job (dict): Job spec.
+        Returns:
+            list[str]: Claimable stages in pipeline order.
+        """
+        ready = []
+        for stage in job["stages"]:
+            if os.path.exists(self.path("done", f"{job['id']}.{stage}.json")):
+                continue
+            if self.failed_attempts(job["id"], stage) >= MAX_ATTEMPTS:
+                continue
+            deps = [d for d in STAGE_DEPENDENCIES[stage] if d in job["stages"]]
+            if all(os.path.exists(self.path("done", f"{job['id']}.{d}.json")) for d in deps):
+                ready.append(stage)
+        return ready
+
+    # Leases
+
+    def try_acquire(self, job_id, stage, worker_id):
+        """
+        Try to take the exclusive lease for a stage, reclaiming it if the holder's lease has expired.
+
+        Args:
+            job_id (str): Job ID.
+            stage (str): Stage name.
+            worker_id (str): This worker's identifier.
+        Returns:
+            Lease or None: The acquired lease, or None if another live worker holds it.
+        """
+        lease_path = self.path("leases", f"{job_id}.{stage}.lease")
+        token = uuid.uuid4().hex
+        for _ in range(2):
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._reclaim_if_expired(lease_path):
+                    return None
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"token": token, "worker": worker_id, "expires_at": time.time() + self.lease_ttl}, f)
+            return Lease(self, lease_path, token, worker_id, job_id, stage)
+        return None
+
+    def _reclaim_if_expired(self, lease_path):
+        # Move an expired lease aside with rename() (atomic, so only one reclaimer wins)
+        current = read_json(lease_path)
+        if current is None:
+            # Partially written or just removed; fall back to file age
+            try:
+                if time.time() - os.path.getmtime(lease_path) < self.lease_ttl:
+                    return False
+            except OSError:
+                return True
+        elif current.get("expires_at", 0) > time.time():
+            return False
+        aside = f"{lease_path}.reclaimed.{uuid.uuid4().hex}"
+        try:
+            os.rename(lease_path, aside)
+        except FileNotFoundError:
+            return True
+        moved = read_json(aside)
+        if current is not None and moved is not None and moved.get("token") != current.get("token"):
+            # Lost a race and moved a fresh lease aside: put it back if the slot is still free
+            try:
+                os.link(aside, lease_path)
+            except FileExistsError:
+                pass
+            os.remove(aside)
+            return False
+        print(f"[Queue] Reclaimed expired lease {os.path.basename(lease_path)} from {current.get('worker') if current else 'unknown'}.")
+        os.remove(aside)
+        return True
+
+    # Artifact store
+
+    def put_file(self, path):
+        """
+        Add a file to the content-addressed store.
+
+        Args:
+            path (str): Local file path.
+        Returns:
+            str: SHA-256 digest of the file.
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        hexdigest = digest.hexdigest()
+        dest = self.path("store", hexdigest[:2], hexdigest)
+        if not os.path.exists(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp_path = f"{dest}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, dest)
+        return hexdigest
+
+    def get_file(self, digest, dest):
+        """
+        Materialize a stored artifact at dest (hard link when possible, else copy).
+
+        Args:
+            digest (str): SHA-256 digest.
+            dest (str): Local destination path.
+        Returns:
+            str: dest.
+        """
+        src = self.path("store", digest[:2], digest)
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+        return dest
+
+    def commit(self, lease, artifacts, extra=None):
+        """
+        Publish a stage's artifacts. The done record is linked into place, so only the first commit wins.
+
+        Args:
+            lease (Lease): The lease the stage ran under.
+            artifacts (dict[str, str]): Relative path -> digest.
+            extra (dict or None): Additional fields for the record.
+        Returns:
+            bool: True if this commit won, False if the stage was already committed.
+        """
+        done_path = self.path("done", f"{lease.job_id}.{lease.stage}.json")
+        tmp_path = f"{done_path}.{lease.token}.tmp"
+        record = {"job": lease.job_id, "stage": lease.stage, "worker": lease.worker_id, "token": lease.token,
+                  "artifacts": artifacts, "finished_at": time.time()}
+        record.update(extra or {})
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        try:
+            os.link(tmp_path, done_path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def record_failure(self, lease, error):
+        attempt = self.failed_attempts(lease.job_id, lease.stage) + 1
+        atomic_write_json(self.path("failed", f"{lease.job_id}.{lease.stage}.{attempt}.{lease.token[:8]}.json"),
+                          {"worker": lease.worker_id, "error": error, "failed_at": time.time()})
+
+
+class Lease:
+    """
+    A held stage lease, renewed by a heartbeat thread while the stage runs.
+    """
+
+    def __init__(self, queue, path, token, worker_id, job_id, stage):
+        self.queue = queue
+        self.path = path
+        self.token = token
+        self.worker_id = worker_id
+        self.job_id = job_id
+        self.stage = stage
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def renew(self):
+        """
+        Extend the lease if this worker still holds it.
+
+        Returns:
+            bool: False if the lease was reclaimed by another worker.
+        """
+        current = read_json(self.path)
+        if current is None or current.get("token") != self.token:
+            self.lost = True
+            return False
+        atomic_write_json(self.path, {"token": self.token, "worker": self.worker_id,
+                                      "expires_at": time.time() + self.queue.lease_ttl})
+        return True
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_ttl / 3):
+            if not self.renew():
+                print(f"[Queue] Lost lease for {self.job_id}.{self.stage}; its result will not be committed if another worker commits first.")
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        current = read_json(self.path)
+        if current is not None and current.get("token") == self.token:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def collect_outputs(work_dir, paths):
+    """
+    List output files under work_dir matching the given relative files/directories.
+
+    Args:
+        work_dir (str): Stage working directory.
+        paths (list[str]): Relative file or directory paths.
+    Returns:
+        list[str]: Relative file paths that exist.
+    """
+    found = []
+    for rel in paths:
+        full = os.path.join(work_dir, rel)
+        if os.path.isdir(full):
+            for name in sorted(os.listdir(full)):
+                if os.path.isfile(os.path.join(full, name)):
+                    found.append(os.path.join(rel, name))
+        elif os.path.isfile(full):
+            found.append(rel)
+    return found
+
+
+def run_stage(job, stage):
+    """
+    Run one pipeline stage in the current directory, whose dependency artifacts are already materialized.
+
+    Args:
+        job (dict): Job spec.
+        stage (str): Stage name.
+    Returns:
+        list[str]: Relative paths (files or directories) of the stage's outputs.
+    """
+    from run_pipeline import run_pipeline, timed_import
+    if stage == "content":
+        run_pipeline(job["keyword"], generate_cards=False, generate_audio=False, generate_video=False,
+                     auto_music=False, trace_file=f"trace_{stage}.json", **job["params"])
+        return ["card_news_output.json"]
+    if stage == "cards":
+        timed_import("card_image_generator").generate_cards_from_json(json_path="card_news_output.json", output_dir="cards", in_process=True)
+        return ["cards"]
+    if stage == "audio":
+        with open("card_news_output.json", "r", encoding="utf-8") as f:
+            scripts = json.load(f).get("card_scripts", [])
+        timed_import("card_audio_generator").generate_card_audio(scripts)
+        return ["audio"]
+    if stage == "music":
+        timed_import("bg_music_retrieval").main()
+        return ["music_info.json", "music"]
+    if stage == "video":
+        video_file = timed_import("card_video_generator").create_video_from_cards(duration=None)
+        return [video_file] if video_file else []
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def process_stage(queue, job, lease, work_root):
+    """
+    Materialize dependencies, run a claimed stage, publish its outputs and commit.
+
+    Args:
+        queue (SharedQueue): Shared queue.
+        job (dict): Job spec.
+        lease (Lease): Held lease for the stage.
+        work_root (str): Local scratch directory.
+    Returns:
+        bool: True if this worker's result was committed.
+    """
+    import tracing
+    # Each stage's trace file should hold only its own spans, and a long-running worker must not keep them all
+    tracing.clear()
+    work_dir = os.path.join(work_root, job["id"], lease.stage)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    for dep in STAGE_DEPENDENCIES[lease.stage]:
+        record = queue.stage_record(job["id"], dep)
+        for rel, digest in (record or {}).get("artifacts", {}).items():
+            queue.get_file(digest, os.path.join(work_dir, rel))
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        outputs = run_stage(job, lease.stage)
+    finally:
+        os.chdir(cwd)
+    artifacts = {rel: queue.put_file(os.path.join(work_dir, rel)) for rel in collect_outputs(work_dir, outputs)}
+    committed = queue.commit(lease, artifacts)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return committed
+
+
+def run_worker(root, work_root=None, poll_interval=2.0, max_idle=None, worker_id=None):
+    """
+    Claim and run ready stages from the shared queue until idle for max_idle seconds (or forever).
+
+    Args:
+        root (str): Shared queue directory.
+        work_root (str or None): Local scratch directory (defaults to a per-worker temp dir).
+        poll_interval (float): Seconds to sleep when nothing is claimable.
+        max_idle (float or None): Exit after this long with nothing to do (None to run forever).
+        worker_id (str or None): Worker identifier (defaults to host:pid).
+    Returns:
+        int: Number of stages this worker committed.
+    """
+    import tempfile
+    queue = SharedQueue(root)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    work_root = work_root or tempfile.mkdtemp(prefix="card_news_stage_")
+    # Share emoji assets and the card render cache across stage directories on this host (read by the modules
+    # at import; the render cache must outlive the scratch work_dir that each stage deletes)
+    os.environ.setdefault("EMOJI_PNG_DIR", os.path.abspath("emoji_png"))
+    os.environ.setdefault("EMOJI_BUNDLE", os.path.abspath("emoji_bundle.bin"))
+    os.environ.setdefault("CARD_CACHE_DIR", os.path.abspath(os.path.join(".cache", "cards")))
+    committed = 0
+    idle_since = time.monotonic()
+    print(f"[Queue] Worker {worker_id} polling {queue.root}")
+    while True:
+        claimed = False
+        for job in queue.list_jobs():
+            if queue.job_status(job) != "pending":
+                continue
+            for stage in queue.ready_stages(job):
+                lease = queue.try_acquire(job["id"], stage, worker_id)
+                if lease is None:
+                    continue
+                claimed = True
+                print(f"[Queue] {worker_id} running {job['id']}.{stage}")
+                with lease:
+                    # Another worker may have committed between listing and acquiring
+                    if queue.stage_record(job["id"], stage):
+                        continue
+                    try:
+                        if process_stage(queue, job, lease, work_root):
+                            committed += 1
+                            print(f"[Queue] Committed {job['id']}.{stage}")
+                        else:
+                            print(f"[Queue] {job['id']}.{stage} was already committed by another worker; discarded.")
+                    except Exception as e:
+                        queue.record_failure(lease, f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+                        print(f"[Queue] {job['id']}.{stage} failed: {e}")
+                break
+            if claimed:
+                break
+        if claimed:
+            idle_since = time.monotonic()
+            continue
+        if max_idle is not None and time.monotonic() - idle_since >= max_idle:
+            print(f"[Queue] Worker {worker_id} idle for {max_idle}s; exiting after {committed} committed stage(s).")
+            return committed
+        time.sleep(poll_interval)
+
+
+def print_status(root):
+    """
+    Print each job's status and committed stages.
+
+    Args:
+        root (str): Shared queue directory.
+    Returns:
+        None.
+    """
+    queue = SharedQueue(root)
+    for job in queue.list_jobs():
+        done = [s for s in job["stages"] if queue.stage_record(job["id"], s)]
+        print(f"{job['id']}  {queue.job_status(job):<8}  {job['keyword'][:40]:<40}  done: {','.join(done) or '-'}")
+
+
+def main():
+    """
+    Command-line interface: submit jobs, run workers, or show status.
+    """
+    import argparse
+    import multiprocessing
+    parser = argparse.ArgumentParser(description="Card News job distribution over a shared directory")
+    parser.add_argument('--root', type=str, required=True, help='Shared queue directory (same path on every host)')
+    sub = parser.add_subparsers(dest="command", required=True)
+    submit = sub.add_parser("submit", help="Queue a pipeline job")
+    submit.add_argument('--keyword', type=str, required=True, help='Keyword to search for articles')
+    submit.add_argument('--max_results', type=int, default=10, help='Number of articles to search (SERPAPI)')
+    submit.add_argument('--max_summaries', type=int, default=6, help='Number of articles to summarize')
+    submit.add_argument('--num_cards', type=int, default=3, help='Number of card news slides to generate')
+    submit.add_argument('--stages', nargs='+', default=STAGE_ORDER, choices=STAGE_ORDER, help='Stages to run')
+    run = sub.add_parser("run", help="Claim and run stages")
+    run.add_argument('--processes', type=int, default=1, help='Worker processes to start on this host')
+    run.add_argument('--poll_interval', type=float, default=2.0, help='Seconds to wait when nothing is claimable')
+    run.add_argument('--max_idle', type=float, default=None, help='Exit after this many idle seconds')
+    sub.add_parser("status", help="Show job status")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        job_id = SharedQueue(args.root).submit(args.keyword, stages=args.stages, max_results=args.max_results,
+                                               max_summaries=args.max_summaries, num_cards=args.num_cards)
+        print(f"[Queue] Submitted job {job_id}.")
+    elif args.command == "run":
+        if args.processes <= 1:
+            run_worker(args.root, poll_interval=args.poll_interval, max_idle=args.max_idle)
+            return
+        procs = [multiprocessing.Process(target=run_worker, args=(args.root,),
+                                         kwargs={"poll_interval": args.poll_interval, "max_idle": args.max_idle})
+                 for _ in range(args.processes)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+    else:
+        print_status(args.root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+tracing.py: Lightweight in-process tracing for the Card News pipeline, with Chrome trace JSON export and a summary table.
+
+Spans are recorded as complete ("X") events in Chrome trace format, so a trace file can be opened in
+chrome://tracing or https://ui.perfetto.dev. Recording a span costs two clock reads and one list append,
+so tracing is on by default; set CARD_NEWS_TRACE=0 to disable it.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import subprocess
+import contextvars
+from contextlib import contextmanager
+
+TRACE_ENABLED = os.getenv("CARD_NEWS_TRACE", "1") != "0"
+# Set by the parent process so a child (e.g. bg_music_retrieval.py) writes its spans for merging
+CHILD_TRACE_ENV = "CARD_NEWS_TRACE_CHILD_FILE"
+
+# Anchor perf_counter to wall-clock time so spans from parent and child processes line up
+_EPOCH_US = time.time_ns() // 1000
+_PERF_START_NS = time.perf_counter_ns()
+
+_events = []
+_lock = threading.Lock()
+# Open spans, innermost last; a context variable so each thread and each asyncio task has its own stack
+_stack = contextvars.ContextVar("card_news_span_stack", default=())
+# Per-job event list set by collect(); spans finished outside one go to the process-wide _events
+_buffer = contextvars.ContextVar("card_news_trace_buffer", default=None)
+
+
+def now_us():
+    """
+    Current trace timestamp in microseconds (wall-clock anchored, monotonic).
+
+    Returns:
+        int: Microseconds since the Unix epoch.
+    """
+    return _EPOCH_US + (time.perf_counter_ns() - _PERF_START_NS) // 1000
+
+
+class Span:
+    """
+    A single timed span. Use set() to attach attributes (card index, bytes, tokens, retries) while it is open.
+    """
+    __slots__ = ("name", "cat", "args", "start_us")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start_us = now_us()
+
+    def set(self, **attrs):
+        """
+        Attach or update attributes on this span.
+
+        Args:
+            **attrs: Attribute names and JSON-serializable values.
+        Returns:
+            None.
+        """
+        self.args.update(attrs)
+
+    def add(self, key, amount=1):
+        """
+        Increment a numeric attribute on this span (e.g. retries, bytes).
+
+        Args:
+            key (str): Attribute name.
+            amount (int or float): Amount to add.
+        Returns:
+            None.
+        """
+        self.args[key] = self.args.get(key, 0) + amount
+
+
+class _NullSpan:
+    """Span stand-in used when tracing is disabled."""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+@contextmanager
+def span(name, cat="pipeline", **attrs):
+    """
+    Record a span around a block of code.
+
+    Args:
+        name (str): Span name (e.g. 'openai.chat', 'card.render').
+        cat (str): Span category (e.g. 'stage', 'api', 'render').
+        **attrs: Initial span attributes.
+    Yields:
+        Span: The open span, for attaching attributes.
+    """
+    if not TRACE_ENABLED:
+        yield NULL_SPAN
+        return
+    s = Span(name, cat, attrs)
+    token = _stack.set(_stack.get() + (s,))
+    try:
+        yield s
+    except BaseException as e:
+        s.args["error"] = type(e).__name__
+        raise
+    finally:
+        _stack.reset(token)
+        end_us = now_us()
+        event = {
+            "name": s.name,
+            "cat": s.cat,
+            "ph": "X",
+            "ts": s.start_us,
+            "dur": end_us - s.start_us,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": s.args
+        }
+        _record([event])
+
+
+def _record(events):
+    buffer = _buffer.get()
+    if buffer is not None:
+        # list.extend is atomic under the GIL, and a buffer is only shared by one job's threads and tasks
+        buffer.extend(events)
+        return
+    with _lock:
+        _events.extend(events)
+
+
+@contextmanager
+def collect():
+    """
+    Record the spans of a block (and of the threads and asyncio tasks it starts with a copy of its context)
+    into a separate list instead of the process-wide trace, so a long-lived service can run many jobs
+    without accumulating their spans.
+
+    Yields:
+        list[dict]: The block's Chrome trace 'X' events (filled as spans finish; pass to write_chrome_trace).
+    """
+    events = []
+    token = _buffer.set(events)
+    try:
+        yield events
+    finally:
+        _buffer.reset(token)
+
+
+def traced(name=None, cat="pipeline"):
+    """
+    Decorator that wraps every call of a function in a span.
+
+    Args:
+        name (str or None): Span name (defaults to the function's qualified name).
+        cat (str): Span category.
+    Returns:
+        callable: Decorator.
+    """
+    import functools
+
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, cat):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """
+    Get the innermost open span on this thread (or asyncio task).
+
+    Returns:
+        Span: The current span, or a no-op span if none is open.
+    """
+    stack = _stack.get()
+    return stack[-1] if stack else NULL_SPAN
+
+
+@contextmanager
+def activate(s):
+    """
+    Make an existing span current on this thread or task (e.g. in a worker thread running part of the span's work).
+    The span is not recorded again; only current_span() is affected.
+
+    Args:
+        s (Span): Span to activate.
+    Yields:
+        Span: The same span.
+    """
+    if s is NULL_SPAN:
+        yield s
+        return
+    token = _stack.set(_stack.get() + (s,))
+    try:
+        yield s
+    finally:
+        _stack.reset(token)
+
+
+def record_openai_usage(s, response):
+    """
+    Attach OpenAI token usage from a chat completion response to a span.
+
+    Args:
+        s (Span): Span to annotate.
+        response: OpenAI chat completion response.
+    Returns:
+        None.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        s.set(prompt_tokens=getattr(usage, "prompt_tokens", None),
+              completion_tokens=getattr(usage, "completion_tokens", None),
+              tokens=getattr(usage, "total_tokens", None))
+
+
+def get_events():
+    """
+    Get a snapshot of all recorded trace events.
+
+    Returns:
+        list[dict]: Chrome trace 'X' events.
+    """
+    with _lock:
+        return list(_events)
+
+
+def clear():
+    """
+    Drop all recorded trace events (e.g. between jobs in a long-running process).
+
+    Returns:
+        None.
+    """
+    with _lock:
+        _events.clear()
+
+
+def merge_trace_file(path):
+    """
+    Merge events from another process's trace file into this process's trace.
+
+    Args:
+        path (str): Path to a Chrome trace JSON file.
+    Returns:
+        int: Number of merged events.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    events = data.get("traceEvents", []) if isinstance(data, dict) else data
+    _record(events)
+    return len(events)
+
+
+def write_chrome_trace(path="trace.json", events=None):
+    """
+    Write recorded spans as Chrome trace JSON.
+
+    Args:
+        path (str): Output file path.
+        events (list[dict] or None): Events to write (defaults to all recorded events).
+    Returns:
+        str: Path to the written trace file.
+    """
+    events = get_events() if events is None else events
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+    return path
+
+
+def summarize(events=None):
+    """
+    Aggregate spans by name.
+
+    Args:
+        events (list[dict] or None): Events to aggregate (defaults to all recorded events).
+    Returns:
+        list[dict]: Rows with 'name', 'cat', 'count', 'total_ms', 'mean_ms', 'max_ms', sorted by total time.
+    """
+    events = get_events() if events is None else events
+    rows = {}
+    for e in events:
+        if e.get("ph") != "X":
+            continue
+        row = rows.setdefault(e["name"], {"name": e["name"], "cat": e.get("cat", ""), "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        dur_ms = e.get("dur", 0) / 1000.0
+        row["count"] += 1
+        row["total_ms"] += dur_ms
+        row["max_ms"] = max(row["max_ms"], dur_ms)
+    for row in rows.values():
+        row["mean_ms"] = row["total_ms"] / row["count"]
+    return sorted(rows.values(), key=lambda r: r["total_ms"], reverse=True)
+
+
+def print_summary(events=None, file=None):
+    """
+    Print a per-span timing summary table.
+
+    Args:
+        events (list[dict] or None): Events to summarize (defaults to all recorded events).
+        file: Output stream (defaults to stdout).
+    Returns:
+        None.
+    """
+    rows = summarize(events)
+    if not rows:
+        return
+    out = file or sys.stdout
+    width = max(len(r["name"]) for r in rows)
+    print(f"[Trace] {'span':<{width}}  {'count':>5}  {'total ms':>10}  {'mean ms':>9}  {'max ms':>9}", file=out)
+    for r in rows:
+        print(f"[Trace] {r['name']:<{width}}  {r['count']:>5}  {r['total_ms']:>10.1f}  {r['mean_ms']:>9.1f}  {r['max_ms']:>9.1f}", file=out)
+
+
+def run_subprocess(cmd, name=None, **kwargs):
+    """
+    Run a child Python script under a span and merge the child's own spans into this trace.
+
+    Args:
+        cmd (list[str]): Command to run (as for subprocess.run).
+        name (str or None): Span name (defaults to 'subprocess.<script>').
+        **kwargs: Extra keyword arguments for subprocess.run.
+    Returns:
+        subprocess.CompletedProcess: Result of subprocess.run.
+    """
+    import tempfile
+    name = name or f"subprocess.{os.path.basename(cmd[-1])}"
+    if not TRACE_ENABLED:
+        return subprocess.run(cmd, **kwargs)
+    fd, child_path = tempfile.mkstemp(prefix="card_news_trace_", suffix=".json")
+    os.close(fd)
+    env = dict(kwargs.pop("env", None) or os.environ)
+    env[CHILD_TRACE_ENV] = child_path
+    try:
+        with span(name, "subprocess") as s:
+            result = subprocess.run(cmd, env=env, **kwargs)
+            s.set(returncode=result.returncode)
+        merge_trace_file(child_path)
+    finally:
+        try:
+            os.remove(child_path)
+        except OSError:
+            pass
+    return result
+
+
+def _write_child_trace():
+    write_chrome_trace(os.environ[CHILD_TRACE_ENV])
+
+
+if TRACE_ENABLED and os.getenv(CHILD_TRACE_ENV):
+    atexit.register(_write_child_trace)
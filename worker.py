@@ -0,0 +1,325 @@
+"""
+worker.py: Long-running Card News worker that pulls jobs from a local SQLite queue and keeps clients, fonts and assets warm.
+
+Usage:
+    python worker.py submit --keyword "AI news" [--num_cards 4 --no_video ...]
+    python worker.py run [--db jobs.db --jobs_dir jobs --max_jobs N]
+    python worker.py status [JOB_ID]
+
+Each job runs run_pipeline in its own directory (jobs/<id>/) inside the same process, so the OpenAI/ElevenLabs
+clients, HTTP connection pool, loaded modules, fonts and decoded emoji images are reused between jobs.
+SIGINT/SIGTERM stop the worker after the current job finishes.
+"""
+import os
+import json
+import time
+import socket
+import signal
+import sqlite3
+import traceback
+
+DEFAULT_DB_PATH = "jobs.db"
+DEFAULT_JOBS_DIR = "jobs"
+
+# run_pipeline keyword arguments a job may set
+JOB_PARAM_NAMES = ("max_results", "max_summaries", "num_cards", "generate_cards", "generate_audio",
+                   "generate_video", "auto_music", "dedup_threshold", "use_search_cache")
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    """
+    Open the job queue database, creating the jobs table if needed.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+    Returns:
+        sqlite3.Connection: Connection in autocommit mode with WAL journaling.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            keyword TEXT NOT NULL,
+            params TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued',
+            worker TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            result TEXT,
+            error TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+    return conn
+
+
+def submit_job(conn, keyword, **params):
+    """
+    Add a job to the queue.
+
+    Args:
+        conn (sqlite3.Connection): Queue connection.
+        keyword (str): Search keyword for the pipeline.
+        **params: run_pipeline keyword arguments (see JOB_PARAM_NAMES).
+    Returns:
+        int: New job ID.
+    """
+    unknown = set(params) - set(JOB_PARAM_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown job parameters: {sorted(unknown)}")
+    cur = conn.execute("INSERT INTO jobs (keyword, params, created_at) VALUES (?, ?, ?)",
+                       (keyword, json.dumps(params), time.time()))
+    return cur.lastrowid
+
+
+def claim_job(conn, worker_id):
+    """
+    Atomically claim the oldest queued job.
+
+    Args:
+        conn (sqlite3.Connection): Queue connection.
+        worker_id (str): Identifier recorded on the claimed job.
+    Returns:
+        sqlite3.Row or None: The claimed job, or None if the queue is empty.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE jobs SET status = 'running', worker = ?, started_at = ? WHERE id = ?",
+                     (worker_id, time.time(), row["id"]))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+
+def finish_job(conn, job_id, result=None, error=None):
+    """
+    Record a job's final status and result.
+
+    Args:
+        conn (sqlite3.Connection): Queue connection.
+        job_id (int): Job ID.
+        result (dict or None): Result record for successful jobs.
+        error (str or None): Error text for failed jobs.
+    Returns:
+        None.
+    """
+    conn.execute("UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+                 ("failed" if error else "done", time.time(), json.dumps(result) if result is not None else None, error, job_id))
+
+
+def requeue_orphaned_jobs(conn, hostname):
+    """
+    Requeue jobs left 'running' by a worker on this host whose process no longer exists (e.g. after a crash).
+
+    Args:
+        conn (sqlite3.Connection): Queue connection.
+        hostname (str): This host's name (worker IDs are 'host:pid').
+    Returns:
+        int: Number of requeued jobs.
+    """
+    requeued = 0
+    rows = conn.execute("SELECT id, worker FROM jobs WHERE status = 'running' AND worker LIKE ?", (f"{hostname}:%",)).fetchall()
+    for row in rows:
+        try:
+            os.kill(int(row["worker"].rsplit(":", 1)[1]), 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except (ValueError, PermissionError):
+            continue
+        cur = conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL WHERE id = ? AND status = 'running'",
+                           (row["id"],))
+        requeued += cur.rowcount
+    return requeued
+
+
+def warm_up():
+    """
+    Import the pipeline modules and create API clients once, before the first job.
+
+    Returns:
+        None.
+    """
+    from run_pipeline import timed_import
+    for module_name in ("article_search", "card_image_generator", "card_audio_generator", "bg_music_retrieval",
+                        "download_twemoji_pngs", "card_video_generator"):
+        try:
+            timed_import(module_name)
+        except ImportError as e:
+            print(f"[Worker] Could not preload {module_name}: {e}")
+    import emoji_bundle
+    # mmap the packed emoji bundle (if built) once for all jobs
+    emoji_bundle.get_bundle()
+    import emoji_tokenizer
+    emoji_tokenizer.get_emoji_pattern()
+    import api_clients
+    api_clients.get_http_session()
+    try:
+        api_clients.get_openai_client()
+        api_clients.get_elevenlabs_client()
+    except (ImportError, ValueError) as e:
+        print(f"[Worker] Client warm-up skipped: {e}")
+
+
+def run_job(job, jobs_dir):
+    """
+    Run one job's pipeline in its own output directory.
+
+    Args:
+        job (sqlite3.Row): Claimed job row.
+        jobs_dir (str): Parent directory for per-job output directories.
+    Returns:
+        dict: Result record (job directory, video file, card count, duration).
+    """
+    import tracing
+    from run_pipeline import run_pipeline
+    job_dir = os.path.abspath(os.path.join(jobs_dir, str(job["id"])))
+    os.makedirs(job_dir, exist_ok=True)
+    params = json.loads(job["params"] or "{}")
+    tracing.clear()
+    cwd = os.getcwd()
+    start = time.perf_counter()
+    os.chdir(job_dir)
+    try:
+        output = run_pipeline(job["keyword"], trace_file="trace.json", in_process=True, **params)
+    finally:
+        os.chdir(cwd)
+    video_file = output.get("video_file")
+    return {
+        "job_dir": job_dir,
+        "video_file": os.path.join(job_dir, video_file) if video_file else None,
+        "num_cards": len(output.get("card_contents", [])),
+        "duration_s": round(time.perf_counter() - start, 3)
+    }
+
+
+def run_worker(db_path=DEFAULT_DB_PATH, jobs_dir=DEFAULT_JOBS_DIR, poll_interval=2.0, max_jobs=None, worker_id=None):
+    """
+    Process queued jobs until stopped by SIGINT/SIGTERM (or after max_jobs jobs).
+
+    Args:
+        db_path (str): Path to the SQLite job queue.
+        jobs_dir (str): Parent directory for per-job output directories.
+        poll_interval (float): Seconds to sleep when the queue is empty.
+        max_jobs (int or None): Stop after this many jobs (None for no limit).
+        worker_id (str or None): Worker identifier (defaults to host:pid).
+    Returns:
+        int: Number of jobs processed.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    db_path = os.path.abspath(db_path)
+    jobs_dir = os.path.abspath(jobs_dir)
+    conn = connect(db_path)
+    # Share emoji assets, the search cache and the card render cache across per-job directories (read by the modules at import)
+    os.environ.setdefault("EMOJI_PNG_DIR", os.path.abspath("emoji_png"))
+    os.environ.setdefault("EMOJI_BUNDLE", os.path.abspath("emoji_bundle.bin"))
+    os.environ.setdefault("SERPAPI_CACHE_DIR", os.path.abspath(os.path.join(".cache", "serpapi")))
+    os.environ.setdefault("CARD_CACHE_DIR", os.path.abspath(os.path.join(".cache", "cards")))
+    stopping = {"requested": False}
+
+    def request_stop(signum, frame):
+        if stopping["requested"]:
+            raise KeyboardInterrupt
+        stopping["requested"] = True
+        print(f"[Worker] Received signal {signum}; stopping after the current job (send again to abort).")
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    requeued = requeue_orphaned_jobs(conn, socket.gethostname())
+    if requeued:
+        print(f"[Worker] Requeued {requeued} orphaned job(s).")
+    print(f"[Worker] {worker_id} warming up ...")
+    warm_up()
+    print(f"[Worker] Ready. Polling {db_path}.")
+    processed = 0
+    while not stopping["requested"] and (max_jobs is None or processed < max_jobs):
+        job = claim_job(conn, worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        print(f"[Worker] Job {job['id']}: '{job['keyword']}'")
+        try:
+            result = run_job(job, jobs_dir)
+            finish_job(conn, job["id"], result=result)
+            print(f"[Worker] Job {job['id']} done in {result['duration_s']:.1f}s.")
+        except KeyboardInterrupt:
+            finish_job(conn, job["id"], error="Aborted by signal")
+            raise
+        except Exception as e:
+            finish_job(conn, job["id"], error=f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+            print(f"[Worker] Job {job['id']} failed: {e}")
+        processed += 1
+    print(f"[Worker] Stopped after {processed} job(s).")
+    conn.close()
+    return processed
+
+
+def print_status(conn, job_id=None):
+    """
+    Print one job's status record, or a summary of recent jobs.
+
+    Args:
+        conn (sqlite3.Connection): Queue connection.
+        job_id (int or None): Job to show in full.
+    Returns:
+        None.
+    """
+    if job_id is not None:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            print(f"[Worker] No job with id {job_id}.")
+            return
+        print(json.dumps(dict(row), ensure_ascii=False, indent=2))
+        return
+    for row in conn.execute("SELECT id, keyword, status, worker, created_at, finished_at FROM jobs ORDER BY id DESC LIMIT 20"):
+        print(f"{row['id']:>5}  {row['status']:<8}  {row['keyword'][:40]:<40}  {row['worker'] or ''}")
+
+
+def main():
+    """
+    Command-line interface: submit jobs, run the worker, or show job status.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Card News worker daemon with a local SQLite job queue")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH, help='Path to the SQLite job queue')
+    sub = parser.add_subparsers(dest="command", required=True)
+    submit = sub.add_parser("submit", help="Queue a pipeline job")
+    submit.add_argument('--keyword', type=str, required=True, help='Keyword to search for articles')
+    submit.add_argument('--max_results', type=int, default=10, help='Number of articles to search (SERPAPI)')
+    submit.add_argument('--max_summaries', type=int, default=6, help='Number of articles to summarize')
+    submit.add_argument('--num_cards', type=int, default=3, help='Number of card news slides to generate')
+    submit.add_argument('--no_cards', action='store_true', help='Do not generate card images')
+    submit.add_argument('--no_audio', action='store_true', help='Do not generate audio files')
+    submit.add_argument('--no_video', action='store_true', help='Do not generate video file')
+    submit.add_argument('--no_music', action='store_true', help='Do not fetch background music')
+    run = sub.add_parser("run", help="Process queued jobs")
+    run.add_argument('--jobs_dir', type=str, default=DEFAULT_JOBS_DIR, help='Parent directory for per-job outputs')
+    run.add_argument('--poll_interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+    run.add_argument('--max_jobs', type=int, default=None, help='Exit after this many jobs')
+    status = sub.add_parser("status", help="Show job status")
+    status.add_argument('job_id', type=int, nargs='?', help='Job to show in full')
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        conn = connect(args.db)
+        job_id = submit_job(conn, args.keyword, max_results=args.max_results, max_summaries=args.max_summaries,
+                            num_cards=args.num_cards, generate_cards=not args.no_cards, generate_audio=not args.no_audio,
+                            generate_video=not args.no_video, auto_music=not args.no_music)
+        print(f"[Worker] Queued job {job_id}.")
+    elif args.command == "run":
+        run_worker(args.db, args.jobs_dir, args.poll_interval, args.max_jobs)
+    else:
+        print_status(connect(args.db), args.job_id)
+
+
+if __name__ == "__main__":
+    main()